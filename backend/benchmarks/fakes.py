@@ -0,0 +1,180 @@
+"""
+Deterministic stand-ins for the network-bound dependencies of a chat turn.
+
+FakeGenerativeModel replaces google.generativeai.GenerativeModel (the real
+`genai.protos` are still used for history, so session storage is exercised as in
+production). Responses are derived from the prompt, and every call sleeps for a
+configurable first-token latency plus a per-chunk streaming delay.
+"""
+import asyncio
+import json
+import re
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from types import SimpleNamespace
+import google.generativeai as genai
+
+LINK = re.compile(r"https?://[^\s<>\"'\\)\]]+")
+
+
+@dataclass
+class Latencies:
+    llm: float = 0.4          # seconds before the first token of any model call
+    llm_chunk: float = 0.02   # seconds between streamed chunks
+    search: float = 0.6       # upstream search call
+    page: float = 0.15        # fixture server response delay
+
+
+class StageRecorder:
+    """Thread-safe per-stage duration samples (seconds)."""
+
+    def __init__(self):
+        self._samples = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples[stage].append(seconds)
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {stage: list(samples) for stage, samples in self._samples.items()}
+
+
+def _content(role: str, text: str):
+    return genai.protos.Content(role=role, parts=[genai.protos.Part(text=text)])
+
+
+def _products_json(context: str, request: str) -> str:
+    links = list(dict.fromkeys(m.rstrip(".,;:") for m in LINK.findall(context)))[:3]
+    products = [
+        {"name": f"Fixture Product {i + 1}", "price": f"₹{(i + 1) * 9999}",
+         "reason": f"Matches '{request[:40]}'", "link": link}
+        for i, link in enumerate(links)
+    ]
+    return json.dumps({
+        "agent_response": f"Here are {len(products)} options for you.",
+        "products": products,
+        "predictive_insight": "",
+    })
+
+
+class FakeResponse:
+    """Quacks like GenerateContentResponse (sync or streamed)."""
+
+    def __init__(self, content, latencies: Latencies, chunks: int = 1):
+        self.candidates = [SimpleNamespace(content=content)]
+        self._latencies = latencies
+        self._chunks = chunks
+
+    @property
+    def text(self) -> str:
+        return "".join(p.text for p in self.candidates[0].content.parts if p.text)
+
+    def __aiter__(self):
+        return self._stream()
+
+    async def _stream(self):
+        text = self.text
+        if not text:
+            yield self
+            return
+        size = max(1, len(text) // self._chunks)
+        for i in range(0, len(text), size):
+            await asyncio.sleep(self._latencies.llm_chunk)
+            yield SimpleNamespace(candidates=[SimpleNamespace(content=_content("model", text[i:i + size]))])
+
+
+class FakeChat:
+    def __init__(self, model, history):
+        self.model = model
+        self.history = list(history or [])
+
+    async def send_message_async(self, content, stream: bool = False, **kwargs):
+        user = content if isinstance(content, genai.protos.Content) else _content("user", str(content))
+        if not user.role:
+            user = genai.protos.Content(role="user", parts=user.parts)
+        self.history.append(user)
+        reply, kind = self.model.reply(user)
+        started = time.perf_counter()
+        await asyncio.sleep(self.model.latencies.llm)
+        self.model.recorder.record(f"llm:{kind}", time.perf_counter() - started)
+        self.history.append(reply)
+        return FakeResponse(reply, self.model.latencies, chunks=8 if stream else 1)
+
+    def send_message(self, content, stream: bool = False):
+        return asyncio.run(self.send_message_async(content, stream))
+
+
+class FakeGenerativeModel:
+    """
+    Behaves like the agents' models:
+      - tools=[search_web]   -> calls search_web first, then answers with products from the results
+      - planned heavy model  -> 'SEARCH: <request>' for the plan prompt, product JSON otherwise
+      - FAST agent           -> a short friendly sentence
+      - flash-lite           -> router label / running summary
+    """
+    latencies = Latencies()
+    recorder = StageRecorder()
+
+    def __init__(self, model_name: str = "", system_instruction: str = None, tools=None, **kwargs):
+        self.model_name = model_name
+        self.instruction = system_instruction or ""
+        self.tools = tools
+
+    def start_chat(self, history=None):
+        return FakeChat(self, history)
+
+    def reply(self, user):
+        text = " ".join(p.text for p in user.parts if p.text)
+        if "Do not generate JSON" in self.instruction:
+            return _content("model", "Happy to help! What are you shopping for today?"), "fast"
+        if self.tools:
+            if any(p.function_response.name for p in user.parts):
+                return _content("model", _products_json(str(user), "search")), "synthesis"
+            query = text.split("\n")[0].replace("User Request:", "").strip()
+            call = genai.protos.Part(function_call=genai.protos.FunctionCall(
+                name="search_web", args={"query": query}))
+            return genai.protos.Content(role="model", parts=[call]), "single_shot"
+        if "Do I need external information" in text:
+            query = text.split("\n")[0].replace("User Request:", "").strip()
+            return _content("model", f"SEARCH: {query}"), "plan"
+        return _content("model", _products_json(text, text.split("\n")[0])), "synthesis"
+
+    async def generate_content_async(self, prompt, **kwargs):
+        prompt = str(prompt)
+        started = time.perf_counter()
+        await asyncio.sleep(self.latencies.llm)
+        if "Classify this message" in prompt:
+            kind, text = "router", "HEAVY" if re.search(r"\d|buy|price|best", prompt.lower()) else "FAST"
+        elif "running summary" in prompt:
+            kind, text = "summary", "User is shopping for electronics on a budget."
+        else:
+            kind, text = "other", _products_json(prompt, "repair")
+        self.recorder.record(f"llm:{kind}", time.perf_counter() - started)
+        return FakeResponse(_content("model", text), self.latencies)
+
+    def generate_content(self, prompt, **kwargs):
+        return asyncio.run(self.generate_content_async(prompt, **kwargs))
+
+
+def fake_search_upstream(base_url: str, latencies: Latencies, recorder: StageRecorder):
+    """Replacement for tools.search_tool._search_upstream pointing at the fixture server."""
+    def search(query: str, max_results: int = 5) -> str:
+        started = time.perf_counter()
+        time.sleep(latencies.search)
+        slug = re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-")[:40] or "item"
+        results = [
+            f"Title: {query.title()} option {i + 1}\nLink: {base_url}/product/{slug}-{i + 1}\n"
+            f"Snippet: Fixture listing {i + 1} for {query}.\n"
+            for i in range(max_results)
+        ]
+        recorder.record("upstream:search", time.perf_counter() - started)
+        return "\n---\n".join(results)
+    return search
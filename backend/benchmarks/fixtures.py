@@ -0,0 +1,73 @@
+"""
+Local HTTP fixture server: deterministic product pages for the scraper.
+
+Every /product/<slug> path returns a static HTML product page (enough visible text
+that the static fetch tier accepts it), after an injected delay.
+"""
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = """<!doctype html>
+<html><head><title>{title}</title>
+<meta property="og:image" content="{base}/static/{slug}.jpg">
+</head><body>
+<h1>{title}</h1>
+<p class="price">Price: ₹{price}</p>
+<div class="description">{description}</div>
+<ul class="specs">{specs}</ul>
+</body></html>
+"""
+
+
+def product_page(slug: str, base: str) -> str:
+    title = slug.replace("-", " ").title()
+    price = 10000 + sum(map(ord, slug)) * 7 % 90000
+    description = " ".join(
+        f"{title} is a dependable choice with solid build quality, long battery life and "
+        f"a one year warranty. Customers rate it {3 + i % 2}.{i % 10} out of 5." for i in range(8)
+    )
+    specs = "".join(f"<li>Spec {i}: value {i * 3} units</li>" for i in range(12))
+    return PAGE.format(title=title, base=base, slug=slug, price=price, description=description, specs=specs)
+
+
+class FixtureServer:
+    """ThreadingHTTPServer on 127.0.0.1 with a configurable per-response delay."""
+
+    def __init__(self, delay: float = 0.0, recorder=None):
+        self.delay = delay
+        self.recorder = recorder
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                started = time.perf_counter()
+                time.sleep(server.delay)
+                if self.path.startswith("/product/"):
+                    body = product_page(self.path.split("/product/", 1)[1], server.base_url).encode("utf-8")
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                else:
+                    self.send_response(404)
+                    self.end_headers()
+                if server.recorder:
+                    server.recorder.record("upstream:page", time.perf_counter() - started)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.base_url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="fixture-server", daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,333 @@
+"""
+Offline end-to-end benchmarks for the chat API.
+
+Drives /agent/chat, /agent/history and /agent/session/{id} through the FastAPI app
+in-process (httpx ASGI transport) with a fake Gemini, a fake search upstream and
+a local fixture server for scraping, so results depend only on this code and the
+injected latencies. Run from backend/:
+
+    python -m benchmarks.run                                  # all scenarios, compare with baselines
+    python -m benchmarks.run --scenario chat --concurrency 1,8,32 --requests 200
+    python -m benchmarks.run --llm-latency 0.8 --search-latency 1.2 --save-baseline
+
+Reports p50/p95/p99 latency and throughput per scenario and concurrency level,
+plus a per-stage breakdown for chat turns. Baselines live in
+benchmarks/baselines/<name>.json; a run exits non-zero if p95 or throughput
+regresses by more than --tolerance against the stored baseline; p95 rises under
+--noise-floor-ms (default 5 ms) are treated as noise.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+NOISE_FLOOR_MS = 5.0    # p95 changes smaller than this are scheduler noise, not regressions
+
+HEAVY_TEMPLATES = [
+    "best {product} under {budget}",
+    "{product} under {budget} with good reviews",
+    "compare top {product} below {budget}",
+    "which {product} should i buy under {budget}",
+]
+FAST_MESSAGES = ["hi", "thanks!", "hello", "ok cool", "thank you so much", "bye"]
+PRODUCTS = ["laptop", "phone", "headphones", "smartwatch", "running shoes", "monitor", "tablet", "camera"]
+
+
+def percentile(samples, pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples, elapsed: float = None) -> dict:
+    summary = {
+        "count": len(samples),
+        "p50_ms": round(percentile(samples, 50) * 1000, 2),
+        "p95_ms": round(percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(percentile(samples, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2) if samples else 0.0,
+    }
+    if elapsed:
+        summary["throughput_rps"] = round(len(samples) / elapsed, 2)
+    return summary
+
+
+def chat_messages(n: int, heavy_share: float, seed: int):
+    rng = random.Random(seed)
+    for _ in range(n):
+        if rng.random() < heavy_share:
+            budget = rng.choice([15000, 20000, 30000, 50000, 75000, 100000])
+            yield rng.choice(HEAVY_TEMPLATES).format(product=rng.choice(PRODUCTS), budget=budget)
+        else:
+            yield rng.choice(FAST_MESSAGES)
+
+
+# --- Environment ---
+
+def prepare_environment(args, workdir: str):
+    """Isolated storage + fakes. Must run before main.py is imported."""
+    os.environ["MOCK_AUTH"] = "true"
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark")
+    os.environ["CATALOG_ENABLED"] = "0"
+    os.environ["SEARCH_CACHE_DB"] = ""
+    os.environ["SEMANTIC_CACHE_DB"] = ""
+    os.environ["SESSION_FLUSH_INTERVAL"] = "0.5"
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+
+    import google.generativeai as genai
+    from benchmarks.fakes import FakeGenerativeModel, Latencies
+    FakeGenerativeModel.latencies = Latencies(
+        llm=args.llm_latency, llm_chunk=args.chunk_latency, search=args.search_latency, page=args.page_latency)
+    genai.GenerativeModel = FakeGenerativeModel
+
+
+def _timed(fn, stage: str, recorder, is_async: bool = False):
+    if is_async:
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await fn(*args, **kwargs)
+            finally:
+                recorder.record(stage, time.perf_counter() - started)
+    else:
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                recorder.record(stage, time.perf_counter() - started)
+    return wrapper
+
+
+def instrument(main, recorder, fixture_url: str, latencies):
+    """Swaps in the fake search upstream and wraps each stage of a turn with a timer."""
+    import core.shim as shim
+    import tools.search_tool as search_tool
+    from benchmarks.fakes import fake_search_upstream
+
+    search_tool._search_upstream = fake_search_upstream(fixture_url, latencies, recorder)
+    main.browser_pool.warm = lambda: None   # fixture pages never need the browser
+    main.classify_intent_async = _timed(main.classify_intent_async, "route", recorder, is_async=True)
+    shim.search_web = _timed(shim.search_web, "search", recorder)
+    shim.scrape_url = _timed(shim.scrape_url, "scrape", recorder)
+    sm = main.session_manager
+    sm.load_session = _timed(sm.load_session, "session_load", recorder)
+    sm.save_session = _timed(sm.save_session, "session_save", recorder)
+
+
+def reset_caches():
+    """Every concurrency level starts cold."""
+    from tools.search_cache import search_cache
+    from tools.page_cache import page_cache
+    from core.semantic_cache import semantic_cache
+    search_cache.clear()
+    semantic_cache.clear()
+    page_cache.clear()
+
+
+# --- Scenarios ---
+
+async def run_level(concurrency: int, requests: int, make_request) -> dict:
+    """`requests` calls spread over `concurrency` workers; returns latency/throughput stats."""
+    latencies, errors = [], 0
+    counter = iter(range(requests))
+
+    async def worker(worker_id: int):
+        nonlocal errors
+        state = {}
+        for i in counter:
+            started = time.perf_counter()
+            try:
+                await make_request(worker_id, i, state)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                errors += 1
+                print(f"   ⚠️ request failed: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(w) for w in range(concurrency)))
+    result = summarize(latencies, time.perf_counter() - started)
+    result["errors"] = errors
+    return result
+
+
+async def scenario_chat(client, args, concurrency: int):
+    messages = list(chat_messages(args.requests, args.heavy_share, args.seed + concurrency))
+
+    async def request(worker_id, i, state):
+        data = {"message": messages[i]}
+        if state.get("session_id"):
+            data["session_id"] = state["session_id"]
+        response = await client.post("/agent/chat", data=data)
+        response.raise_for_status()
+        state["session_id"] = response.json()["session_id"]
+
+    return await run_level(concurrency, args.requests, request)
+
+
+async def _seed_sessions(client, count: int) -> list:
+    session_ids = []
+    for i in range(count):
+        response = await client.post("/agent/chat", data={"message": FAST_MESSAGES[i % len(FAST_MESSAGES)]})
+        response.raise_for_status()
+        session_ids.append(response.json()["session_id"])
+    return session_ids
+
+
+async def scenario_history(client, args, concurrency: int):
+    async def request(worker_id, i, state):
+        response = await client.get("/agent/history")
+        response.raise_for_status()
+
+    return await run_level(concurrency, args.requests, request)
+
+
+async def scenario_session(client, args, concurrency: int, session_ids=None):
+    async def request(worker_id, i, state):
+        response = await client.get(f"/agent/session/{session_ids[i % len(session_ids)]}")
+        response.raise_for_status()
+
+    return await run_level(concurrency, args.requests, request)
+
+
+SCENARIOS = {"chat": scenario_chat, "history": scenario_history, "session": scenario_session}
+
+
+async def run_benchmarks(args) -> dict:
+    import httpx
+    from benchmarks.fakes import FakeGenerativeModel
+    from benchmarks.fixtures import FixtureServer
+    import main
+
+    recorder = FakeGenerativeModel.recorder
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("save_baseline", "output")},
+               "scenarios": {}}
+    with FixtureServer(delay=args.page_latency, recorder=recorder) as fixtures:
+        instrument(main, recorder, fixtures.base_url, FakeGenerativeModel.latencies)
+        for handler in main.app.router.on_startup:
+            await handler()
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=300,
+                                     headers={"Authorization": "Bearer mock_token"}) as client:
+            session_ids = None
+            for name in args.scenario:
+                if name in ("history", "session") and session_ids is None:
+                    session_ids = await _seed_sessions(client, 20)
+                for concurrency in args.concurrency:
+                    reset_caches()
+                    recorder.reset()
+                    print(f"▶️ {name} @ concurrency {concurrency} ({args.requests} requests)")
+                    if name == "session":
+                        level = await scenario_session(client, args, concurrency, session_ids)
+                    else:
+                        level = await SCENARIOS[name](client, args, concurrency)
+                    if name == "chat":
+                        level["stages"] = {stage: summarize(samples)
+                                           for stage, samples in sorted(recorder.snapshot().items())}
+                    results["scenarios"].setdefault(name, {})[str(concurrency)] = level
+        for handler in main.app.router.on_shutdown:
+            await handler()
+    return results
+
+
+# --- Reporting ---
+
+def print_report(results: dict):
+    for name, levels in results["scenarios"].items():
+        print(f"\n== {name} ==")
+        print(f"{'conc':>5} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10} {'req/s':>8} {'errors':>7}")
+        for concurrency, level in levels.items():
+            print(f"{concurrency:>5} {level['p50_ms']:>10} {level['p95_ms']:>10} {level['p99_ms']:>10} "
+                  f"{level.get('throughput_rps', 0):>8} {level['errors']:>7}")
+            for stage, stats in level.get("stages", {}).items():
+                print(f"      {stage:<20} n={stats['count']:<5} p50={stats['p50_ms']}ms p95={stats['p95_ms']}ms")
+
+
+def compare(results: dict, baseline: dict, tolerance: float, noise_floor_ms: float = NOISE_FLOOR_MS) -> list:
+    """
+    Human-readable regressions (p95 latency up or throughput down by more than `tolerance`).
+    Millisecond-scale levels swing by more than `tolerance` between runs, so p95 must also
+    rise by more than `noise_floor_ms`, and throughput of levels that were under the floor
+    only counts once their p95 has.
+    """
+    regressions = []
+    for name, levels in results["scenarios"].items():
+        for concurrency, level in levels.items():
+            base = baseline.get("scenarios", {}).get(name, {}).get(concurrency)
+            if not base:
+                continue
+            above_noise = level["p95_ms"] - base["p95_ms"] > noise_floor_ms
+            if base["p95_ms"] and level["p95_ms"] > base["p95_ms"] * (1 + tolerance) and above_noise:
+                regressions.append(f"{name}@{concurrency}: p95 {base['p95_ms']}ms -> {level['p95_ms']}ms")
+            base_rps = base.get("throughput_rps")
+            if base["p95_ms"] <= noise_floor_ms and not above_noise:
+                continue
+            if base_rps and level.get("throughput_rps", 0) < base_rps * (1 - tolerance):
+                regressions.append(f"{name}@{concurrency}: throughput {base_rps} -> {level['throughput_rps']} req/s")
+    return regressions
+
+
+def main_cli(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Offline chat API benchmarks")
+    parser.add_argument("--scenario", default="chat,history,session",
+                        type=lambda s: [x for x in s.split(",") if x in SCENARIOS])
+    parser.add_argument("--concurrency", default="1,4,16", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--requests", type=int, default=60, help="requests per concurrency level")
+    parser.add_argument("--heavy-share", type=float, default=0.7, help="share of chat messages that are shopping requests")
+    parser.add_argument("--llm-latency", type=float, default=0.4)
+    parser.add_argument("--chunk-latency", type=float, default=0.02)
+    parser.add_argument("--search-latency", type=float, default=0.6)
+    parser.add_argument("--page-latency", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--baseline", default="default", help="baseline name under benchmarks/baselines")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--noise-floor-ms", type=float, default=NOISE_FLOOR_MS,
+                        help="p95 rises below this are noise, not regressions")
+    parser.add_argument("--output", help="also write the results JSON here")
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    with tempfile.TemporaryDirectory(prefix="contextiq-bench-") as workdir:
+        prepare_environment(args, workdir)
+        results = asyncio.run(run_benchmarks(args))
+
+    print_report(results)
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    baseline_path = os.path.join(BASELINE_DIR, f"{args.baseline}.json")
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\n💾 Baseline saved -> {baseline_path}")
+        return 0
+
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.noise_floor_ms)
+        if regressions:
+            print("\n❌ Regressions against baseline:")
+            for line in regressions:
+                print(f"   {line}")
+            return 1
+        print(f"\n✅ Within {int(args.tolerance * 100)}% of baseline '{args.baseline}'")
+    else:
+        print(f"\nℹ️ No baseline at {baseline_path} (run with --save-baseline to record one)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,202 @@
+"""
+Admission control: bounded concurrency per resource, with priority lanes and queue deadlines.
+
+Every chat turn is admitted into its lane's turn pool once it has been routed
+(FAST and HEAVY have separate pools, so chit-chat never queues behind research).
+Inside a turn, each LLM call, search and scrape takes a slot from that resource's
+pool; waiters are served by lane (FAST, then HEAVY, then background work) and
+FIFO within a lane. A full queue, or a wait past the pool's deadline, raises
+Overloaded straight away; the API turns it into 429 with Retry-After.
+"""
+import asyncio
+import contextvars
+import concurrent.futures
+import heapq
+import itertools
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+from utils.metrics import metrics
+
+LANE_FAST = 0
+LANE_HEAVY = 1
+LANE_BACKGROUND = 2
+LANES = {"FAST": LANE_FAST, "HEAVY": LANE_HEAVY}
+
+# name -> (concurrency, max queued, seconds a waiter may queue)
+POOL_LIMITS = {
+    "fast_turns": (int(os.getenv("ADMIT_FAST_TURNS", "64")), int(os.getenv("ADMIT_FAST_QUEUE", "256")), 5.0),
+    "heavy_turns": (int(os.getenv("ADMIT_HEAVY_TURNS", "8")), int(os.getenv("ADMIT_HEAVY_QUEUE", "16")),
+                    float(os.getenv("ADMIT_HEAVY_QUEUE_TIMEOUT", "20"))),
+    "llm": (int(os.getenv("ADMIT_LLM_CONCURRENCY", "16")), int(os.getenv("ADMIT_LLM_QUEUE", "128")),
+            float(os.getenv("ADMIT_LLM_QUEUE_TIMEOUT", "30"))),
+    "search": (int(os.getenv("ADMIT_SEARCH_CONCURRENCY", "4")), int(os.getenv("ADMIT_SEARCH_QUEUE", "64")), 15.0),
+    "scrape": (int(os.getenv("ADMIT_SCRAPE_CONCURRENCY", "8")), int(os.getenv("ADMIT_SCRAPE_QUEUE", "64")), 10.0),
+}
+
+_lane = contextvars.ContextVar("admission_lane", default=LANE_HEAVY)
+
+
+class Overloaded(Exception):
+    """A pool's queue is full or a waiter ran out of time."""
+
+    def __init__(self, pool: str, retry_after: int, reason: str):
+        super().__init__(f"{pool} overloaded ({reason}); retry in {retry_after}s")
+        self.pool = pool
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class Pool:
+    """Priority semaphore for coroutines on one event loop."""
+
+    def __init__(self, name: str, limit: int, max_queue: int, timeout: float, clock=time.monotonic):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.clock = clock
+        self.active = 0
+        self._waiters = []   # heap of [priority, seq, future]
+        self._seq = itertools.count()
+        self.avg_hold = 1.0  # seconds, EWMA; drives the Retry-After estimate
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._executor = None
+
+    @property
+    def queued(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def retry_after(self) -> int:
+        return max(1, math.ceil(self.avg_hold * (self.queued + 1) / self.limit))
+
+    async def acquire(self, priority: int = LANE_HEAVY, timeout: float = None):
+        if self.active < self.limit and not self.queued:
+            self.active += 1
+            self.admitted += 1
+            return
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            metrics.event("admission_rejected", pool=self.name, reason="queue_full")
+            raise Overloaded(self.name, self.retry_after(), "queue full")
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            with metrics.span(f"queue_{self.name}"):
+                await asyncio.wait_for(future, self.timeout if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            self._forget(entry)
+            self.timed_out += 1
+            metrics.event("admission_rejected", pool=self.name, reason="queue_timeout")
+            raise Overloaded(self.name, self.retry_after(), "queue timeout") from None
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()   # the slot was handed over just as we were cancelled
+            else:
+                self._forget(entry)
+            raise
+        self.admitted += 1
+
+    def _forget(self, entry):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def release(self):
+        # Hand the slot straight to the best waiter; otherwise free it
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(True)
+                return
+        self.active -= 1
+
+    def finish(self, started: float):
+        """Releases a slot taken at `started` (clock time), feeding the hold-time estimate."""
+        self.avg_hold = 0.8 * self.avg_hold + 0.2 * (self.clock() - started)
+        self.release()
+
+    @asynccontextmanager
+    async def slot(self, priority: int = LANE_HEAVY, timeout: float = None):
+        await self.acquire(priority, timeout)
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.finish(started)
+
+    def executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """This pool's own worker threads (at most `limit`), created on first use."""
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.limit, thread_name_prefix=f"admission-{self.name}")
+        return self._executor
+
+    def stats(self) -> dict:
+        return {
+            "active": self.active,
+            "queued": self.queued,
+            "limit": self.limit,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+        }
+
+
+class Admission:
+    def __init__(self, limits: dict = None):
+        self.pools = {name: Pool(name, *spec) for name, spec in (limits or POOL_LIMITS).items()}
+
+    @asynccontextmanager
+    async def turn(self, intent: str):
+        """Admits one routed chat turn and sets its lane for the resource pools used inside it."""
+        lane = LANES.get(intent, LANE_HEAVY)
+        pool = self.pools["fast_turns" if lane == LANE_FAST else "heavy_turns"]
+        token = _lane.set(lane)
+        try:
+            async with pool.slot(lane):
+                yield
+        finally:
+            _lane.reset(token)
+
+    def slot(self, resource: str, priority: int = None):
+        """Slot in a resource pool ("llm", "search", "scrape"); priority defaults to the turn's lane."""
+        return self.pools[resource].slot(_lane.get() if priority is None else priority)
+
+    async def run_in_thread(self, resource: str, fn, *args):
+        """
+        asyncio.to_thread inside a resource slot. Cancelling a to_thread leaves its
+        thread running, so here the slot is only given back once the thread has
+        finished, and the work runs on the pool's own executor rather than the
+        default one that session I/O shares. The pool limit really bounds threads.
+        """
+        pool = self.pools[resource]
+        await pool.acquire(_lane.get())
+        loop = asyncio.get_running_loop()
+        started = pool.clock()
+
+        def finished(_):
+            try:
+                loop.call_soon_threadsafe(pool.finish, started)
+            except RuntimeError:
+                pass   # loop already closed
+
+        try:
+            future = pool.executor().submit(contextvars.copy_context().run, fn, *args)
+        except BaseException:
+            pool.finish(started)
+            raise
+        future.add_done_callback(finished)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+
+# Singleton instance
+admission = Admission()
@@ -1,10 +1,12 @@
 
 import firebase_admin
 from firebase_admin import auth, credentials
+import asyncio
 import os
 from fastapi import HTTPException, Security, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
+from core.token_cache import TokenCache, FirebaseKeyRing
 
 # Define the security scheme
 security = HTTPBearer()
@@ -30,6 +32,21 @@ def initialize_firebase():
 # Initialize immediately
 initialize_firebase()
 
+def _project_id() -> Optional[str]:
+    try:
+        project_id = firebase_admin.get_app().project_id
+    except Exception:
+        project_id = None
+    return project_id or os.getenv("FIREBASE_PROJECT_ID") or os.getenv("GOOGLE_CLOUD_PROJECT")
+
+# Verified tokens are reused until they expire; signing keys are refreshed in the background (see main.py)
+token_cache = TokenCache()
+key_ring = FirebaseKeyRing(project_id=_project_id())
+
+def _verify(token: str) -> dict:
+    """Local check against the prefetched keys; firebase_admin when that can't decide."""
+    return key_ring.verify(token) or auth.verify_id_token(token)
+
 async def verify_firebase_token(res: HTTPAuthorizationCredentials = Security(security)):
     """
     Verifies the Firebase ID Token passed in the Authorization header.
@@ -42,8 +59,13 @@ async def verify_firebase_token(res: HTTPAuthorizationCredentials = Security(sec
     if os.getenv("MOCK_AUTH") == "true" or token == "mock_token":
         return {"uid": "mock_user_123", "email": "mock@example.com"}
 
+    decoded_token = token_cache.get(token)
+    if decoded_token is not None:
+        return decoded_token
+
     try:
-        decoded_token = auth.verify_id_token(token)
+        decoded_token = await asyncio.to_thread(_verify, token)
+        token_cache.set(token, decoded_token)
         return decoded_token
     except Exception as e:
         print(f"Auth Error: {e}")
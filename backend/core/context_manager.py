@@ -0,0 +1,136 @@
+import os
+from typing import Any, List, Optional, Tuple
+import google.generativeai as genai
+from utils.history_codec import field_value
+from utils.llm_client import llm
+from core.admission import admission, LANE_BACKGROUND
+
+# Bounds on what we send to the model each call
+HISTORY_WINDOW = int(os.getenv("HISTORY_WINDOW_MESSAGES", "12"))        # recent messages sent verbatim
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))   # history tokens per call
+SUMMARY_BATCH = int(os.getenv("SUMMARY_BATCH_MESSAGES", "8"))           # re-summarize after this many new old messages
+MAX_MESSAGE_CHARS = 4000                                                # single messages are clipped to this
+SUMMARY_MODEL = "gemini-2.5-flash-lite"
+
+SUMMARY_PROMPT = """Update the running summary of a shopping-assistant conversation.
+Keep what matters for future recommendations: budget, preferred brands, products shown or rejected, user details.
+At most 120 words. Output only the summary.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+"""
+
+
+def message_text(message) -> str:
+    parts = field_value(message, "parts") or []
+    texts = []
+    for part in parts:
+        text = part if isinstance(part, str) else field_value(part, "text")
+        if text:
+            texts.append(text)
+    return " ".join(texts)
+
+
+def estimate_tokens(message) -> int:
+    # ~4 chars per token is close enough for budgeting
+    return len(message_text(message)) // 4 + 4
+
+
+def _text_message(role: str, text: str):
+    return genai.protos.Content(role=role, parts=[genai.protos.Part(text=text)])
+
+
+def _clip(message):
+    text = message_text(message)
+    if len(text) <= MAX_MESSAGE_CHARS:
+        return message
+    return _text_message(field_value(message, "role") or "user", text[:MAX_MESSAGE_CHARS] + " …")
+
+
+class ContextManager:
+    """
+    Builds the bounded history sent to Gemini for one call:
+      [running summary of older turns] + [not-yet-summarized older turns] + [recent window],
+    trimmed oldest-first to CONTEXT_TOKEN_BUDGET.
+
+    The summary is cached on the session as {"text", "upto"} (number of messages
+    it covers) and refreshed in the background, never on the request path.
+    """
+
+    def __init__(self, window: int = HISTORY_WINDOW, token_budget: int = CONTEXT_TOKEN_BUDGET,
+                 summary_batch: int = SUMMARY_BATCH):
+        self.window = window
+        self.token_budget = token_budget
+        self.summary_batch = summary_batch
+
+    def build(self, history: List[Any], summary: Optional[dict] = None) -> List[Any]:
+        summary = summary or {}
+        upto = min(summary.get("upto", 0), max(len(history) - self.window, 0))
+        recent = [_clip(m) for m in history[upto:]]
+
+        # Drop oldest messages (in user/model pairs) until we fit the budget
+        budget = self.token_budget
+        if summary.get("text"):
+            budget -= len(summary["text"]) // 4 + 8
+        while len(recent) > 2 and sum(estimate_tokens(m) for m in recent) > budget:
+            recent = recent[2:]
+        # Never start the window on a model message
+        while recent and field_value(recent[0], "role") == "model":
+            recent = recent[1:]
+
+        if not summary.get("text"):
+            return recent
+        return [
+            _text_message("user", f"Summary of our earlier conversation: {summary['text']}"),
+            _text_message("model", "Thanks, I'll keep that in mind."),
+        ] + recent
+
+    def needs_summary(self, history: List[Any], summary: Optional[dict] = None) -> bool:
+        upto = (summary or {}).get("upto", 0)
+        return len(history) - self.window - upto >= self.summary_batch
+
+    async def summarize(self, history: List[Any], summary: Optional[dict] = None) -> Tuple[Optional[dict], bool]:
+        """
+        Folds messages that fell out of the window into the running summary.
+        Returns (summary, changed).
+        """
+        summary = summary or {}
+        upto = summary.get("upto", 0)
+        cutoff = len(history) - self.window
+        if cutoff - upto < self.summary_batch:
+            return summary, False
+
+        lines = [
+            f"{field_value(m, 'role')}: {message_text(m)[:1000]}"
+            for m in history[upto:cutoff]
+        ]
+        try:
+            async with admission.slot("llm", priority=LANE_BACKGROUND):
+                # Background work: no hedge, it would only add load
+                response = await llm.generate(SUMMARY_PROMPT.format(
+                    summary=summary.get("text") or "(none)",
+                    messages="\n".join(lines),
+                ), model=SUMMARY_MODEL, hedge=False)
+            return {"text": response.text.strip(), "upto": cutoff}, True
+        except Exception as e:
+            print(f"⚠️ Summary refresh failed: {e}")
+            return summary, False
+
+
+def user_message(user_input: Any):
+    """The user's turn as it should be persisted (text only, no tool prompts)."""
+    if isinstance(user_input, list):
+        user_input = " ".join(p for p in user_input if isinstance(p, str))
+    return _text_message("user", str(user_input))
+
+
+def model_message(text: str):
+    """A model answer as it should be persisted."""
+    return _text_message("model", text)
+
+
+# Singleton instance
+context_manager = ContextManager()
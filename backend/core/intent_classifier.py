@@ -0,0 +1,223 @@
+"""
+Local FAST/HEAVY intent classifier (CPU only, no network).
+
+A weighted keyword + regex scorer turns a message into P(HEAVY). Confident
+decisions are returned directly; ambiguous ones fall back to the LLM router,
+whose labels are appended to a size-capped JSONL log (token sets only unless
+INTENT_LOG_TEXT=1). `train()` learns per-token log-odds weights from that log so
+the local model covers more traffic over time:
+
+    python -m core.intent_classifier --train
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+
+INTENT_LOG_PATH = os.getenv("INTENT_LOG_PATH", os.path.join("storage", "intent_log.jsonl"))
+INTENT_LOG_MAX_BYTES = int(os.getenv("INTENT_LOG_MAX_BYTES", str(5 * 1024 * 1024)))  # then rotated to .1
+INTENT_LOG_TEXT = os.getenv("INTENT_LOG_TEXT", "0") == "1"   # log raw messages instead of token sets
+INTENT_WEIGHTS_PATH = os.getenv("INTENT_WEIGHTS_PATH", os.path.join("storage", "intent_weights.json"))
+CONFIDENCE_THRESHOLD = float(os.getenv("INTENT_CONFIDENCE", "0.8"))
+DECISION_CACHE_SIZE = 4096
+
+TOKEN = re.compile(r"[a-z0-9₹$]+")
+
+# Positive weights push towards HEAVY, negative towards FAST
+KEYWORD_WEIGHTS = {
+    # shopping / research verbs
+    "buy": 2.5, "purchase": 2.5, "order": 1.5, "recommend": 2.5, "recommendation": 2.5, "suggest": 2.0,
+    "compare": 2.5, "vs": 2.0, "versus": 2.0, "best": 2.0, "cheapest": 2.5, "cheap": 1.5, "affordable": 2.0,
+    "price": 2.5, "prices": 2.5, "cost": 2.0, "budget": 2.5, "under": 1.5, "below": 1.5, "within": 1.0,
+    "deal": 2.0, "deals": 2.0, "discount": 2.0, "offer": 1.5, "sale": 1.5, "review": 2.0, "reviews": 2.0,
+    "specs": 2.0, "specifications": 2.0, "features": 1.0, "worth": 1.5, "alternative": 2.0, "alternatives": 2.0,
+    "find": 1.5, "search": 1.5, "show": 1.0, "need": 1.0, "looking": 1.5, "want": 1.0, "gift": 1.5,
+    "link": 1.5, "amazon": 2.5, "flipkart": 2.5, "myntra": 2.5, "croma": 2.5, "rs": 2.0, "₹": 2.5, "inr": 2.0,
+    # product nouns
+    "laptop": 2.0, "laptops": 2.0, "phone": 2.0, "phones": 2.0, "mobile": 2.0, "iphone": 2.5, "samsung": 2.0,
+    "headphones": 2.0, "earbuds": 2.0, "watch": 1.5, "smartwatch": 2.0, "tv": 2.0, "camera": 2.0,
+    "shoes": 2.0, "sneakers": 2.0, "shirt": 1.5, "dress": 1.5, "bag": 1.5, "tablet": 2.0, "ipad": 2.0,
+    "monitor": 2.0, "keyboard": 1.5, "mouse": 1.0, "charger": 1.5, "fridge": 2.0, "refrigerator": 2.0,
+    "washing": 1.5, "machine": 1.0, "ac": 1.5, "speaker": 1.5, "console": 1.5, "ps5": 2.5, "gpu": 2.0,
+    # follow-ups on a previous answer ("show me cheaper ones")
+    "cheaper": 2.5, "costlier": 2.0, "pricier": 2.0, "more": 1.0, "other": 1.0, "similar": 1.5,
+    "ones": 1.5, "options": 2.0, "another": 1.5,
+    # small talk
+    "hi": -3.0, "hello": -3.0, "hey": -3.0, "hii": -3.0, "yo": -2.0, "thanks": -3.0, "thank": -3.0,
+    "thx": -3.0, "bye": -3.0, "goodbye": -3.0, "morning": -1.5, "evening": -1.5, "night": -1.5,
+    "who": -1.0, "you": -0.5, "your": -0.5, "name": -1.0, "joke": -2.0, "how": -0.5,
+}
+
+# Acknowledgements only mean small talk on their own ("ok", "nice!"); in longer
+# messages they usually preface a follow-up ("ok show me cheaper ones")
+ACK_WEIGHTS = {
+    "ok": -2.0, "okay": -2.0, "cool": -2.5, "nice": -2.0, "great": -1.5, "awesome": -2.0,
+    "lol": -2.5, "haha": -2.5,
+}
+ACK_MAX_TOKENS = 3
+
+PATTERN_WEIGHTS = [
+    (re.compile(r"https?://"), 4.0),                                   # pasted product link
+    (re.compile(r"(₹|rs\.?|inr)\s*\d|\d+\s*(k|rs|inr|rupees)\b"), 3.0),  # prices / budgets
+    (re.compile(r"\b(under|below|within|upto|up to)\s+\d"), 2.5),
+    (re.compile(r"\bwhich\b.*\b(should i|to) (buy|get|choose)\b"), 3.0),
+    (re.compile(r"^(hi|hello|hey|yo|hii+)\b[\s!.]*$"), -4.0),
+    (re.compile(r"^(thanks|thank you|thx|ok|okay|cool|bye|good (morning|night|evening))\b[\s!.]*$"), -4.0),
+    (re.compile(r"\bhow are you\b|\bwho are you\b|\bwhat can you do\b"), -3.0),
+]
+
+BIAS = -0.5            # slight FAST prior for messages with no evidence
+SHORT_MESSAGE_BIAS = -1.0
+
+
+def tokenize(text: str):
+    return TOKEN.findall(text.lower())
+
+
+def normalize(text: str) -> str:
+    return " ".join(tokenize(text))
+
+
+class IntentClassifier:
+    def __init__(self, weights_path: str = INTENT_WEIGHTS_PATH, threshold: float = CONFIDENCE_THRESHOLD):
+        self.threshold = threshold
+        self.learned = self._load_weights(weights_path)
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_weights(path: str) -> dict:
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def score(self, text: str) -> float:
+        """Returns P(HEAVY) for a message."""
+        lowered = text.lower().strip()
+        tokens = tokenize(lowered)
+        z = BIAS
+        if len(tokens) <= 2:
+            z += SHORT_MESSAGE_BIAS
+        short = len(tokens) <= ACK_MAX_TOKENS
+        for token in set(tokens):
+            z += KEYWORD_WEIGHTS.get(token, 0.0) + self.learned.get(token, 0.0)
+            if short:
+                z += ACK_WEIGHTS.get(token, 0.0)
+        for pattern, weight in PATTERN_WEIGHTS:
+            if pattern.search(lowered):
+                z += weight
+        return 1.0 / (1.0 + math.exp(-z))
+
+    def classify(self, text: str):
+        """Returns (intent, confidence). intent is None when below the confidence threshold."""
+        p_heavy = self.score(text)
+        intent = "HEAVY" if p_heavy >= 0.5 else "FAST"
+        confidence = max(p_heavy, 1.0 - p_heavy)
+        return (intent if confidence >= self.threshold else None), confidence
+
+    # --- Decision cache ---
+    # Keyed on the conversation context too: "tell me more" after a product
+    # answer is research, after small talk it is chit-chat.
+
+    def cached(self, text: str, context: str = ""):
+        key = f"{context}|{normalize(text)}"
+        with self._lock:
+            intent = self._cache.get(key)
+            if intent:
+                self._cache.move_to_end(key)
+            return intent
+
+    def remember(self, text: str, intent: str, context: str = ""):
+        key = f"{context}|{normalize(text)}"
+        with self._lock:
+            self._cache[key] = intent
+            self._cache.move_to_end(key)
+            while len(self._cache) > DECISION_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+
+_log_lock = threading.Lock()
+
+
+def log_decision(text: str, intent: str, source: str, path: str = INTENT_LOG_PATH,
+                 max_bytes: int = INTENT_LOG_MAX_BYTES, keep_text: bool = INTENT_LOG_TEXT):
+    """
+    Appends a labelled example (LLM decisions are the training labels). Blocking:
+    call it from a worker thread. By default only the message's distinct word
+    tokens are kept (no numbers, no word order), which is all train() needs.
+    """
+    if keep_text:
+        row = {"text": text}
+    else:
+        row = {"tokens": sorted(t for t in set(tokenize(text)) if not any(c.isdigit() for c in t))}
+    row.update(intent=intent, source=source)
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with _log_lock:
+            if os.path.exists(path) and os.path.getsize(path) >= max_bytes:
+                os.replace(path, path + ".1")
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    except Exception as e:
+        print(f"⚠️ Could not log intent decision: {e}")
+
+
+def train(log_path: str = INTENT_LOG_PATH, weights_path: str = INTENT_WEIGHTS_PATH,
+          min_count: int = 3, scale: float = 0.5) -> dict:
+    """
+    Learns smoothed per-token log-odds (HEAVY vs FAST) from the decision log and
+    writes them as additive weights for the local scorer.
+    """
+    counts = {"HEAVY": Counter(), "FAST": Counter()}
+    totals = Counter()
+    for path in (log_path + ".1", log_path):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    continue
+                intent = row.get("intent")
+                if intent not in counts:
+                    continue
+                totals[intent] += 1
+                counts[intent].update(set(row.get("tokens") or tokenize(row.get("text", ""))))
+
+    weights = {}
+    vocab = set(counts["HEAVY"]) | set(counts["FAST"])
+    for token in vocab:
+        heavy, fast = counts["HEAVY"][token], counts["FAST"][token]
+        if heavy + fast < min_count:
+            continue
+        p_heavy = (heavy + 1) / (totals["HEAVY"] + 2)
+        p_fast = (fast + 1) / (totals["FAST"] + 2)
+        weights[token] = round(scale * math.log(p_heavy / p_fast), 3)
+
+    os.makedirs(os.path.dirname(weights_path) or ".", exist_ok=True)
+    with open(weights_path, "w") as f:
+        json.dump(weights, f, indent=1, sort_keys=True)
+    return weights
+
+
+# Singleton instance
+intent_classifier = IntentClassifier()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local intent classifier tools")
+    parser.add_argument("--train", action="store_true", help="learn token weights from the decision log")
+    parser.add_argument("message", nargs="*", help="classify a message")
+    args = parser.parse_args()
+
+    if args.train:
+        learned = train()
+        print(f"✅ Learned {len(learned)} token weights -> {INTENT_WEIGHTS_PATH}")
+    if args.message:
+        text = " ".join(args.message)
+        print(intent_classifier.classify(text), round(intent_classifier.score(text), 3))
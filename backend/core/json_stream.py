@@ -0,0 +1,209 @@
+"""
+Tolerant JSON handling for the HEAVY agent's output.
+
+- ProductStreamParser: fed text chunks as Gemini streams them, it returns each
+  object of the "products" array as soon as its closing brace arrives.
+- parse_agent_json: extracts and parses the response object, repairing common
+  LLM syntax slips (code fences, smart quotes, trailing commas, Python literals,
+  single quotes, truncated output) locally before anyone considers another LLM call.
+"""
+import json
+import re
+
+PRODUCTS_KEY = re.compile(r"""["']?products["']?\s*:\s*\[""")
+CODE_FENCE = re.compile(r"```(?:json)?", re.IGNORECASE)
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+ANSWER_KEYS = ("agent_response", "products")   # a broken object without these is prose, not the answer
+
+
+class ProductStreamParser:
+    """Incrementally pulls complete product objects out of a streaming JSON response."""
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = 0            # next char to scan
+        self.in_array = False
+        self.done = False
+        self.depth = 0          # brace/bracket depth inside the current product
+        self.start = None       # index of the current product's opening brace
+        self.in_string = None   # quote char while inside a string
+        self.escape = False
+
+    def feed(self, chunk: str) -> list:
+        """Adds streamed text; returns products completed by it (dicts, in order)."""
+        self.buf += chunk
+        products = []
+        if self.done:
+            return products
+
+        if not self.in_array:
+            match = PRODUCTS_KEY.search(self.buf, max(0, self.pos - 20))
+            if not match:
+                self.pos = len(self.buf)
+                return products
+            self.in_array = True
+            self.pos = match.end()
+
+        buf = self.buf
+        i = self.pos
+        while i < len(buf):
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == self.in_string:
+                    self.in_string = None
+            elif ch in "\"'" and self.start is not None:
+                # Apostrophes inside bare words are not string delimiters
+                if ch == '"' or not buf[i - 1].isalnum():
+                    self.in_string = ch
+            elif ch in "{[":
+                if self.depth == 0 and ch == "{":
+                    self.start = i
+                self.depth += 1
+            elif ch in "}]":
+                if self.depth == 0 and ch == "]":
+                    self.done = True  # end of the products array
+                    break
+                self.depth -= 1
+                if self.depth == 0 and self.start is not None:
+                    product = loads_tolerant(buf[self.start:i + 1])
+                    if isinstance(product, dict):
+                        products.append(product)
+                    self.start = None
+            i += 1
+        self.pos = i
+        return products
+
+
+def strip_code_fences(text: str) -> str:
+    return CODE_FENCE.sub("", text).strip()
+
+
+def extract_object(text: str) -> str:
+    """The outermost {...} in text (or everything from the first '{' if it's truncated)."""
+    start = text.find("{")
+    if start == -1:
+        return ""
+    depth = 0
+    in_string = False
+    escape = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch == "{":
+            depth += 1
+        elif ch == "}":
+            depth -= 1
+            if depth == 0:
+                return text[start:i + 1]
+    return text[start:]
+
+
+def _replace_outside_strings(text: str, fn) -> str:
+    """Applies fn to the segments of text that are not inside double-quoted strings."""
+    out = []
+    segment_start = 0
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+                out.append(text[segment_start:i + 1])
+                segment_start = i + 1
+        elif ch == '"':
+            out.append(fn(text[segment_start:i]))
+            segment_start = i
+            in_string = True
+    tail = text[segment_start:]
+    out.append(tail if in_string else fn(tail))
+    return "".join(out)
+
+
+def _close_truncated(text: str) -> str:
+    """Closes an unterminated string and any open brackets (truncated generations)."""
+    stack = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    if in_string:
+        text += '"'
+    text = re.sub(r",\s*$", "", text.rstrip())
+    return text + "".join(reversed(stack))
+
+
+def repair_json(text: str) -> str:
+    """Best-effort local fix-up of LLM-produced JSON text."""
+    text = strip_code_fences(text.translate(SMART_QUOTES))
+    text = extract_object(text) or text
+    if '"' not in text and "'" in text:
+        text = text.replace("'", '"')
+    text = _replace_outside_strings(text, lambda seg: re.sub(
+        r"\b(True|False|None)\b", lambda m: PY_LITERALS[m.group(1)], seg))
+    text = _close_truncated(text)
+    text = _replace_outside_strings(text, lambda seg: TRAILING_COMMA.sub(r"\1", seg))
+    return text
+
+
+def loads_tolerant(text: str):
+    """json.loads, retrying once on the locally repaired text. Returns None if both fail."""
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    try:
+        return json.loads(repair_json(text))
+    except ValueError:
+        return None
+
+
+def parse_agent_json(raw: str):
+    """
+    Parses the agent's JSON object out of a raw response.
+    Returns (parsed_dict_or_None, error_message); the error is None for plain-text
+    answers, including ones whose only braces don't hold the answer keys, so an
+    LLM repair is only worth trying when the error is set.
+    """
+    candidate = extract_object(strip_code_fences(raw or ""))
+    if not candidate:
+        return None, None
+    try:
+        return json.loads(candidate), None
+    except ValueError as e:
+        error = str(e)
+    parsed = loads_tolerant(candidate)
+    if isinstance(parsed, dict):
+        return parsed, None
+    if not any(key in candidate for key in ANSWER_KEYS):
+        return None, None
+    return None, error
@@ -19,7 +19,7 @@ CRITICAL RULES:
 4. **JSON OUTPUT:**
     - If the user explicitly asks for recommendations or products, you MUST output a valid JSON object.
     - If the user just wants to chat (e.g., "Hi", "Thanks"), output JSON with an empty `products` list.
-    - Format: `{"agent_response": "...", "products": [{"name": "Product Name", "reason": "Why it's a match", "link": "https://..."}], "predictive_insight": "..."}`
+    - Format: `{"agent_response": "...", "products": [{"name": "Product Name", "category": "Product Category", "reason": "Why it's a match", "link": "https://..."}], "predictive_insight": "..."}`
 """
 # Template for JSON Repair (Self-Correction)
 JSON_REPAIR_PROMPT = """
@@ -1,32 +1,94 @@
 import os
-import google.generativeai as genai
+import asyncio
 from dotenv import load_dotenv
+from core.intent_classifier import intent_classifier, log_decision
+from core.context_manager import message_text
+from utils.history_codec import field_value
+from utils.llm_client import llm
+from utils.metrics import metrics
+from core.admission import admission, LANE_FAST, Overloaded
 
 load_dotenv()
-# Use a separate lightweight client for routing to avoid blocking
-router_api_key = os.getenv("GOOGLE_API_KEY")
-if router_api_key:
-    genai.configure(api_key=router_api_key)
+ROUTER_MODEL = "gemini-2.5-flash-lite"
+ROUTER_TIMEOUT = float(os.getenv("ROUTER_TIMEOUT", "5"))  # seconds per attempt; every turn waits on routing
 
-def classify_intent(user_input: str, has_image: bool = False) -> str:
-    """
-    Returns 'FAST' for chitchat/greetings, 'HEAVY' for shopping/research.
-    """
+ROUTER_PROMPT = "Classify this message as either 'FAST' (greeting, small talk) or 'HEAVY' (shopping request, product search, research).\nConversation so far: {context}\nMessage: {message}\nOutput:"
+
+CONTEXT_DESCRIPTIONS = {
+    "new": "new conversation",
+    "products": "the assistant just recommended products",
+    "chat": "small talk",
+}
+
+def conversation_context(history: list) -> str:
+    """'new', 'products' or 'chat', from the last model message: follow-ups depend on it."""
+    for message in reversed(history or []):
+        if field_value(message, "role") == "model":
+            return "products" if '"products"' in message_text(message) else "chat"
+    return "new"
+
+def _prompt(user_input: str, context: str) -> str:
+    return ROUTER_PROMPT.format(message=user_input, context=CONTEXT_DESCRIPTIONS.get(context, "unknown"))
+
+def _local_intent(user_input: str, has_image: bool = False, context: str = ""):
+    """Zero-latency routing. Returns None when the LLM has to decide."""
     if has_image:
         return "HEAVY" # Images always need the heavy multimodal agent
-    
-    # Heuristics for speed (Zero Latency)
-    input_lower = user_input.lower().strip()
-    fast_triggers = ['hi', 'hello', 'hey', 'good morning', 'thanks', 'cool', 'bye']
-    if input_lower in fast_triggers:
+
+    cached = intent_classifier.cached(user_input, context)
+    if cached:
+        return cached
+
+    intent, confidence = intent_classifier.classify(user_input)
+    if intent:
+        intent_classifier.remember(user_input, intent, context)
+    return intent
+
+def _parse_llm_intent(text: str) -> str:
+    """Validates the router model's output; anything unexpected goes HEAVY."""
+    label = (text or "").strip().upper()
+    if "FAST" in label and "HEAVY" not in label:
         return "FAST"
+    return "HEAVY"
+
+def classify_intent(user_input: str, has_image: bool = False, context: str = "") -> str:
+    """
+    Returns 'FAST' for chitchat/greetings, 'HEAVY' for shopping/research.
+    `context` comes from conversation_context(history).
+    """
+    intent = _local_intent(user_input, has_image, context)
+    if intent:
+        return intent
         
-    # If heuristic fails, use a tiny Flash model call
+    # Ambiguous for the local classifier: use a tiny Flash model call
+    try:
+        response = llm.generate_sync(_prompt(user_input, context), model=ROUTER_MODEL, timeout=ROUTER_TIMEOUT)
+        intent = _parse_llm_intent(response.text)
+        intent_classifier.remember(user_input, intent, context)
+        log_decision(user_input, intent, source="llm")
+        return intent
+    except Exception:
+        return "HEAVY" # Default to heavy on error
+
+async def classify_intent_async(user_input: str, has_image: bool = False, context: str = "") -> str:
+    """Non-blocking version of classify_intent for the API event loop."""
+    intent = _local_intent(user_input, has_image, context)
+    if intent:
+        return intent
+
     try:
-        model = genai.GenerativeModel("gemini-2.5-flash-lite")
-        response = model.generate_content(
-            f"Classify this message as either 'FAST' (greeting, small talk) or 'HEAVY' (shopping request, product search, research).\nMessage: {user_input}\nOutput:",
-        )
-        return response.text.strip().upper()
-    except:
-        return "HEAVY" # Default to heavy on error
\ No newline at end of file
+        # Every turn waits on routing, so it goes ahead of both lanes
+        with metrics.span("route_llm"):
+            async with admission.slot("llm", priority=LANE_FAST):
+                response = await llm.generate(_prompt(user_input, context), model=ROUTER_MODEL,
+                                              timeout=ROUTER_TIMEOUT)
+        intent = _parse_llm_intent(response.text)
+        intent_classifier.remember(user_input, intent, context)
+        # File append off the event loop
+        await asyncio.to_thread(log_decision, user_input, intent, "llm")
+        return intent
+    except Overloaded:
+        raise  # the API answers 429 with Retry-After
+    except Exception:
+        metrics.record_error("llm", "router")
+        return "HEAVY" # Default to heavy on error
@@ -0,0 +1,290 @@
+"""
+Semantic cache for HEAVY answers.
+
+Near-duplicate shopping questions ("best laptop under 50000", "laptop under 50k best")
+map to the same answer. Candidates are found through an inverted index on query
+words and ranked by cosine similarity; a hit above the threshold (and within the
+TTL) skips search, scraping and the LLM calls. Vectors are either:
+
+    lexical    - sparse bag-of-words + character trigrams (default: free, no model)
+    embeddings - the catalog's embedding provider (tools/embeddings) over the
+                 canonical tokens, which also matches paraphrases
+
+Prices, model numbers, storage sizes, variant words ("pro", "max", "fe"),
+comparison words ("under"/"above") and the remaining content words must match
+exactly, so "laptop under 30000" never reuses the answer for "laptop under 50000",
+nor "iphone 15 pro" or "hp laptop" the one for "iphone 15" or "laptop". Only
+word order, plurals, stopwords and filler like "best"/"top" may differ.
+"""
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from typing import Optional
+from tools.search_cache import normalize_query, DISK_EVICT_EVERY
+
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "10800"))             # seconds
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "2000"))              # entries
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.85"))  # cosine similarity
+SEMANTIC_CACHE_DB = os.getenv("SEMANTIC_CACHE_DB", os.path.join("storage", "semantic_cache.db"))  # "" disables disk
+SEMANTIC_CACHE_VECTORS = os.getenv("SEMANTIC_CACHE_VECTORS", "lexical")          # "lexical" or "embeddings"
+SEMANTIC_CACHE_DENSE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_DENSE_THRESHOLD", "0.9"))
+
+NUMBER = re.compile(r"^₹?(\d+(?:\.\d+)?)(k|l|lakh|lakhs|lac)?$")
+MULTIPLIERS = {"k": 1000, "l": 100000, "lakh": 100000, "lakhs": 100000, "lac": 100000}
+CURRENCY = {"rs", "rs.", "inr", "rupees", "rupee", "₹"}
+STOPWORDS = {"a", "an", "the", "for", "of", "in", "me", "i", "my", "show", "please", "some", "any",
+             "what", "which", "is", "are", "to", "can", "you", "find", "get", "with", "and", "on"}
+COMPARATORS = {"under": "<", "below": "<", "within": "<", "upto": "<", "less": "<", "cheaper": "<",
+               "above": ">", "over": ">", "minimum": ">", "atleast": ">"}
+# Product variants: same words otherwise, different product and price
+VARIANTS = {"pro", "max", "plus", "ultra", "mini", "lite", "fe", "se", "air", "neo"}
+# Filler that doesn't change which products answer the question
+SOFT_WORDS = {"best", "top", "good", "great", "buy", "online", "india", "recommend", "recommended",
+              "suggest", "option", "latest"}
+# Words that make a message depend on the conversation so far
+FOLLOW_UP = {"this", "that", "these", "those", "it", "its", "them", "they", "previous", "earlier",
+             "same", "another", "other", "others", "else", "cheaper", "costlier", "ones"}
+TRIGRAM_WEIGHT = 0.3
+
+
+def canonical_tokens(text: str) -> list:
+    """'Best laptops under Rs 50k' -> ['best', 'laptop', 'under', '50000']"""
+    text = re.sub(r"(?<=\d),(?=\d)", "", text)
+    tokens = []
+    for token in normalize_query(text).split():
+        token = token.strip(".-")
+        if not token or token in CURRENCY or token in STOPWORDS:
+            continue
+        match = NUMBER.match(token)
+        if match:
+            value = float(match.group(1)) * MULTIPLIERS.get(match.group(2), 1)
+            token = str(int(value)) if value == int(value) else str(value)
+        elif token.startswith("₹"):
+            token = token[1:]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss") and token not in VARIANTS:
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+def embed_query(text: str) -> dict:
+    """Sparse, L2-normalized feature vector: whole words plus character trigrams."""
+    vector = defaultdict(float)
+    for token in canonical_tokens(text):
+        vector["w:" + token] += 1.0
+        padded = f"#{token}#"
+        for i in range(len(padded) - 2):
+            vector["c:" + padded[i:i + 3]] += TRIGRAM_WEIGHT
+    norm = math.sqrt(sum(v * v for v in vector.values())) or 1.0
+    return {k: v / norm for k, v in vector.items()}
+
+
+def cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
+
+
+def guard_signature(text: str) -> tuple:
+    """
+    Tokens that must match exactly for a cache hit: anything with a digit (prices,
+    model numbers like "15" or "s24", storage like "128gb"), variant words, the
+    comparison direction, and every other content word ("hp", "bag", "gaming").
+    """
+    tokens = canonical_tokens(text)
+    numbers = sorted({t for t in tokens if any(c.isdigit() for c in t)})
+    variants = sorted({t for t in tokens if t in VARIANTS})
+    comparators = sorted({COMPARATORS[t] for t in tokens if t in COMPARATORS})
+    content = sorted(set(tokens) - SOFT_WORDS - set(COMPARATORS) - set(numbers) - set(variants))
+    return tuple(numbers), tuple(variants), tuple(comparators), tuple(content)
+
+
+def is_self_contained(text: str) -> bool:
+    """True if the message can be answered without the conversation (safe to share across users)."""
+    if re.search(r"https?://", text):
+        return False
+    words = set(normalize_query(text).split())
+    return not (words & FOLLOW_UP) and len(canonical_tokens(text)) >= 2
+
+
+class SemanticCache:
+    """
+    In-memory vector index of previous HEAVY answers with an optional SQLite backing
+    store. Candidates are found through an inverted index on query words, then
+    ranked by cosine similarity of the lexical vectors, or of `embedder` vectors
+    when one is given. Blocking (SQLite, possibly a remote embedder): call it
+    from a worker thread.
+    """
+
+    def __init__(self, ttl: float = SEMANTIC_CACHE_TTL, max_entries: int = SEMANTIC_CACHE_SIZE,
+                 threshold: float = SEMANTIC_CACHE_THRESHOLD, db_path: str = SEMANTIC_CACHE_DB,
+                 clock=time.time, embedder=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.clock = clock
+        self.embedder = embedder
+        self._entries = OrderedDict()        # key -> (expires_at, vector, guard, value, dense vector | None)
+        self._postings = defaultdict(set)    # "w:<token>" -> keys
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()     # SQLite is never touched under _lock
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    # --- Disk layer ---
+
+    def _open_db(self, db_path: str):
+        try:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS semantic_cache ("
+                "key TEXT PRIMARY KEY, query TEXT NOT NULL, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS semantic_cache_expires ON semantic_cache (expires_at)")
+            self._db.execute("DELETE FROM semantic_cache WHERE expires_at < ?", (self.clock(),))
+            self._db.commit()
+            rows = self._db.execute(
+                "SELECT query, value, expires_at FROM semantic_cache ORDER BY expires_at DESC LIMIT ?",
+                (self.max_entries,),
+            ).fetchall()
+            rows = list(reversed(rows))
+            dense = self._embed([query for query, _, _ in rows])
+            for (query, value, expires_at), vector in zip(rows, dense):
+                self._remember(query, value, expires_at, vector)
+        except sqlite3.Error as e:
+            print(f"⚠️ Semantic cache disk store disabled: {e}")
+            self._db = None
+
+    # --- Index ---
+
+    def _embed(self, queries: list) -> list:
+        """Dense vectors for `queries` (Nones without an embedder), from their canonical tokens."""
+        if self.embedder is None or not queries:
+            return [None] * len(queries)
+        try:
+            vectors = self.embedder.embed([" ".join(canonical_tokens(q)) for q in queries], task="query")
+        except Exception as e:
+            # Entries without a dense vector are compared lexically
+            print(f"⚠️ Semantic cache embedding failed: {e}")
+            return [None] * len(queries)
+        return [v / max(float(v @ v) ** 0.5, 1e-12) for v in vectors]
+
+    def _remember(self, query: str, value: str, expires_at: float, dense=None):
+        key = " ".join(sorted(canonical_tokens(query)))
+        self._forget(key)
+        vector = embed_query(query)
+        self._entries[key] = (expires_at, vector, guard_signature(query), value, dense)
+        for feature in vector:
+            if feature.startswith("w:"):
+                self._postings[feature].add(key)
+        while len(self._entries) > self.max_entries:
+            self._forget(next(iter(self._entries)))
+
+    def _forget(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for feature in entry[1]:
+            keys = self._postings.get(feature)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._postings[feature]
+
+    def get(self, query: str) -> Optional[str]:
+        """The cached answer for the most similar fresh query above the threshold, or None."""
+        vector = embed_query(query)
+        guard = guard_signature(query)
+        dense = self._embed([query])[0]
+        now = self.clock()
+        with self._lock:
+            candidates = set()
+            for feature in vector:
+                if feature.startswith("w:"):
+                    candidates |= self._postings.get(feature, set())
+
+            best_key, best_score = None, self.threshold
+            for key in candidates:
+                expires_at, entry_vector, entry_guard, _, entry_dense = self._entries[key]
+                if expires_at <= now:
+                    continue
+                if entry_guard != guard:
+                    continue
+                if dense is not None and entry_dense is not None:
+                    score = float(dense @ entry_dense)
+                else:
+                    score = cosine(vector, entry_vector)
+                if score >= best_score:
+                    best_key, best_score = key, score
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][3]
+
+    def set(self, query: str, value: str):
+        expires_at = self.clock() + self.ttl
+        dense = self._embed([query])[0]
+        with self._lock:
+            self._remember(query, value, expires_at, dense)
+        if self._db is None:
+            return
+        try:
+            with self._db_lock:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO semantic_cache (key, query, value, expires_at) VALUES (?, ?, ?, ?)",
+                    (" ".join(sorted(canonical_tokens(query))), query, value, expires_at),
+                )
+                self._writes += 1
+                if self._writes % DISK_EVICT_EVERY == 0:
+                    self._db.execute("DELETE FROM semantic_cache WHERE expires_at < ?", (self.clock(),))
+                    self._db.execute(
+                        "DELETE FROM semantic_cache WHERE key IN (SELECT key FROM semantic_cache "
+                        "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,),
+                    )
+                self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Semantic cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._postings.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM semantic_cache")
+                self._db.commit()
+
+
+def build_cache(vectors: str = SEMANTIC_CACHE_VECTORS) -> SemanticCache:
+    if vectors == "embeddings":
+        from tools.embeddings import get_embedder
+        return SemanticCache(threshold=SEMANTIC_CACHE_DENSE_THRESHOLD, embedder=get_embedder())
+    return SemanticCache()
+
+
+# Singleton instance
+semantic_cache = build_cache()
@@ -1,31 +1,73 @@
 import os
 import json
-import re
-import time
-from typing import Any, Dict, List, Optional
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
 import google.generativeai as genai
-from tools.search_tool import search_web
+from utils.llm_client import llm, LLMUnavailable
+from tools.search_tool import search_web, SEARCH_UNAVAILABLE
 from tools.scraper import scrape_url
+from tools.url_utils import extract_links
+from tools.catalog import catalog, format_results
+from core.context_manager import user_message, model_message
+from core.json_stream import parse_agent_json
+from core.semantic_cache import semantic_cache, is_self_contained
+from utils.metrics import metrics
+from core.prompts import JSON_REPAIR_PROMPT
+from core.admission import admission
+
+# Fan-out: scrape the top N search results concurrently within a global time budget
+FANOUT_RESULTS = int(os.getenv("HEAVY_FANOUT_RESULTS", "3"))
+FANOUT_BUDGET = float(os.getenv("HEAVY_FANOUT_BUDGET", "8"))
+FANOUT_CONTEXT_CHARS = 12000  # total scraped chars handed to synthesis
+
+# How run_heavy talks to the model:
+#   single_shot - native function calling: the model answers or calls search_web in one response
+#   speculative - plan step as before, with search_web on the raw message started in parallel
+#   classic     - plan, then search, then synthesize (three sequential steps)
+HEAVY_MODE = os.getenv("HEAVY_MODE", "single_shot")
+# single_shot: search rounds the model may ask for; the last function response disables tools
+SINGLE_SHOT_MAX_SEARCHES = int(os.getenv("SINGLE_SHOT_MAX_SEARCHES", "2"))
+NO_TOOL_CALLS = {"function_calling_config": {"mode": "NONE"}}
+# Streamed text from a tool-enabled call is held until it is clearly an answer, so a
+# preamble the model writes before calling search_web never reaches the client
+PREAMBLE_HOLD_CHARS = 200
+
+# Degraded answers while the LLM circuit is open (see utils/llm_client)
+FAST_FALLBACK = "Sorry, I'm having trouble thinking right now. Please try again in a moment."
+BUSY_FALLBACK = "Our assistant is overloaded right now, so I couldn't research this. Please try again in a minute."
+
+SEARCH_TOOL = genai.protos.Tool(function_declarations=[
+    genai.protos.FunctionDeclaration(
+        name="search_web",
+        description="Search the product catalog and the web for real-time product information, prices, reviews and buy links.",
+        parameters=genai.protos.Schema(
+            type=genai.protos.Type.OBJECT,
+            properties={"query": genai.protos.Schema(
+                type=genai.protos.Type.STRING,
+                description="Search query, e.g. 'best laptop under 50000 india amazon flipkart'",
+            )},
+            required=["query"],
+        ),
+    )
+])
 
 class AgentResponse:
-    def __init__(self, output: str, chat_history: List[Dict[str, Any]]):
+    def __init__(self, output: str, chat_history: List[Dict[str, Any]], new_messages: List[Any] = None):
         self.output = output
         self.chat_history = chat_history
+        # Messages to persist for this turn (user message + final answer, no tool prompts/context)
+        self.new_messages = new_messages if new_messages is not None else chat_history[-2:]
 
 class Agent:
     def __init__(self, model: str, name: str, instruction: str):
         self.model_name = model
         self.instruction = instruction
         
-        # Configure API
-        api_key = os.getenv("GOOGLE_API_KEY")
-        if not api_key: print("❌ Error: GOOGLE_API_KEY not found")
-        genai.configure(api_key=api_key)
-        
-        self.model = genai.GenerativeModel(
-            model_name=model,
-            system_instruction=instruction
-        )
+        # Shared client: configured once, models cached (see utils/llm_client)
+        self.model = llm.model(model, instruction)
+        # Same model with search_web exposed as a native tool (single-shot mode)
+        self.tool_model = llm.model(model, instruction, tools=[SEARCH_TOOL])
 
     def run_fast(self, user_input: str, chat_history: list) -> AgentResponse:
         """Direct Chat for 'Hey', 'Hello' - No Tools, No Delays"""
@@ -36,48 +78,349 @@ class Agent:
     def run_heavy(self, user_input: Any, chat_history: list) -> AgentResponse:
         """
         Agentic Workflow: Plan -> Search -> Scrape -> Answer
+        Blocking entry point for scripts and worker threads; the API uses run_heavy_async.
+        Called from a thread that is already running an event loop, the turn runs on a
+        private loop in a helper thread (asyncio.run can't nest) and blocks that loop.
         """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(self.run_heavy_async(user_input, chat_history))
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="run-heavy") as executor:
+            return executor.submit(asyncio.run, self.run_heavy_async(user_input, chat_history)).result()
+
+    # --- ASYNC PIPELINE (used by the API so one worker can serve many chats) ---
+
+    # `emit` (optional): async callback(event, data) that receives progress events and
+    # answer tokens as they stream in; used by the SSE endpoint.
+
+    async def run_fast_async(self, user_input: str, chat_history: list, emit=None) -> AgentResponse:
+        """Non-blocking version of run_fast for the FastAPI event loop."""
         chat = self.model.start_chat(history=chat_history)
-        
+        try:
+            response = await self._send(chat, user_input, emit)
+        except LLMUnavailable as e:
+            print(f"⚠️ [Agent] LLM unavailable, canned reply: {e}")
+            return await self._degraded(user_input, chat_history, FAST_FALLBACK, emit)
+        return AgentResponse(response.text, chat.history)
+
+    async def run_heavy_async(self, user_input: Any, chat_history: list, emit=None) -> AgentResponse:
+        """
+        Non-blocking version of run_heavy.
+        LLM calls use the async Gemini API; search/scrape run in worker threads,
+        with the top search results scraped concurrently. HEAVY_MODE picks how
+        many model round trips a turn takes.
+        """
+        # Near-duplicate standalone questions reuse a recent answer (no search, scrape or LLM)
+        cacheable = isinstance(user_input, str) and is_self_contained(user_input)
+        if cacheable:
+            with metrics.span("semantic_cache"):
+                cached = await asyncio.to_thread(semantic_cache.get, user_input)
+            if cached is not None:
+                print(f"⚡ [Agent] Semantic cache hit for: {user_input}")
+                metrics.annotate(cache="semantic")
+                await self._emit(emit, "status", {"stage": "cached"})
+                await self._emit(emit, "token", {"text": cached})
+                return AgentResponse(cached, chat_history, [user_message(user_input), model_message(cached)])
+
+        try:
+            if HEAVY_MODE == "single_shot":
+                response = await self._run_single_shot(user_input, chat_history, emit)
+            else:
+                response = await self._run_planned(user_input, chat_history,
+                                                   speculative=HEAVY_MODE == "speculative", emit=emit)
+        except LLMUnavailable as e:
+            print(f"⚠️ [Agent] LLM unavailable, answering from the catalog: {e}")
+            return await self._degraded(user_input, chat_history, await self._catalog_answer(user_input), emit)
+
+        # Only product answers are shared; plain-text replies may be personal
+        if cacheable:
+            parsed, _ = parse_agent_json(response.output)
+            if parsed and parsed.get("products"):
+                await asyncio.to_thread(metrics.timed("semantic_cache_store", semantic_cache.set),
+                                        user_input, response.output)
+        return response
+
+    async def _run_single_shot(self, user_input: Any, chat_history: list, emit=None) -> AgentResponse:
+        """
+        One call that either answers or asks for search_web; more calls only if it searched.
+        The model may search again after seeing results, up to SINGLE_SHOT_MAX_SEARCHES
+        rounds; the last round's results are sent with function calling disabled.
+        """
+        chat = self.tool_model.start_chat(history=chat_history)
+
+        print(f"🤖 [Agent] Single-shot for: {user_input}")
+        prompt = (
+            f"User Request: {user_input}\n"
+            "Call search_web if you need real-time information (products, prices, links); "
+            "otherwise answer directly. "
+            "If you recommend products, output them in the required JSON format."
+        )
+        with metrics.span("llm_single_shot"):
+            resp = await self._send(chat, prompt, emit, hold_preamble=True)
+
+        rounds = 0
+        calls = self._function_calls(resp)
+        while calls:
+            rounds += 1
+            final = rounds >= SINGLE_SHOT_MAX_SEARCHES
+            queries = [str(dict(call.args).get("query") or user_input) for call in calls]
+            contexts = await asyncio.gather(*(self._gather_context(query, emit) for query in queries))
+            print("🧠 [Agent] Synthesizing Final Answer")
+            await self._emit(emit, "status", {"stage": "synthesizing"})
+            reply = genai.protos.Content(parts=[
+                genai.protos.Part(function_response=genai.protos.FunctionResponse(
+                    name=call.name, response={"result": context_data}
+                ))
+                for call, context_data in zip(calls, contexts)
+            ])
+            with metrics.span("llm_synthesize"):
+                if final:
+                    resp = await self._send(chat, reply, emit, tool_config=NO_TOOL_CALLS)
+                else:
+                    resp = await self._send(chat, reply, emit, hold_preamble=True)
+            calls = [] if final else self._function_calls(resp)
+
+        history = chat.history
+        return AgentResponse(self._text(resp), history, [user_message(user_input), history[-1]])
+
+    async def _run_planned(self, user_input: Any, chat_history: list, speculative: bool = False,
+                           emit=None) -> AgentResponse:
+        """Plan -> Search -> Scrape -> Answer, optionally searching speculatively during the plan call."""
+        chat = self.model.start_chat(history=chat_history)
+
+        # Speculation: the raw message is usually a fine search query, so start it now
+        speculative_search = None
+        if speculative and isinstance(user_input, str):
+            speculative_search = asyncio.create_task(self._search(user_input, emit))
+
         # --- STEP 1: PLAN ---
         print(f"🤖 [Agent] Planning for: {user_input}")
+        await self._emit(emit, "status", {"stage": "planning"})
         plan_prompt = (
             f"User Request: {user_input}\n"
             "Do I need external information to answer this? "
             "If yes, output: 'SEARCH: <search_query>'\n"
             "If no, output: 'ANSWER'\n"
         )
-        plan_resp = chat.send_message(plan_prompt)
+        try:
+            with metrics.span("llm_plan"):
+                async with admission.slot("llm"):
+                    plan_resp = await llm.send(chat, plan_prompt)
+        except BaseException:
+            # Plan failed or the turn was cancelled: don't leave the search running
+            if speculative_search:
+                speculative_search.cancel()
+            raise
         decision = plan_resp.text.strip()
-        
+
         context_data = ""
-        
-        # --- STEP 2: TOOL EXECUTION ---
+
+        # --- STEP 2: TOOL EXECUTION (off the event loop) ---
         if "SEARCH:" in decision:
             query = decision.replace("SEARCH:", "").strip()
-            print(f"🔎 [Agent] Searching: {query}")
-            
-            # 1. Search Web
-            search_results = search_web(query)
-            context_data += f"\n--- SEARCH RESULTS ---\n{search_results}\n"
-            
-            # 2. Extract first valid link to scrape (Autonomously)
-            # Simple heuristic: find first http link in search results
-            match = re.search(r'(https?://[^\s]+)', search_results)
-            if match:
-                url = match.group(1)
-                print(f"🕷️ [Agent] Scraping: {url}")
-                scraped_text = scrape_url(url)
-                context_data += f"\n--- CONTENT FROM {url} ---\n{scraped_text[:10000]}\n"
+            context_data, sufficient = await self._catalog_context(query, emit)
+            if sufficient:
+                if speculative_search:
+                    await self._drop(speculative_search)
+            else:
+                search_results = None
+                if speculative_search:
+                    try:
+                        search_results = await speculative_search
+                    except Exception as e:
+                        print(f"⚠️ [Agent] Speculative search failed: {e}")
+                if search_results and search_results != SEARCH_UNAVAILABLE:
+                    print(f"⚡ [Agent] Using speculative search for: {user_input}")
+                else:
+                    search_results = await self._search(query, emit)
+                context_data += await self._scrape_context(search_results, emit)
+        elif speculative_search:
+            # Not needed after all; the search thread may still finish and warm the search cache
+            await self._drop(speculative_search)
 
         # --- STEP 3: SYNTHESIZE ---
         print("🧠 [Agent] Synthesizing Final Answer")
+        await self._emit(emit, "status", {"stage": "synthesizing"})
         final_prompt = (
             f"Original Request: {user_input}\n"
             f"Gathered Context: {context_data}\n"
             "Task: Provide the final helpful response. "
             "If you found products, output them in the required JSON format."
         )
-        
-        final_resp = chat.send_message(final_prompt)
-        return AgentResponse(final_resp.text, chat.history)
\ No newline at end of file
+
+        with metrics.span("llm_synthesize"):
+            final_resp = await self._send(chat, final_prompt, emit)
+        history = chat.history
+        return AgentResponse(final_resp.text, history, [user_message(user_input), history[-1]])
+
+    async def repair_json_async(self, raw: str, error: str) -> str:
+        """Last resort for output core/json_stream couldn't repair: ask the model to re-emit valid JSON."""
+        print(f"🩹 [Agent] Asking model to repair JSON ({error})")
+        async with admission.slot("llm"):
+            response = await llm.generate(
+                f"{JSON_REPAIR_PROMPT.format(error=error)}\nPrevious response:\n{raw}",
+                model=self.model_name, system_instruction=self.instruction,
+            )
+        return response.text
+
+    @staticmethod
+    def _function_calls(response) -> list:
+        """The function calls in a response; empty if the model answered directly."""
+        try:
+            return [part.function_call for part in response.candidates[0].content.parts
+                    if part.function_call and part.function_call.name]
+        except (IndexError, AttributeError):
+            return []
+
+    @staticmethod
+    def _text(response) -> str:
+        """Answer text (response.text raises when the response also holds a function call)."""
+        try:
+            return "".join(p.text for p in response.candidates[0].content.parts if p.text)
+        except (IndexError, AttributeError):
+            return ""
+
+    async def _degraded(self, user_input: Any, chat_history: list, text: str, emit=None) -> AgentResponse:
+        metrics.annotate(degraded=True)
+        await self._emit(emit, "token", {"text": text})
+        return AgentResponse(text, chat_history, [user_message(user_input), model_message(text)])
+
+    async def _catalog_answer(self, user_input: Any) -> str:
+        """Without the LLM: catalog hits as a product answer, else a busy message."""
+        found = {"results": []}
+        if isinstance(user_input, str):
+            try:
+                found = await asyncio.to_thread(catalog.search, user_input)
+            except Exception as e:
+                print(f"⚠️ [Agent] Catalog fallback failed: {e}")
+        products = []
+        for result in found["results"]:
+            meta = result["metadata"]
+            products.append({
+                "name": meta.get("Product Name") or result["document"][:80],
+                "category": meta.get("Category") or "",
+                "reason": f"Catalog match, price {meta['Price']}" if meta.get("Price") else "Catalog match",
+                "link": meta.get("Link") or meta.get("URL") or "",
+            })
+        if not products:
+            return BUSY_FALLBACK
+        return json.dumps({
+            "agent_response": "Our assistant is busy, so here are the closest matches from our catalog.",
+            "products": products,
+            "predictive_insight": "",
+        })
+
+    @staticmethod
+    async def _drop(task: asyncio.Task):
+        """Cancels a task and waits for it to unwind, so it doesn't outlive the turn."""
+        task.cancel()
+        await asyncio.wait({task})
+
+    @staticmethod
+    async def _emit(emit, event: str, data: dict):
+        if emit is not None:
+            await emit(event, data)
+
+    async def _send(self, chat, content, emit=None, hold_preamble: bool = False, **kwargs):
+        """
+        send_message_async; with `emit`, streams the answer and forwards text chunks as 'token' events.
+        `hold_preamble` (tool-enabled calls): text is held back until PREAMBLE_HOLD_CHARS have
+        arrived and dropped if the model calls a function instead of answering.
+        """
+        async with admission.slot("llm"):
+            if emit is None:
+                return await llm.send(chat, content, **kwargs)
+            response = await llm.send(chat, content, stream=True, **kwargs)
+            held, calling = ([] if hold_preamble else None), False
+            async for chunk in response:
+                try:
+                    parts = chunk.candidates[0].content.parts
+                except (IndexError, AttributeError):
+                    parts = []
+                if hold_preamble and any(p.function_call and p.function_call.name for p in parts):
+                    calling = True
+                text = "".join(p.text for p in parts if p.text)
+                if not text or calling:
+                    continue
+                if held is not None:
+                    held.append(text)
+                    if sum(len(t) for t in held) < PREAMBLE_HOLD_CHARS:
+                        continue
+                    text, held = "".join(held), None
+                await emit("token", {"text": text})
+            if held and not calling:
+                await emit("token", {"text": "".join(held)})
+            return response
+
+    async def _search(self, query: str, emit=None) -> str:
+        print(f"🔎 [Agent] Searching: {query}")
+        await self._emit(emit, "status", {"stage": "searching", "query": query})
+        with metrics.span("search"):
+            async with admission.slot("search"):
+                result = await asyncio.to_thread(search_web, query)
+        if result == SEARCH_UNAVAILABLE:
+            metrics.record_error("search", "unavailable")
+        return result
+
+    async def _gather_context(self, query: str, emit=None) -> str:
+        """Catalog first; the web (search + scrape) only when catalog recall is poor."""
+        catalog_context, sufficient = await self._catalog_context(query, emit)
+        if sufficient:
+            return catalog_context
+        return catalog_context + await self._scrape_context(await self._search(query, emit), emit)
+
+    async def _catalog_context(self, query: str, emit=None) -> tuple:
+        """(catalog hits as context, whether they are good enough to skip the web)."""
+        await self._emit(emit, "status", {"stage": "catalog", "query": query})
+        with metrics.span("catalog"):
+            found = await asyncio.to_thread(catalog.search, query)
+        metrics.event("catalog", outcome="sufficient" if found["sufficient"] else "web")
+        if not found["results"]:
+            return "", False
+        print(f"📚 [Agent] Catalog: {len(found['results'])} hits, coverage {found['coverage']}")
+        return f"\n--- CATALOG RESULTS ---\n{format_results(found['results'])}\n", found["sufficient"]
+
+    async def _scrape_context(self, search_results: str, emit=None) -> str:
+        """Search results plus the scraped top pages (deduped by canonical URL), as synthesis context."""
+        context_data = f"\n--- SEARCH RESULTS ---\n{search_results}\n"
+        urls = extract_links(search_results, limit=FANOUT_RESULTS)
+        for url in urls:
+            await self._emit(emit, "status", {"stage": "scraping", "url": url})
+        pages = await self._scrape_many(urls)
+        if pages:
+            per_page = FANOUT_CONTEXT_CHARS // len(pages)
+            for url, scraped_text in pages:
+                context_data += f"\n--- CONTENT FROM {url} ---\n{scraped_text[:per_page]}\n"
+        return context_data
+
+    async def _scrape_many(self, urls: List[str]) -> List[tuple]:
+        """
+        Scrapes URLs concurrently and returns (url, text) for those that finished
+        within FANOUT_BUDGET seconds, in search-rank order. Stragglers are dropped.
+        """
+        if not urls:
+            return []
+        print(f"🕷️ [Agent] Scraping {len(urls)} results: {urls}")
+        scrape = metrics.timed("scrape", scrape_url)
+
+        # The scrape slot stays taken until a straggler's thread really finishes
+        tasks = [asyncio.create_task(admission.run_in_thread("scrape", scrape, url)) for url in urls]
+        with metrics.span("scrape_fanout", urls=len(urls)):
+            done, pending = await asyncio.wait(tasks, timeout=FANOUT_BUDGET)
+        for task in pending:
+            task.cancel()
+        if pending:
+            print(f"⏱️ [Agent] {len(pending)} scrape(s) missed the {FANOUT_BUDGET}s budget")
+            metrics.event("scrape_budget_missed", len(pending))
+
+        pages = []
+        for url, task in zip(urls, tasks):
+            if task not in done or task.exception():
+                continue
+            text = task.result()
+            if text and not text.startswith("Error"):
+                pages.append((url, text))
+            else:
+                metrics.record_error("scrape")
+        return pages
\ No newline at end of file
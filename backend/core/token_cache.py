@@ -0,0 +1,131 @@
+"""
+Hot-path helpers for Firebase ID token verification (used by core/auth).
+
+- TokenCache: verified tokens keyed by SHA-256 of the token, kept until the
+  token's own `exp` (minus a small leeway), so repeat requests skip verification.
+- FirebaseKeyRing: Google's securetoken signing certificates, fetched ahead of
+  expiry by a background task so verification never waits on a key download.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+AUTH_CACHE_SIZE = int(os.getenv("AUTH_CACHE_SIZE", "10000"))
+AUTH_CACHE_MAX_TTL = float(os.getenv("AUTH_CACHE_MAX_TTL", "3600"))  # never trust a cached token longer than this
+EXP_LEEWAY = 30  # seconds; drop tokens slightly before they expire
+
+CERTS_URL = "https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com"
+KEY_REFRESH_MARGIN = 300   # refetch this long before the certificates' max-age runs out
+KEY_RETRY_AFTER = 60
+
+
+def token_key(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class TokenCache:
+    """LRU of decoded tokens; entries expire at the token's `exp` claim."""
+
+    def __init__(self, max_entries: int = AUTH_CACHE_SIZE, max_ttl: float = AUTH_CACHE_MAX_TTL,
+                 clock=time.time):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self.clock = clock
+        self._entries = OrderedDict()   # sha256(token) -> (expires_at, decoded)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[dict]:
+        key = token_key(token)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def set(self, token: str, decoded: dict):
+        now = self.clock()
+        expires_at = now + self.max_ttl
+        exp = decoded.get("exp")
+        if isinstance(exp, (int, float)):
+            expires_at = min(expires_at, exp - EXP_LEEWAY)
+        if expires_at <= now:
+            return
+        with self._lock:
+            key = token_key(token)
+            self._entries[key] = (expires_at, decoded)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+class FirebaseKeyRing:
+    """
+    Local verification of Firebase ID tokens against prefetched signing certificates.
+    `verify` returns None whenever it can't decide (no project id, no certificates,
+    unknown key id, any decode error); callers then fall back to firebase_admin.
+    """
+
+    def __init__(self, project_id: str = None, clock=time.time):
+        self.project_id = project_id
+        self.clock = clock
+        self.certs = {}
+        self.expires_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.project_id and self.certs and self.expires_at > self.clock())
+
+    def refresh(self) -> float:
+        """Fetches the certificates. Returns seconds until they should be fetched again."""
+        import requests
+        response = requests.get(CERTS_URL, timeout=5)
+        response.raise_for_status()
+        match = re.search(r"max-age=(\d+)", response.headers.get("Cache-Control", ""))
+        max_age = int(match.group(1)) if match else 3600
+        self.certs = response.json()
+        self.expires_at = self.clock() + max_age
+        return max(max_age - KEY_REFRESH_MARGIN, KEY_RETRY_AFTER)
+
+    async def run_refresh(self):
+        """Background task: keep the certificates fresh until cancelled."""
+        while True:
+            try:
+                delay = await asyncio.to_thread(self.refresh)
+            except Exception as e:
+                print(f"⚠️ Firebase key refresh failed: {e}")
+                delay = KEY_RETRY_AFTER
+            await asyncio.sleep(delay)
+
+    def verify(self, token: str) -> Optional[dict]:
+        if not self.ready:
+            return None
+        try:
+            from google.auth import jwt
+            claims = jwt.decode(token, certs=self.certs, audience=self.project_id)
+        except Exception:
+            return None
+        if claims.get("iss") != f"https://securetoken.google.com/{self.project_id}" or not claims.get("sub"):
+            return None
+        return dict(claims, uid=claims["sub"])
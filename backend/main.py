@@ -1,11 +1,24 @@
 from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from core.auth import verify_firebase_token
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
+from core.admission import admission, Overloaded
+from core.auth import verify_firebase_token, key_ring, token_cache
 from core.agent_builder import build_fast_agent, build_heavy_agent
-from core.router import classify_intent
+from core.router import classify_intent_async, conversation_context
+from core.context_manager import context_manager
+from core.json_stream import ProductStreamParser, parse_agent_json
+from core.semantic_cache import semantic_cache
+from utils.metrics import metrics
+from utils.llm_client import llm
 from utils.session_manager import session_manager
+from tools.crawlee_service import browser_pool
+from tools.predictor import insight_store
+from tools.search_cache import search_cache
+from tools.page_cache import page_cache
+from tools.catalog import catalog
+import asyncio
 import json
-import re
+import os
 
 app = FastAPI(title="ContextIQ Backend")
 
@@ -24,89 +37,286 @@ FAST_AGENT = build_fast_agent()
 HEAVY_AGENT = build_heavy_agent()
 print("✅ Agents Ready")
 
-@app.post("/agent/chat")
-async def chat_endpoint(
-    token_data: dict = Depends(verify_firebase_token),
-    message: str = Form(...),
-    session_id: str = Form(None),
-    image: UploadFile = File(None)
-):
-    user_id = token_data.get("uid")
+# Cache hit ratios exported at /metrics
+metrics.register_cache("search", search_cache.stats)
+metrics.register_cache("page", page_cache.stats)
+metrics.register_cache("semantic", semantic_cache.stats)
+metrics.register_cache("token", token_cache.stats)
+metrics.register_cache("embeddings", lambda: catalog.embedder.stats() if catalog.embedder else None)
+metrics.register_stats("llm", llm.stats)
+for pool_name, pool in admission.pools.items():
+    metrics.register_stats(f"admission_{pool_name}", pool.stats)
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request, exc: Overloaded):
+    # Shed load early: the client retries later instead of waiting out the 300s timeout
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc), "retry_after": exc.retry_after},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+@app.on_event("startup")
+async def warm_browser_pool():
+    # Launch Chromium in the background so the first HEAVY turn doesn't pay for it
+    browser_pool.warm()
+
+@app.on_event("startup")
+async def start_session_writer():
+    # Session saves go to the in-memory cache; this task flushes them to disk
+    app.state.session_writer = asyncio.create_task(session_manager.run_write_behind())
+
+@app.on_event("startup")
+async def start_key_refresher():
+    # Keeps Firebase signing keys prefetched so token checks stay local
+    if key_ring.project_id and os.getenv("MOCK_AUTH") != "true":
+        app.state.key_refresher = asyncio.create_task(key_ring.run_refresh())
+
+@app.on_event("shutdown")
+async def stop_key_refresher():
+    refresher = getattr(app.state, "key_refresher", None)
+    if refresher:
+        refresher.cancel()
+
+@app.on_event("shutdown")
+async def stop_session_writer():
+    writer = getattr(app.state, "session_writer", None)
+    if writer:
+        writer.cancel()
+        try:
+            await writer  # runs the final flush
+        except asyncio.CancelledError:
+            pass
+
+@app.on_event("shutdown")
+async def close_browser_pool():
+    await asyncio.to_thread(browser_pool.close)
+
+@app.on_event("shutdown")
+async def flush_slow_traces():
+    await asyncio.to_thread(metrics.flush_traces)
+
+async def _resolve_session(user_id: str, session_id: str) -> str:
+    """Returns a usable session id, creating a session for new/unknown ids."""
+    # Hot sessions come from memory; cold loads run in a worker thread
+    with metrics.span("session_resolve"):
+        if not session_id or session_id == "undefined":
+            session_id = await asyncio.to_thread(session_manager.create_session, user_id)
+        else:
+            session_data = await asyncio.to_thread(session_manager.load_session, session_id)
+            if not session_data:
+                # Create new session if invalid ID provided
+                session_id = await asyncio.to_thread(session_manager.create_session, user_id)
+    metrics.set_session(session_id)
+    return session_id
+
+async def _build_final_json(raw: str, intent: str, session_id: str) -> dict:
+    # Parse JSON if Heavy, or wrap Text if Fast
+    final_json = {
+        "agent_response": raw, 
+        "session_id": session_id, 
+        "products": []
+    }
     
-    # 1. Manage Session
-    if not session_id or session_id == "undefined":
-        session_id = session_manager.create_session(user_id)
-        
-    session_data = session_manager.load_session(session_id)
-    if not session_data:
-        # Create new session if invalid ID provided
-        session_id = session_manager.create_session(user_id)
-        session_data = session_manager.load_session(session_id)
-        
+    if intent == "HEAVY":
+        # Tolerant parse with local repair; another model call only if that fails
+        parsed, error = parse_agent_json(raw)
+        if parsed is None and error:
+            metrics.event("json_repair_llm")
+            try:
+                with metrics.span("json_repair"):
+                    parsed, _ = parse_agent_json(await HEAVY_AGENT.repair_json_async(raw, error))
+            except Exception as e:
+                metrics.record_error("llm", "json_repair")
+                print(f"⚠️ JSON repair failed: {e}")
+        if isinstance(parsed, dict):
+            final_json.update(parsed)
+        # Fallback to raw text
+
+        # Precomputed insight for the recommended products' category (no LLM call; file I/O, so off the loop)
+        products = final_json.get("products")
+        if products and isinstance(products, list) and not final_json.get("predictive_insight"):
+            insight = await asyncio.to_thread(insight_store.for_products, products)
+            if insight:
+                final_json["predictive_insight"] = insight
+
+    return final_json
+
+def _product_emitter(emit):
+    """Wraps `emit` so HEAVY answer tokens also yield a 'product' event per completed product card."""
+    parser = ProductStreamParser()
+
+    async def emit_with_products(event: str, data: dict):
+        await emit(event, data)
+        if event == "token":
+            for product in parser.feed(data.get("text", "")):
+                await emit("product", product)
+
+    return emit_with_products
+
+async def _run_chat_turn(session_id: str, message: str, image: UploadFile = None, emit=None) -> dict:
+    """One chat turn. Call with the session lock held. `emit` receives streaming events."""
+    # Re-read under the session lock to see the previous turn's messages
+    with metrics.span("session_load"):
+        session_data = await asyncio.to_thread(session_manager.load_session, session_id)
     history = session_data["history"]
+    summary = session_data.get("summary")
+    # Bounded prompt: running summary + recent window, within the token budget
+    with metrics.span("context_build"):
+        context = context_manager.build(history, summary)
 
     # 2. Route Intent
     has_image = image is not None
-    intent = classify_intent(message, has_image)
+    with metrics.span("route"):
+        intent = await classify_intent_async(message, has_image, conversation_context(history))
     print(f"🚦 Routing '{message}' to: {intent}")
+    metrics.annotate(intent=intent)
+    metrics.event("route", intent=intent)
+    if emit:
+        await emit("route", {"intent": intent})
 
     # 3. Execute
-    try:
+    if emit and intent == "HEAVY":
+        emit = _product_emitter(emit)
+    # Bounded per lane; raises Overloaded (429) when the lane's queue is full or too slow
+    async with admission.turn(intent):
         if intent == "FAST":
-            response = FAST_AGENT.run_fast(message, history)
+            with metrics.span("agent_fast"):
+                response = await FAST_AGENT.run_fast_async(message, context, emit=emit)
         else:
             # Heavy Agent handles images/tools logic
             # (If you have image processing logic, ensure run_heavy accepts it)
-            response = HEAVY_AGENT.run_heavy(message, history)
-
-        # 4. Save & Return
-        session_manager.save_session(session_id, response.chat_history)
-        
-        # Parse JSON if Heavy, or wrap Text if Fast
-        raw = response.output
-        final_json = {
-            "agent_response": raw, 
-            "session_id": session_id, 
-            "products": []
-        }
-        
-        if intent == "HEAVY":
-            # Attempt to parse JSON from heavy agent
-            try:
-                json_match = re.search(r'\{.*\}', raw, re.DOTALL)
-                if json_match:
-                    parsed = json.loads(json_match.group(0))
-                    final_json.update(parsed)
-            except:
-                pass # Fallback to raw text
+            with metrics.span("agent_heavy"):
+                response = await HEAVY_AGENT.run_heavy_async(message, context, emit=emit)
+
+    # 4. Save & Return (only the clean user/answer pair is persisted)
+    new_history = history + response.new_messages
+    with metrics.span("session_save"):
+        await asyncio.to_thread(session_manager.save_session, session_id, new_history)
+    if context_manager.needs_summary(new_history, summary):
+        _spawn(_refresh_summary(session_id, new_history, summary))
+
+    with metrics.span("finalize"):
+        return await _build_final_json(response.output, intent, session_id)
+
+@app.post("/agent/chat")
+async def chat_endpoint(
+    token_data: dict = Depends(verify_firebase_token),
+    message: str = Form(...),
+    session_id: str = Form(None),
+    image: UploadFile = File(None)
+):
+    user_id = token_data.get("uid")
+    
+    with metrics.trace("chat", session_id=session_id):
+        # 1. Manage Session
+        session_id = await _resolve_session(user_id, session_id)
+
+        try:
+            # One turn at a time per session, so concurrent requests can't drop each other's messages
+            async with session_manager.lock(session_id):
+                return await _run_chat_turn(session_id, message, image)
+        except Overloaded:
+            raise  # 429 via overloaded_handler
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            raise HTTPException(status_code=500, detail=str(e))
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+@app.post("/agent/chat/stream")
+async def chat_stream_endpoint(
+    token_data: dict = Depends(verify_firebase_token),
+    message: str = Form(...),
+    session_id: str = Form(None),
+    image: UploadFile = File(None)
+):
+    """
+    Same turn as /agent/chat, streamed as Server-Sent Events:
+      session -> route -> status (cached/planning/catalog/searching/scraping/synthesizing) -> token* -> products -> done
+    HEAVY turns also emit `product` (one card) as soon as each product object has streamed in.
+    `products` carries the same JSON body /agent/chat returns; failures emit `error`
+    (with status 429 and retry_after when the server is shedding load).
+    """
+    user_id = token_data.get("uid")
+    session_id = await _resolve_session(user_id, session_id)
+    queue = asyncio.Queue()
+
+    async def emit(event: str, data: dict):
+        await queue.put((event, data))
+
+    async def run_turn():
+        try:
+            with metrics.trace("chat_stream", session_id=session_id):
+                async with session_manager.lock(session_id):
+                    final_json = await _run_chat_turn(session_id, message, image, emit=emit)
+            await queue.put(("products", final_json))
+        except Overloaded as e:
+            await queue.put(("error", {"detail": str(e), "status": 429, "retry_after": e.retry_after}))
+        except Exception as e:
+            print(f"❌ Error: {e}")
+            await queue.put(("error", {"detail": str(e)}))
+        finally:
+            await queue.put(None)
+
+    async def event_stream():
+        # The turn runs as its own task so it still completes (and saves) if the client disconnects
+        _spawn(run_turn())
+        yield _sse("session", {"session_id": session_id})
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield _sse(*item)
+        yield _sse("done", {"session_id": session_id})
 
-        return final_json
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    except Exception as e:
-        print(f"❌ Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+# Strong refs so fire-and-forget tasks aren't garbage collected mid-flight
+_background_tasks = set()
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+async def _refresh_summary(session_id: str, history: list, summary: dict):
+    """Background: fold turns that left the window into the session's running summary."""
+    new_summary, changed = await context_manager.summarize(history, summary)
+    if changed:
+        await asyncio.to_thread(session_manager.set_summary, session_id, new_summary)
 
 @app.get("/agent/history")
 async def get_history(token_data: dict = Depends(verify_firebase_token)):
     user_id = token_data.get("uid")
-    sessions = session_manager.list_user_sessions(user_id)
+    with metrics.trace("history"):
+        with metrics.span("session_list"):
+            sessions = await asyncio.to_thread(session_manager.list_user_sessions, user_id)
     return sessions
 
 @app.get("/agent/session/{session_id}")
 async def get_session_details(session_id: str, token_data: dict = Depends(verify_firebase_token)):
     """Fetch messages for a specific session."""
     user_id = token_data.get("uid")
-    data = session_manager.load_session(session_id)
-    
-    if not data or data.get("user_id") != user_id:
-        raise HTTPException(status_code=404, detail="Session not found")
-    
-    messages = []
-    for msg in data["history"]:
-        role = "user" if msg.role == "user" else "assistant"
-        content = msg.parts[0].text if msg.parts else ""
-        messages.append({"role": role, "content": content})
-        
+    with metrics.trace("session", session_id=session_id):
+        with metrics.span("session_load"):
+            data = await asyncio.to_thread(session_manager.load_session, session_id)
+
+        if not data or data.get("user_id") != user_id:
+            raise HTTPException(status_code=404, detail="Session not found")
+
+        messages = []
+        for msg in data["history"]:
+            role = "user" if msg.role == "user" else "assistant"
+            content = msg.parts[0].text if msg.parts else ""
+            messages.append({"role": role, "content": content})
+
     return {"title": data.get("title"), "messages": messages}
 
 from pydantic import BaseModel
@@ -117,31 +327,38 @@ class TitleRequest(BaseModel):
 async def generate_title(req: TitleRequest, token_data: dict = Depends(verify_firebase_token)):
     """Generate a title for the session based on context."""
     user_id = token_data.get("uid")
-    data = session_manager.load_session(req.session_id)
-    
-    if not data or data.get("user_id") != user_id:
-         raise HTTPException(status_code=404, detail="Session not found")
-         
-    history = data["history"]
-    if not history:
-        return {"title": "New Chat"}
-    
-    # Simple heuristic title generation
-    first_msg = None
-    for msg in history:
-        if msg.role == "user":
-            first_msg = msg.parts[0].text
-            break
-            
-    if not first_msg:
-        return {"title": "New Chat"}
-        
-    words = first_msg.split()[:4]
-    title = " ".join(words).title()
-    
-    session_manager.save_session(req.session_id, history, title=title)
+    # Hold the turn lock from load to save, so a chat turn landing meanwhile isn't overwritten
+    async with session_manager.lock(req.session_id):
+        data = await asyncio.to_thread(session_manager.load_session, req.session_id)
+
+        if not data or data.get("user_id") != user_id:
+             raise HTTPException(status_code=404, detail="Session not found")
+
+        history = data["history"]
+        if not history:
+            return {"title": "New Chat"}
+
+        # Simple heuristic title generation
+        first_msg = None
+        for msg in history:
+            if msg.role == "user":
+                first_msg = msg.parts[0].text
+                break
+
+        if not first_msg:
+            return {"title": "New Chat"}
+
+        words = first_msg.split()[:4]
+        title = " ".join(words).title()
+
+        await asyncio.to_thread(session_manager.save_session, req.session_id, history, title=title)
     return {"title": title}
 
 @app.get("/health")
 def health_check():
-    return {"status": "ContextIQ is Online"}
\ No newline at end of file
+    return {"status": "ContextIQ is Online"}
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """Prometheus text format: stage/request latency histograms, cache hit ratios, upstream errors."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
\ No newline at end of file
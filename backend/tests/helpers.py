@@ -0,0 +1,60 @@
+"""Shared test doubles."""
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+
+
+class FakeClock:
+    """Callable clock for code that takes `clock=`; tests move time by setting `now`."""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def fake_search(query):
+    """search_web stand-in: two results with links."""
+    return "\n---\n".join(f"Title: {query} {i}\nLink: https://shop.example/item-{i}\nSnippet: Listing {i}."
+                          for i in range(1, 3))
+
+
+class AppTestCase(unittest.TestCase):
+    """
+    The FastAPI app with the benchmark fakes in place of Gemini, fake search and
+    scraping, no catalog, and a fresh session store per test.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        import google.generativeai as genai
+        from benchmarks.fakes import FakeGenerativeModel, Latencies
+        FakeGenerativeModel.latencies = Latencies(llm=0, llm_chunk=0, search=0, page=0)
+        with patch.object(genai, "GenerativeModel", FakeGenerativeModel):
+            import main
+        cls.main = main
+
+    def setUp(self):
+        from fastapi.testclient import TestClient
+        from core.semantic_cache import SemanticCache
+        from utils.session_manager import SessionManager
+        from utils.session_store import SQLiteSessionStore
+
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.manager = SessionManager(store=SQLiteSessionStore(os.path.join(tmp.name, "sessions.db")))
+        no_catalog = SimpleNamespace(search=lambda q: {"results": [], "sufficient": False, "coverage": 0.0})
+        for target, value in [
+            ("main.session_manager", self.manager),
+            ("core.shim.semantic_cache", SemanticCache(db_path="")),
+            ("core.shim.catalog", no_catalog),
+            ("core.shim.search_web", fake_search),
+            ("core.shim.scrape_url", lambda url: f"Great product page for {url}"),
+        ]:
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.client = TestClient(self.main.app, headers={"Authorization": "Bearer mock_token"})
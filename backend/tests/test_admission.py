@@ -0,0 +1,145 @@
+
+import asyncio
+import threading
+import unittest
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.admission import Admission, Pool, Overloaded, LANE_FAST, LANE_HEAVY, LANE_BACKGROUND
+
+class TestPool(unittest.TestCase):
+
+    def test_waiters_served_by_lane_then_fifo(self):
+        async def run():
+            pool = Pool("llm", limit=1, max_queue=10, timeout=5)
+            order = []
+
+            async def call(name, priority):
+                async with pool.slot(priority):
+                    order.append(name)
+                    await asyncio.sleep(0.01)
+
+            await pool.acquire()   # hold the only slot while the others queue
+            tasks = [asyncio.create_task(call(name, priority)) for name, priority in (
+                ("summary", LANE_BACKGROUND), ("heavy-1", LANE_HEAVY), ("fast", LANE_FAST), ("heavy-2", LANE_HEAVY))]
+            await asyncio.sleep(0.01)
+            pool.release()
+            await asyncio.gather(*tasks)
+            return order, pool
+
+        order, pool = asyncio.run(run())
+        self.assertEqual(order, ["fast", "heavy-1", "heavy-2", "summary"])
+        self.assertEqual(pool.active, 0)
+
+    def test_full_queue_rejects_immediately(self):
+        async def run():
+            pool = Pool("heavy_turns", limit=1, max_queue=1, timeout=5)
+            await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            with self.assertRaises(Overloaded) as ctx:
+                await pool.acquire()
+            waiter.cancel()
+            return ctx.exception, pool
+
+        error, pool = asyncio.run(run())
+        self.assertEqual(error.reason, "queue full")
+        self.assertGreaterEqual(error.retry_after, 1)
+        self.assertEqual(pool.rejected, 1)
+        self.assertEqual(pool.queued, 0)
+
+    def test_queue_deadline(self):
+        async def run():
+            pool = Pool("search", limit=1, max_queue=5, timeout=0.05)
+            await pool.acquire()
+            with self.assertRaises(Overloaded) as ctx:
+                await pool.acquire()
+            pool.release()
+            return ctx.exception, pool
+
+        error, pool = asyncio.run(run())
+        self.assertEqual(error.reason, "queue timeout")
+        self.assertEqual((pool.active, pool.queued, pool.timed_out), (0, 0, 1))
+
+    def test_cancelled_waiter_gives_up_its_place(self):
+        async def run():
+            pool = Pool("scrape", limit=1, max_queue=5, timeout=5)
+            await pool.acquire()
+            waiter = asyncio.create_task(pool.acquire())
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            pool.release()
+            return pool
+
+        pool = asyncio.run(run())
+        self.assertEqual((pool.active, pool.queued), (0, 0))
+
+class TestAdmission(unittest.TestCase):
+
+    def test_thread_slot_held_until_thread_finishes(self):
+        limits = {"scrape": (2, 4, 1.0)}
+        gate = threading.Event()
+
+        async def run():
+            admission = Admission(limits)
+            pool = admission.pools["scrape"]
+            task = asyncio.create_task(admission.run_in_thread("scrape", gate.wait))
+            await asyncio.sleep(0.01)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            held = pool.active           # cancelled, but the thread is still blocked
+            gate.set()
+            for _ in range(100):
+                if not pool.active:
+                    break
+                await asyncio.sleep(0.01)
+            result = await admission.run_in_thread("scrape", sum, [1, 2])
+            return held, pool.active, result
+
+        held, active, result = asyncio.run(run())
+        self.assertEqual((held, active, result), (1, 0, 3))
+
+    def test_fast_turns_do_not_queue_behind_heavy(self):
+        limits = {"fast_turns": (4, 4, 1.0), "heavy_turns": (1, 0, 1.0), "llm": (1, 10, 1.0)}
+
+        async def run():
+            admission = Admission(limits)
+            async with admission.turn("HEAVY"):
+                with self.assertRaises(Overloaded):
+                    async with admission.turn("HEAVY"):
+                        pass
+                async with admission.turn("FAST"):
+                    return admission.stats()
+
+        stats = asyncio.run(run())
+        self.assertEqual(stats["heavy_turns"]["rejected"], 1)
+        self.assertEqual(stats["fast_turns"]["admitted"], 1)
+
+    def test_slot_uses_turn_lane(self):
+        limits = {"fast_turns": (1, 1, 1.0), "heavy_turns": (1, 1, 1.0), "llm": (1, 10, 1.0)}
+
+        async def run():
+            admission = Admission(limits)
+            llm = admission.pools["llm"]
+            await llm.acquire()
+            order = []
+
+            async def turn(intent):
+                async with admission.turn(intent):
+                    async with admission.slot("llm"):
+                        order.append(intent)
+
+            tasks = [asyncio.create_task(turn("HEAVY")), asyncio.create_task(turn("FAST"))]
+            await asyncio.sleep(0.01)
+            llm.release()
+            await asyncio.gather(*tasks)
+            return order
+
+        self.assertEqual(asyncio.run(run()), ["FAST", "HEAVY"])
+
+if __name__ == '__main__':
+    unittest.main()
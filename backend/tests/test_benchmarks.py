@@ -0,0 +1,39 @@
+
+import unittest
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from benchmarks.run import compare
+
+def run(**levels):
+    """Results/baseline shape: run(history={"1": (p95_ms, rps)})."""
+    return {"scenarios": {name: {c: {"p95_ms": p95, "throughput_rps": rps} for c, (p95, rps) in by_level.items()}
+                          for name, by_level in levels.items()}}
+
+class TestCompare(unittest.TestCase):
+
+    def test_millisecond_levels_within_the_noise_floor_pass(self):
+        baseline = run(history={"1": (1.2, 600.0)}, session={"1": (2.5, 400.0)})
+        current = run(history={"1": (2.9, 310.0)}, session={"1": (6.0, 180.0)})
+        self.assertEqual(compare(current, baseline, 0.2), [])
+
+    def test_real_regressions_are_flagged(self):
+        baseline = run(history={"1": (1.2, 600.0)}, chat={"4": (1500.0, 2.6)})
+        current = run(history={"1": (40.0, 25.0)}, chat={"4": (1900.0, 1.9)})
+        self.assertEqual(compare(current, baseline, 0.2), [
+            "history@1: p95 1.2ms -> 40.0ms",
+            "history@1: throughput 600.0 -> 25.0 req/s",
+            "chat@4: p95 1500.0ms -> 1900.0ms",
+            "chat@4: throughput 2.6 -> 1.9 req/s",
+        ])
+
+    def test_throughput_drop_counts_for_slow_levels_alone(self):
+        baseline = run(chat={"16": (1600.0, 9.0)})
+        current = run(chat={"16": (1610.0, 6.0)})
+        self.assertEqual(compare(current, baseline, 0.2), ["chat@16: throughput 9.0 -> 6.0 req/s"])
+
+if __name__ == '__main__':
+    unittest.main()
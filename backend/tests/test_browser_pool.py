@@ -0,0 +1,75 @@
+
+import asyncio
+import unittest
+from unittest.mock import patch
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.crawlee_service import BrowserPool
+
+class FakeContext:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+def fake_pool(num_contexts):
+    """BrowserPool whose contexts are FakeContexts; creating one yields to the loop."""
+    pool = BrowserPool(num_contexts=num_contexts)
+    pool.created = []
+
+    async def new_context():
+        await asyncio.sleep(0.01)
+        context = FakeContext(f"ctx{len(pool.created)}")
+        pool.created.append(context)
+        return {"context": context, "served": 0, "active": 0}
+
+    pool._new_context = new_context
+    return pool
+
+@patch("tools.crawlee_service.RECYCLE_AFTER", 2)
+class TestContextRecycling(unittest.TestCase):
+
+    def test_concurrent_checkins_recycle_once(self):
+        async def scenario():
+            pool = fake_pool(1)
+            pool._contexts = [await pool._new_context()]
+            old = pool._contexts[0]
+            slots = [pool._checkout_context() for _ in range(2)]
+            await asyncio.gather(*(pool._checkin_context(slot) for slot in slots))
+            return pool, old
+
+        pool, old = asyncio.run(scenario())
+        self.assertEqual(len(pool.created), 2)          # the original and one replacement
+        self.assertEqual(pool._contexts[0]["context"], pool.created[1])
+        self.assertTrue(old["context"].closed)
+        self.assertFalse(pool.created[1].closed)
+
+    def test_retired_slot_leaves_rotation_and_closes_when_idle(self):
+        async def scenario():
+            pool = fake_pool(2)
+            pool._contexts = [await pool._new_context(), await pool._new_context()]
+            first = pool._checkout_context()
+            first["served"] = 2
+            first["active"] += 1     # a second page still open on the same context
+            recycling = asyncio.create_task(pool._checkin_context(first))
+            await asyncio.sleep(0)
+            # While the replacement is being created, checkouts avoid the retired slot
+            picked = [pool._checkout_context()["context"].name for _ in range(3)]
+            await recycling
+            self.assertFalse(first["context"].closed)
+            await pool._checkin_context(first)
+            return pool, first, picked
+
+        pool, first, picked = asyncio.run(scenario())
+        self.assertEqual(picked, ["ctx1"] * 3)
+        self.assertTrue(first["context"].closed)
+        self.assertNotIn(first, pool._contexts)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+
+import unittest
+import os
+import sys
+
+import numpy as np
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from unittest.mock import patch
+from tools.catalog import BM25, CatalogRetriever, parse_price_range, format_results
+from tools.embeddings import HashingEmbeddings
+
+PRODUCTS = [
+    ("Lenovo IdeaPad Gaming 3", "Laptops", 54990.0, "Gaming laptop with RTX 3050 graphics"),
+    ("HP Victus Gaming Laptop", "Laptops", 48990.0, "Gaming laptop with RTX 2050 and 144Hz screen"),
+    ("Dell Inspiron 15", "Laptops", 39990.0, "Thin office laptop for students"),
+    ("Nike Pegasus 40", "Shoes", 9995.0, "Neutral running shoes with React foam"),
+    ("Sony WH-1000XM5", "Headphones", 29990.0, "Noise cancelling wireless headphones"),
+]
+
+class FakeCollection:
+    """In-memory stand-in for a Chroma collection (count/get/query with simple where clauses)."""
+
+    def __init__(self, embedder):
+        self.embedder = embedder
+        self.name = "catalog"
+        self.metadata = {"ingest_version": "1"}
+        self.ids, self.documents, self.metadatas = [], [], []
+        for i, (name, category, price, description) in enumerate(PRODUCTS):
+            self.ids.append(str(i))
+            self.documents.append(f"Product: {name}. Category: {category}. Price: {price}. Description: {description}")
+            self.metadatas.append({"Product Name": name, "Category": category, "price_value": price,
+                                   "Link": f"https://shop.example/{i}", "content_hash": "x"})
+        self.vectors = embedder.embed(self.documents)
+
+    def count(self):
+        return len(self.ids)
+
+    def get(self, include=None):
+        return {"ids": self.ids, "documents": self.documents, "metadatas": self.metadatas}
+
+    @staticmethod
+    def _match(meta, where):
+        if not where:
+            return True
+        if "$and" in where:
+            return all(FakeCollection._match(meta, clause) for clause in where["$and"])
+        (key, condition), = where.items()
+        (op, value), = condition.items()
+        actual = meta.get(key)
+        return {"$gte": lambda: actual >= value, "$lte": lambda: actual <= value,
+                "$eq": lambda: actual == value}[op]()
+
+    def query(self, query_embeddings, n_results, where=None):
+        query = np.asarray(query_embeddings[0])
+        allowed = [i for i, meta in enumerate(self.metadatas) if self._match(meta, where)]
+        ranked = sorted(allowed, key=lambda i: -float(self.vectors[i] @ query))[:n_results]
+        return {"ids": [[self.ids[i] for i in ranked]]}
+
+class TestCatalogRetriever(unittest.TestCase):
+
+    def setUp(self):
+        embedder = HashingEmbeddings(dim=256)
+        self.catalog = CatalogRetriever(collection=FakeCollection(embedder), embedder=embedder, results=3)
+
+    def test_price_range_parsing(self):
+        self.assertEqual(parse_price_range("gaming laptop under 50k"), (None, 50000.0))
+        self.assertEqual(parse_price_range("phone between ₹20,000 and 30,000"), (20000.0, 30000.0))
+        self.assertEqual(parse_price_range("tv above 1 lakh"), (100000.0, None))
+        self.assertEqual(parse_price_range("running shoes"), (None, None))
+
+    def test_filters_restrict_results(self):
+        found = self.catalog.search("gaming laptop under 50000")
+        self.assertEqual(found["filters"]["category"], "Laptops")
+        names = [r["metadata"]["Product Name"] for r in found["results"]]
+        self.assertEqual(names[0], "HP Victus Gaming Laptop")
+        self.assertNotIn("Lenovo IdeaPad Gaming 3", names)  # over budget
+        self.assertTrue(all(r["metadata"]["Category"] == "Laptops" for r in found["results"]))
+        self.assertTrue(found["sufficient"])
+
+    def test_poor_recall_falls_back_to_web(self):
+        found = self.catalog.search("mechanical keyboard with hot swap switches")
+        self.assertFalse(found["sufficient"])
+        found = self.catalog.search("headphones under 5000")
+        self.assertEqual(found["results"], [])
+        self.assertFalse(found["sufficient"])
+
+    def test_format_results_includes_links(self):
+        text = format_results(self.catalog.search("noise cancelling headphones")["results"])
+        self.assertIn("Sony WH-1000XM5", text)
+        self.assertIn("https://shop.example/4", text)
+        self.assertNotIn("content_hash", text)
+
+    def test_reloads_on_new_ingest_version(self):
+        collection = self.catalog.collection
+        self.catalog.search("gaming laptop")
+        collection.documents[3] = collection.documents[3].replace("running shoes", "trail sneakers")
+        with patch("tools.catalog.CATALOG_REFRESH", 0):
+            self.catalog.search("trail sneakers")
+            stale = self.catalog.bm25.scores("sneakers")
+            collection.metadata = {"ingest_version": "2"}     # same count, new content
+            self.catalog.search("trail sneakers")
+        self.assertEqual(stale, [])
+        self.assertEqual(self.catalog.bm25.scores("sneakers")[0][0], 3)
+
+class TestBM25(unittest.TestCase):
+
+    def test_postings_respect_candidates(self):
+        bm25 = BM25(["gaming laptop", "office laptop", "running shoes"])
+        self.assertEqual([i for i, _ in bm25.scores("gaming laptop")], [0, 1])
+        self.assertEqual([i for i, _ in bm25.scores("laptop", candidates=[1, 2])], [1])
+        self.assertEqual(bm25.scores("keyboard"), [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+
+import json
+import unittest
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.admission import Overloaded
+from helpers import AppTestCase
+
+def parse_sse(body: str) -> list:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n"))
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+@asynccontextmanager
+async def overloaded_turn(intent):
+    raise Overloaded("heavy_turns", 3, "queue full")
+    yield
+
+class TestChatStream(AppTestCase):
+    """/agent/chat/stream end to end, with the repo's benchmark fakes in place of Gemini and the web."""
+
+    def test_heavy_turn_event_order(self):
+        response = self.client.post("/agent/chat/stream", data={"message": "best gaming laptop under 50000"})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["content-type"].startswith("text/event-stream"))
+        events = parse_sse(response.text)
+        names = [name for name, _ in events]
+
+        self.assertEqual(names[0], "session")
+        self.assertEqual(events[1], ("route", {"intent": "HEAVY"}))
+        stages = [data["stage"] for name, data in events if name == "status"]
+        self.assertEqual(stages[:3], ["catalog", "searching", "scraping"])
+        self.assertLess(names.index("status"), names.index("token"))
+        self.assertEqual(names[-2:], ["products", "done"])
+
+        final = events[-2][1]
+        cards = [data for name, data in events if name == "product"]
+        self.assertEqual(len(final["products"]), 2)
+        self.assertEqual([c["link"] for c in cards], [p["link"] for p in final["products"]])
+        session_id = events[0][1]["session_id"]
+        self.assertEqual(final["session_id"], session_id)
+        self.assertEqual(len(self.manager.load_session(session_id)["history"]), 2)
+
+    def test_stream_body_matches_chat_endpoint(self):
+        message = "best running shoes under 5000"
+        streamed = parse_sse(self.client.post("/agent/chat/stream", data={"message": message}).text)[-2][1]
+        plain = self.client.post("/agent/chat", data={"message": message}).json()
+        self.assertEqual(set(streamed), set(plain))
+        self.assertEqual(streamed["products"], plain["products"])
+
+    def test_overload_is_an_error_event(self):
+        with patch.object(self.main.admission, "turn", overloaded_turn):
+            events = parse_sse(self.client.post("/agent/chat/stream", data={"message": "best laptop"}).text)
+            plain = self.client.post("/agent/chat", data={"message": "best laptop"})
+        self.assertEqual([name for name, _ in events], ["session", "route", "error", "done"])
+        self.assertEqual((events[2][1]["status"], events[2][1]["retry_after"]), (429, 3))
+        self.assertEqual((plain.status_code, plain.headers["Retry-After"]), (429, "3"))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+
+import asyncio
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from types import SimpleNamespace
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.context_manager import ContextManager, estimate_tokens, message_text
+
+def conversation(turns, text_chars=40):
+    """`turns` user/model pairs; message i reads 'm<i>' padded to `text_chars`."""
+    return [{"role": "user" if i % 2 == 0 else "model", "parts": [f"m{i}".ljust(text_chars, ".")]}
+            for i in range(2 * turns)]
+
+def labels(messages):
+    return [message_text(m).split(".")[0] for m in messages]
+
+class FakeLLM:
+    """Records summary prompts and answers with a numbered summary."""
+
+    def __init__(self):
+        self.prompts = []
+
+    async def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return SimpleNamespace(text=f" summary {len(self.prompts)} ")
+
+class TestBuild(unittest.TestCase):
+
+    def test_short_history_is_sent_whole(self):
+        history = conversation(3)
+        self.assertEqual(labels(ContextManager(window=12).build(history)), [f"m{i}" for i in range(6)])
+
+    def test_trims_oldest_pairs_to_the_token_budget(self):
+        history = conversation(10)                      # 20 messages of 14 tokens each
+        built = ContextManager(window=20, token_budget=100).build(history)
+
+        self.assertEqual(labels(built), [f"m{i}" for i in range(14, 20)])
+        self.assertLessEqual(sum(estimate_tokens(m) for m in built), 100)
+        self.assertEqual(built[0]["role"], "user")
+
+    def test_summary_counts_against_the_budget(self):
+        history = conversation(10)
+        summary = {"text": "x" * 160, "upto": 0}        # 48 tokens with its framing
+        built = ContextManager(window=20, token_budget=100).build(history, summary)
+
+        self.assertIn("Summary of our earlier conversation", message_text(built[0]))
+        self.assertEqual(labels(built[2:]), [f"m{i}" for i in range(18, 20)])
+
+    def test_summarized_messages_are_not_resent(self):
+        history = conversation(10)
+        built = ContextManager(window=4).build(history, {"text": "earlier", "upto": 12})
+        self.assertEqual(labels(built[2:]), [f"m{i}" for i in range(12, 20)])
+
+    def test_stale_upto_never_eats_into_the_window(self):
+        history = conversation(5)
+        built = ContextManager(window=4).build(history, {"text": "earlier", "upto": 50})
+        self.assertEqual(labels(built[2:]), [f"m{i}" for i in range(6, 10)])
+
+    def test_long_messages_are_clipped(self):
+        history = [{"role": "user", "parts": ["x" * 10000]}]
+        with patch("core.context_manager.MAX_MESSAGE_CHARS", 100):
+            built = ContextManager().build(history)
+        self.assertEqual(len(message_text(built[0])), 102)
+
+class TestSummaries(unittest.TestCase):
+
+    def setUp(self):
+        self.llm = FakeLLM()
+        patch("core.context_manager.llm", self.llm).start()
+        self.manager = ContextManager(window=4, summary_batch=4)
+
+    def tearDown(self):
+        patch.stopall()
+
+    def test_trigger_fires_once_a_batch_has_left_the_window(self):
+        self.assertFalse(self.manager.needs_summary(conversation(3)[:7]))    # 3 outside the window
+        self.assertTrue(self.manager.needs_summary(conversation(4)))         # 4 outside the window
+        self.assertFalse(self.manager.needs_summary(conversation(5), {"text": "s", "upto": 4}))
+        self.assertTrue(self.manager.needs_summary(conversation(6), {"text": "s", "upto": 4}))
+
+    def test_upto_advances_across_successive_summaries(self):
+        first, changed = asyncio.run(self.manager.summarize(conversation(4)))
+        self.assertTrue(changed)
+        self.assertEqual(first, {"text": "summary 1", "upto": 4})
+        self.assertIn("user: m0", self.llm.prompts[0])
+        self.assertNotIn("m4", self.llm.prompts[0])
+
+        # One more turn is not a full batch yet
+        self.assertEqual(asyncio.run(self.manager.summarize(conversation(6)[:10], first)), (first, False))
+
+        second, changed = asyncio.run(self.manager.summarize(conversation(6), first))
+        self.assertTrue(changed)
+        self.assertEqual(second, {"text": "summary 2", "upto": 8})
+        self.assertIn("summary 1", self.llm.prompts[1])
+        new_lines = self.llm.prompts[1].split("New messages:\n")[1].strip().split("\n")
+        self.assertEqual([line.split(".")[0] for line in new_lines],
+                         ["user: m4", "model: m5", "user: m6", "model: m7"])
+        self.assertFalse(self.manager.needs_summary(conversation(6), second))
+
+    def test_failed_refresh_keeps_the_old_summary(self):
+        async def failing(prompt, **kwargs):
+            raise RuntimeError("503")
+        self.llm.generate = failing
+        summary = {"text": "s", "upto": 0}
+        self.assertEqual(asyncio.run(self.manager.summarize(conversation(4), summary)), (summary, False))
+
+if __name__ == '__main__':
+    unittest.main()
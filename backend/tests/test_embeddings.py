@@ -0,0 +1,68 @@
+
+import unittest
+import os
+import sys
+
+import numpy as np
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.embeddings import (CachedEmbeddings, EmbeddingProvider, HashingEmbeddings,
+                              GeminiEmbeddings, collection_name)
+
+class CountingProvider(EmbeddingProvider):
+    name = "counting"
+
+    def __init__(self):
+        self.inner = HashingEmbeddings(dim=64)
+        self.calls = []
+
+    def embed(self, texts, task="document"):
+        self.calls.append(list(texts))
+        return self.inner.embed(texts, task)
+
+class TestHashingEmbeddings(unittest.TestCase):
+
+    def setUp(self):
+        self.embedder = HashingEmbeddings(dim=256)
+
+    def test_shape_and_normalization(self):
+        vectors = self.embedder.embed(["gaming laptop", "running shoes", ""])
+        self.assertEqual(vectors.shape, (3, 256))
+        self.assertAlmostEqual(float(np.linalg.norm(vectors[0])), 1.0, places=5)
+        self.assertEqual(float(np.linalg.norm(vectors[2])), 0.0)
+
+    def test_similar_texts_are_closer(self):
+        query = self.embedder.embed_query("gaming laptop rtx")
+        docs = self.embedder.embed(["Product: ASUS gaming laptop with RTX 4060", "Product: running shoes for men"])
+        self.assertGreater(float(docs[0] @ query), float(docs[1] @ query))
+
+class TestCachedEmbeddings(unittest.TestCase):
+
+    def test_only_unseen_texts_reach_the_provider(self):
+        provider = CountingProvider()
+        cached = CachedEmbeddings(provider, db_path="")
+        first = cached.embed(["a phone", "a laptop"])
+        second = cached.embed(["a laptop", "a tablet", "a laptop"])
+        self.assertEqual(provider.calls, [["a phone", "a laptop"], ["a tablet"]])
+        np.testing.assert_allclose(first[1], second[0])
+        np.testing.assert_allclose(second[0], second[2])
+        self.assertEqual(cached.stats()["hits"], 2)
+
+    def test_disk_cache_survives_restart(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, "emb.db")
+            CachedEmbeddings(CountingProvider(), db_path=db_path).embed(["a phone"])
+            provider = CountingProvider()
+            vector = CachedEmbeddings(provider, db_path=db_path).embed(["a phone"])
+            self.assertEqual(provider.calls, [])
+            self.assertEqual(vector.shape, (1, 64))
+
+    def test_collection_per_provider(self):
+        self.assertEqual(collection_name("catalog", HashingEmbeddings()), "catalog_hashing")
+        self.assertEqual(collection_name("catalog", GeminiEmbeddings.__new__(GeminiEmbeddings)), "catalog")
+
+if __name__ == '__main__':
+    unittest.main()
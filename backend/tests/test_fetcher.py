@@ -0,0 +1,140 @@
+
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+from types import SimpleNamespace
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools import fetcher
+from tools.fetcher import DomainRouter, extract_text, fetch_page, needs_javascript
+
+ARTICLE = "<html><body><h1>ThinkPad E14 review</h1>" + "<p>Solid keyboard, good battery life and a fair price.</p>" * 30 + "</body></html>"
+APP_SHELL = '<html><body><div id="root"></div><script src="/bundle.js"></script></body></html>'
+JS_WALL = "<html><body><p>Please enable JavaScript to continue.</p>" + "<p>Footer links and legal text.</p>" * 30 + "</body></html>"
+
+def page(html, status=200, url="https://shop.example/item", headers=None):
+    return SimpleNamespace(status_code=status, text=html, url=url, headers=headers or {})
+
+def js_check(html):
+    return needs_javascript(html, extract_text(html))
+
+class TestNeedsJavascript(unittest.TestCase):
+
+    def test_static_article_is_enough(self):
+        self.assertFalse(js_check(ARTICLE))
+
+    def test_empty_app_root_needs_the_browser(self):
+        self.assertTrue(js_check(APP_SHELL))
+
+    def test_javascript_wall_needs_the_browser(self):
+        self.assertTrue(js_check(JS_WALL))
+
+    def test_script_heavy_shell_needs_the_browser(self):
+        html = ARTICLE.replace("</body>", '<script>window.x = 1</script>' * 40 + "</body>")
+        self.assertTrue(js_check(html))
+
+class TestDomainRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "routes.json")
+        self.router = DomainRouter(path=self.path)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_repeated_shells_switch_the_domain_to_the_browser(self):
+        self.router.record("spa.example", True)
+        self.assertFalse(self.router.prefers_browser("spa.example"))
+        self.router.record("spa.example", True)
+        self.assertTrue(self.router.prefers_browser("spa.example"))
+        self.assertFalse(self.router.prefers_browser("other.example"))
+        # Persisted, so a restart keeps the route
+        self.assertTrue(DomainRouter(path=self.path).prefers_browser("spa.example"))
+
+    def test_a_static_page_resets_the_streak(self):
+        self.router.record("shop.example", True)
+        self.router.record("shop.example", False)
+        self.router.record("shop.example", True)
+        self.assertFalse(self.router.prefers_browser("shop.example"))
+
+    def test_browser_route_expires(self):
+        self.router.record("spa.example", True)
+        self.router.record("spa.example", True)
+        later = fetcher.time.time() + fetcher.JS_ROUTE_TTL + 1
+        with patch("tools.fetcher.time.time", return_value=later):
+            self.assertFalse(self.router.prefers_browser("spa.example"))
+
+class TestFetchPage(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.router = DomainRouter(path=os.path.join(self.tmp.name, "routes.json"))
+        self.static_calls, self.browser_calls = [], []
+        self.static_pages = {}
+        for target, value in [
+            ("tools.fetcher.domain_router", self.router),
+            ("tools.fetcher.fetch_static", self.fetch_static),
+            ("tools.fetcher.scrape_url_dynamic", self.scrape_dynamic),
+        ]:
+            patcher = patch(target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def fetch_static(self, url, validators=None):
+        self.static_calls.append((url, validators))
+        return self.static_pages[url]
+
+    def scrape_dynamic(self, url):
+        self.browser_calls.append(url)
+        return f"rendered text of {url}"
+
+    def test_static_page_never_starts_the_browser(self):
+        url = "https://shop.example/e14"
+        self.static_pages[url] = page(ARTICLE, url=url, headers={"ETag": '"v1"'})
+        result = fetch_page(url)
+
+        self.assertEqual((result["tier"], result["etag"]), ("static", '"v1"'))
+        self.assertIn("Solid keyboard", result["text"])
+        self.assertEqual(self.browser_calls, [])
+
+    def test_js_shell_falls_back_to_the_browser(self):
+        url = "https://spa.example/p/1"
+        self.static_pages[url] = page(APP_SHELL, url=url)
+        result = fetch_page(url)
+
+        self.assertEqual(result, {"text": f"rendered text of {url}", "tier": "browser", "url": url})
+        self.assertEqual(len(self.static_calls), 1)
+
+    def test_domain_goes_straight_to_the_browser_after_repeated_shells(self):
+        urls = [f"https://spa.example/p/{i}" for i in range(3)]
+        for url in urls:
+            self.static_pages[url] = page(APP_SHELL, url=url)
+            fetch_page(url)
+
+        self.assertEqual([url for url, _ in self.static_calls], urls[:2])    # the third skips the probe
+        self.assertEqual(self.browser_calls, urls)
+
+    def test_bot_wall_status_escalates(self):
+        url = "https://shop.example/blocked"
+        self.static_pages[url] = page("Forbidden", status=403, url=url)
+        self.assertEqual(fetch_page(url)["tier"], "browser")
+
+    def test_not_modified_skips_both_tiers(self):
+        url = "https://shop.example/e14"
+        self.static_pages[url] = page("", status=304, url=url)
+        result = fetch_page(url, {"etag": '"v1"'})
+
+        self.assertEqual(result, {"not_modified": True, "tier": "static", "url": url})
+        self.assertEqual(self.static_calls, [(url, {"etag": '"v1"'})])
+        self.assertEqual(self.browser_calls, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+from tools.embeddings import HashingEmbeddings
+from tools.ingest import ingest_data, product_id
+
+class FakeCollection:
+    """The slice of a Chroma collection ingest uses, backed by a dict."""
+
+    def __init__(self):
+        self.rows = {}
+        self.upserted = []
+        self.metadata = None
+
+    def modify(self, metadata):
+        self.metadata = metadata
+
+    def get(self, ids=None, include=None):
+        ids = list(self.rows) if ids is None else [i for i in ids if i in self.rows]
+        return {"ids": ids, "metadatas": [self.rows[i]["metadata"] for i in ids]}
+
+    def upsert(self, ids, documents, embeddings, metadatas):
+        self.upserted.extend(ids)
+        for row_id, document, metadata in zip(ids, documents, metadatas):
+            self.rows[row_id] = {"document": document, "metadata": metadata}
+
+    def delete(self, ids):
+        for row_id in ids:
+            self.rows.pop(row_id, None)
+
+PRODUCTS = [
+    {"Product Name": "Pixel 8", "Category": "Phones", "Price": "₹59,999", "Link": "https://shop.example/pixel-8"},
+    {"Product Name": "iPhone 15", "Category": "Phones", "Price": "₹69,900", "Link": "https://shop.example/iphone-15"},
+    {"Product Name": "ThinkPad E14", "Category": "Laptops", "Price": "₹54,990", "Link": "https://shop.example/e14"},
+]
+
+class TestIngest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.tmp.name, "products.csv")
+        self.collection = FakeCollection()
+        client = patch("tools.ingest.chromadb.PersistentClient").start()
+        client.return_value.get_or_create_collection.return_value = self.collection
+        patch("tools.ingest.get_embedder", return_value=HashingEmbeddings(dim=32)).start()
+        patch("tools.ingest.save_checkpoint").start()
+
+    def tearDown(self):
+        patch.stopall()
+        self.tmp.cleanup()
+
+    def ingest(self, products):
+        pd.DataFrame(products).to_csv(self.csv_path, index=False)
+        self.collection.upserted = []
+        return ingest_data(self.csv_path, restart=True, chunk_rows=2)
+
+    def test_inserted_row_does_not_shift_other_ids(self):
+        self.ingest(PRODUCTS)
+        inserted = {"Product Name": "Galaxy S24", "Category": "Phones", "Price": "₹74,999",
+                    "Link": "https://shop.example/s24"}
+        result = self.ingest([inserted] + PRODUCTS)
+
+        self.assertEqual(self.collection.upserted, [product_id(inserted)])
+        self.assertEqual((result["upserted"], result["skipped"]), (1, 3))
+        self.assertEqual(len(self.collection.rows), 4)
+
+    def test_removed_rows_are_deleted(self):
+        self.ingest(PRODUCTS)
+        result = self.ingest(PRODUCTS[1:])
+
+        self.assertEqual(result["deleted"], 1)
+        self.assertNotIn(product_id(PRODUCTS[0]), self.collection.rows)
+        self.assertEqual(self.collection.upserted, [])
+
+    def test_version_stamp_changes_only_with_the_data(self):
+        self.ingest(PRODUCTS)
+        stamp = self.collection.metadata["ingest_version"]
+        self.ingest(PRODUCTS)
+        self.assertEqual(self.collection.metadata["ingest_version"], stamp)
+        with patch("tools.ingest.time.time", return_value=2e9):
+            self.ingest(PRODUCTS[:2] + [dict(PRODUCTS[2], Price="₹49,990")])
+        self.assertNotEqual(self.collection.metadata["ingest_version"], stamp)
+
+    def test_changed_row_is_upserted_in_place(self):
+        self.ingest(PRODUCTS)
+        changed = dict(PRODUCTS[2], Price="₹49,990")
+        result = self.ingest(PRODUCTS[:2] + [changed])
+
+        self.assertEqual(self.collection.upserted, [product_id(changed)])
+        self.assertEqual(self.collection.rows[product_id(changed)]["metadata"]["price_value"], 49990.0)
+        self.assertEqual(result["deleted"], 0)
+
+    def test_positional_ids_from_older_runs_are_dropped(self):
+        self.collection.rows = {"0": {"document": "old", "metadata": {}}, "1": {"document": "old", "metadata": {}}}
+        self.ingest(PRODUCTS)
+        self.assertEqual(set(self.collection.rows), {product_id(p) for p in PRODUCTS})
+
+    def test_product_id_falls_back_to_name_and_category(self):
+        row = {"Product Name": "Pixel 8", "Category": "Phones", "Link": float("nan")}
+        self.assertEqual(product_id(row), product_id({"Product Name": "pixel 8", "Category": "Phones"}))
+        self.assertNotEqual(product_id(row), product_id(dict(row, Category="Cases")))
+
+if __name__ == '__main__':
+    unittest.main()
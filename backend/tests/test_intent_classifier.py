@@ -0,0 +1,118 @@
+
+import asyncio
+import unittest
+import json
+from contextlib import asynccontextmanager
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.intent_classifier import IntentClassifier, train, log_decision
+from core.admission import Overloaded
+from core import router
+
+class TestIntentClassifier(unittest.TestCase):
+
+    def setUp(self):
+        self.classifier = IntentClassifier(weights_path="")
+
+    def test_small_talk_is_fast(self):
+        for message in ["hi", "Hello!", "thanks a lot", "cool, bye", "how are you?"]:
+            self.assertEqual(self.classifier.classify(message)[0], "FAST", message)
+
+    def test_shopping_is_heavy(self):
+        for message in ["best laptop under 50000", "iphone 15 price india", "laptop under 50k",
+                        "compare pixel 8 vs iphone 15", "https://www.amazon.in/dp/B0CHX1W1XY"]:
+            self.assertEqual(self.classifier.classify(message)[0], "HEAVY", message)
+
+    def test_follow_ups_are_heavy(self):
+        for message in ["ok show me cheaper ones", "show me more options", "any other similar ones?",
+                        "nice, are there cheaper ones"]:
+            self.assertEqual(self.classifier.classify(message)[0], "HEAVY", message)
+
+    def test_acknowledgements_alone_are_fast(self):
+        for message in ["ok", "okay great", "nice!", "lol"]:
+            self.assertEqual(self.classifier.classify(message)[0], "FAST", message)
+
+    def test_ambiguous_defers_to_llm(self):
+        intent, confidence = self.classifier.classify("what do you think about this")
+        self.assertIsNone(intent)
+        self.assertLess(confidence, self.classifier.threshold)
+
+    def test_decision_cache_uses_normalized_text(self):
+        self.classifier.remember("What do you think about THIS?", "HEAVY")
+        self.assertEqual(self.classifier.cached("what do you think about this"), "HEAVY")
+
+    def test_decision_cache_is_scoped_by_context(self):
+        self.classifier.remember("tell me more", "HEAVY", context="products")
+        self.assertEqual(self.classifier.cached("tell me more", context="products"), "HEAVY")
+        self.assertIsNone(self.classifier.cached("tell me more", context="chat"))
+
+    def test_decision_log_keeps_tokens_and_rotates(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "log.jsonl")
+            log_decision("Is the Pixel 8 any good?", "HEAVY", "llm", path=log_path)
+            with open(log_path) as f:
+                row = json.loads(f.readline())
+            self.assertNotIn("text", row)
+            self.assertEqual(row["tokens"], ["any", "good", "is", "pixel", "the"])
+
+            # Over the cap: the current file becomes .1 and a fresh one is started
+            log_decision("you are funny", "FAST", "llm", path=log_path, max_bytes=1)
+            with open(log_path) as f, open(log_path + ".1") as rotated:
+                self.assertEqual(len(f.readlines()), 1)
+                self.assertIn("pixel", rotated.read())
+
+    def test_train_from_decision_log(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            log_path = os.path.join(tmp, "log.jsonl")
+            weights_path = os.path.join(tmp, "weights.json")
+            rows = [{"text": "is the pixel good", "intent": "HEAVY"}] * 5 + \
+                   [{"text": "you are funny", "intent": "FAST"}] * 5
+            with open(log_path, "w") as f:
+                f.write("\n".join(json.dumps(r) for r in rows))
+
+            weights = train(log_path, weights_path)
+            self.assertGreater(weights["pixel"], 0)
+            self.assertLess(weights["funny"], 0)
+
+            trained = IntentClassifier(weights_path=weights_path)
+            self.assertGreater(trained.score("is the pixel good"), self.classifier.score("is the pixel good"))
+
+@asynccontextmanager
+async def overloaded_slot(resource, priority=None):
+    raise Overloaded(resource, 2, "queue full")
+    yield
+
+@patch("core.router._local_intent", return_value=None)
+class TestRouterFallback(unittest.TestCase):
+
+    def test_llm_errors_default_to_heavy(self, _):
+        with patch.object(router.llm, "generate", side_effect=RuntimeError("503")):
+            self.assertEqual(asyncio.run(router.classify_intent_async("is the pixel good")), "HEAVY")
+
+    def test_overload_reaches_the_api(self, _):
+        with patch.object(router.admission, "slot", overloaded_slot):
+            with self.assertRaises(Overloaded):
+                asyncio.run(router.classify_intent_async("is the pixel good"))
+
+    def test_cancellation_is_not_swallowed(self, _):
+        async def slow_generate(*args, **kwargs):
+            await asyncio.sleep(10)
+
+        async def scenario():
+            with patch.object(router.llm, "generate", slow_generate):
+                task = asyncio.create_task(router.classify_intent_async("is the pixel good"))
+                await asyncio.sleep(0.01)
+                task.cancel()
+                await task
+
+        with self.assertRaises(asyncio.CancelledError):
+            asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
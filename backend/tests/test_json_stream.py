@@ -0,0 +1,74 @@
+
+import unittest
+import json
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.json_stream import ProductStreamParser, parse_agent_json, repair_json
+
+RESPONSE = json.dumps({
+    "agent_response": "Here are two options {brace} for you.",
+    "products": [
+        {"name": "Laptop A", "price": "₹49,990", "reason": "Has a \"great\" } screen", "specs": {"ram": "16GB"}},
+        {"name": "Laptop B", "price": "₹45,000", "reason": "Light", "tags": ["thin", "light"]},
+    ],
+})
+
+class TestProductStreamParser(unittest.TestCase):
+
+    def test_emits_products_as_they_complete(self):
+        parser = ProductStreamParser()
+        seen = []
+        first_done_at = None
+        for i in range(0, len(RESPONSE), 7):
+            seen.extend(parser.feed(RESPONSE[i:i + 7]))
+            if seen and first_done_at is None:
+                first_done_at = i
+        self.assertEqual([p["name"] for p in seen], ["Laptop A", "Laptop B"])
+        self.assertEqual(seen[0]["specs"], {"ram": "16GB"})
+        # The first card is available before the second has streamed in
+        self.assertLess(first_done_at, RESPONSE.index("Laptop B"))
+
+    def test_repairs_products_with_syntax_slips(self):
+        parser = ProductStreamParser()
+        products = parser.feed("```json\n{'agent_response': 'x', 'products': [{'name': 'A', 'in_stock': True,},")
+        products += parser.feed(" {\"name\": \"B\"}]}")
+        self.assertEqual(products, [{"name": "A", "in_stock": True}, {"name": "B"}])
+
+    def test_ignores_text_without_products(self):
+        parser = ProductStreamParser()
+        self.assertEqual(parser.feed("Hello! How can I help you today?"), [])
+
+class TestParseAgentJson(unittest.TestCase):
+
+    def test_picks_object_out_of_surrounding_text(self):
+        parsed, error = parse_agent_json("Sure!\n```json\n" + RESPONSE + "\n```\nHope that helps {:)")
+        self.assertIsNone(error)
+        self.assertEqual(len(parsed["products"]), 2)
+
+    def test_local_repairs(self):
+        raw = '{"agent_response": "ok", "products": [{"name": "A", "deal": None,},],}'
+        parsed, error = parse_agent_json(raw)
+        self.assertEqual(parsed, {"agent_response": "ok", "products": [{"name": "A", "deal": None}]})
+
+    def test_truncated_output_is_closed(self):
+        parsed, _ = parse_agent_json('{"agent_response": "ok", "products": [{"name": "A", "link": "https://exa')
+        self.assertEqual(parsed["products"][0]["name"], "A")
+
+    def test_literals_inside_strings_are_untouched(self):
+        self.assertEqual(json.loads(repair_json('{"a": "True, None",}')), {"a": "True, None"})
+
+    def test_plain_text_has_no_error(self):
+        self.assertEqual(parse_agent_json("Hi there!"), (None, None))
+
+    def test_stray_braces_in_prose_are_not_repaired(self):
+        self.assertEqual(parse_agent_json("Use the {name} placeholder, e.g. {x: y: z}"), (None, None))
+        parsed, error = parse_agent_json('{"agent_response": "ok" "products": [}')
+        self.assertIsNone(parsed)
+        self.assertIsNotNone(error)
+
+if __name__ == '__main__':
+    unittest.main()
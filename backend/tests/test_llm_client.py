@@ -0,0 +1,148 @@
+
+import asyncio
+import unittest
+from functools import partial
+from unittest.mock import patch
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.shared_state import LocalState
+from utils.llm_client import LLMClient, LLMUnavailable, TokenBucket, CircuitBreaker, is_retryable
+from helpers import FakeClock
+
+class APIError(Exception):
+    """Shaped like google.api_core exceptions: HTTP status in `.code`."""
+
+    def __init__(self, code):
+        super().__init__(f"HTTP {code}")
+        self.code = code
+
+class FakeModel:
+    """Plays back a script of (delay, result-or-exception) per call."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, **kwargs):
+        delay, outcome = self.script[min(self.calls, len(self.script) - 1)]
+        self.calls += 1
+        await asyncio.sleep(delay)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+def client_with(model, **kwargs):
+    client = LLMClient(bucket=TokenBucket(rate=0), **kwargs)
+    client.model = lambda name, system_instruction=None, tools=None: model
+    return client
+
+@patch("utils.llm_client.backoff", lambda attempt: 0)
+class TestLLMClient(unittest.TestCase):
+
+    def test_retries_transient_errors(self):
+        model = FakeModel([(0, APIError(503)), (0, APIError(429)), (0, "ok")])
+        client = client_with(model, retries=2)
+        self.assertEqual(asyncio.run(client.generate("hi", model="m")), "ok")
+        self.assertEqual(model.calls, 3)
+        self.assertEqual(client.stats()["retries"], 2)
+
+    def test_client_errors_are_not_retried(self):
+        model = FakeModel([(0, APIError(400)), (0, "ok")])
+        client = client_with(model, retries=2)
+        with self.assertRaises(APIError):
+            asyncio.run(client.generate("hi", model="m"))
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(client.breaker.consecutive, 0)
+
+    def test_exhausted_retries_raise_unavailable(self):
+        client = client_with(FakeModel([(0, APIError(500))]), retries=1)
+        with self.assertRaises(LLMUnavailable):
+            asyncio.run(client.generate("hi", model="m"))
+        self.assertEqual(client.stats()["failures"], 2)
+
+    def test_timeout_is_retryable(self):
+        model = FakeModel([(1, "slow"), (0, "ok")])
+        client = client_with(model, retries=1, timeout=0.05)
+        self.assertEqual(asyncio.run(client.generate("hi", model="m")), "ok")
+        self.assertEqual(client.stats()["timeouts"], 1)
+
+    def test_hedge_answers_first(self):
+        model = FakeModel([(1, "slow"), (0, "fast")])
+        client = client_with(model, hedge_after=0.02)
+        self.assertEqual(asyncio.run(client.generate("hi", model="m")), "fast")
+        stats = client.stats()
+        self.assertEqual((stats["hedges"], stats["hedge_wins"]), (1, 1))
+
+    def test_no_hedge_when_disabled_per_call(self):
+        model = FakeModel([(0.05, "slow"), (0, "fast")])
+        client = client_with(model, hedge_after=0.01)
+        self.assertEqual(asyncio.run(client.generate("hi", model="m", hedge=False)), "slow")
+        self.assertEqual(model.calls, 1)
+
+    def test_open_circuit_fails_fast(self):
+        clock = FakeClock()
+        model = FakeModel([(0, APIError(503))])
+        client = client_with(model, retries=0, breaker=CircuitBreaker(failures=2, cooldown=30, clock=clock))
+        for _ in range(2):
+            with self.assertRaises(LLMUnavailable):
+                asyncio.run(client.generate("hi", model="m"))
+        with self.assertRaises(LLMUnavailable):
+            asyncio.run(client.generate("hi", model="m"))
+        self.assertEqual(model.calls, 2)
+        self.assertEqual(client.stats()["rejected"], 1)
+        self.assertEqual(client.stats()["breaker_open"], 1)
+
+    def test_cluster_limit_across_workers(self):
+        clock = FakeClock()
+        state = LocalState(clock=clock)
+        client = LLMClient(state=state, cluster_rps=2)
+        with patch.object(state, "hit", partial(state.hit, clock=clock)):
+            self.assertEqual([client._cluster_delay() for _ in range(3)], [0.0, 0.0, 1.0])
+            clock.now += 1
+            self.assertEqual(client._cluster_delay(), 0.0)
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_half_open_probe(self):
+        clock = FakeClock()
+        breaker = CircuitBreaker(failures=2, cooldown=30, clock=clock)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "closed")
+        breaker.record_failure()
+        self.assertFalse(breaker.allow())
+
+        clock.now += 30
+        self.assertTrue(breaker.allow())    # one probe ...
+        self.assertFalse(breaker.allow())   # ... at a time
+        breaker.record_failure()
+        self.assertEqual(breaker.state, "open")
+
+        clock.now += 30
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=2, clock=clock)
+        self.assertEqual([bucket.reserve() for _ in range(2)], [0.0, 0.0])
+        self.assertEqual(bucket.reserve(), 0.5)
+        self.assertEqual(bucket.reserve(), 1.0)
+        clock.now += 1.0
+        self.assertEqual(bucket.reserve(), 0.5)
+
+    def test_retryable_classification(self):
+        self.assertTrue(is_retryable(APIError(429)))
+        self.assertTrue(is_retryable(asyncio.TimeoutError()))
+        self.assertFalse(is_retryable(APIError(404)))
+        self.assertFalse(is_retryable(ValueError("bad json")))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.metrics import Metrics
+from helpers import FakeClock
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock(100.0)
+        self.tmp = tempfile.TemporaryDirectory()
+        self.log = os.path.join(self.tmp.name, "traces.jsonl")
+        self.metrics = Metrics(slow_ms=1000, sample_rate=1.0, trace_log=self.log, clock=self.clock)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_span_histogram(self):
+        with self.metrics.span("search"):
+            self.clock.now += 0.3
+        text = self.metrics.render()
+        self.assertIn('contextiq_stage_duration_seconds_bucket{stage="search",le="0.25"} 0', text)
+        self.assertIn('contextiq_stage_duration_seconds_bucket{stage="search",le="0.5"} 1', text)
+        self.assertIn('contextiq_stage_duration_seconds_count{stage="search"} 1', text)
+
+    def test_span_error_counted(self):
+        with self.assertRaises(ValueError):
+            with self.metrics.span("scrape"):
+                raise ValueError("boom")
+        self.assertEqual(self.metrics.stage_errors.value(stage="scrape"), 1)
+
+    def test_slow_trace_logged_with_spans(self):
+        with self.metrics.trace("chat", session_id="s1") as current:
+            with self.metrics.span("route"):
+                self.clock.now += 0.2
+            with self.metrics.span("agent_heavy"):
+                self.clock.now += 1.5
+        self.metrics.flush_traces()
+        with open(self.log) as f:
+            record = json.loads(f.readline())
+        self.assertEqual(record["request_id"], current.request_id)
+        self.assertEqual(record["session_id"], "s1")
+        self.assertEqual([s["stage"] for s in record["spans"]], ["route", "agent_heavy"])
+        self.assertEqual(record["spans"][1]["start_ms"], 200.0)
+
+    def test_trace_log_rotates(self):
+        self.metrics.max_bytes = 1
+        for endpoint in ("chat", "history"):
+            with self.metrics.trace(endpoint):
+                self.clock.now += 2
+        self.metrics.flush_traces()
+        with open(self.log) as f, open(self.log + ".1") as rotated:
+            self.assertEqual(json.loads(f.read())["endpoint"], "history")
+            self.assertEqual(json.loads(rotated.read())["endpoint"], "chat")
+
+    def test_fast_trace_not_logged(self):
+        with self.metrics.trace("chat"):
+            self.clock.now += 0.5
+        self.assertFalse(os.path.exists(self.log))
+        self.assertIn('contextiq_request_duration_seconds_count{endpoint="chat",status="ok"} 1',
+                      self.metrics.render())
+
+    def test_spans_from_worker_threads_join_trace(self):
+        async def turn():
+            with self.metrics.trace("chat") as current:
+                await asyncio.to_thread(self.metrics.timed("search", lambda: None))
+            return current
+        current = asyncio.run(turn())
+        self.assertEqual([s["stage"] for s in current.spans], ["search"])
+
+    def test_cache_and_error_export(self):
+        self.metrics.register_cache("search", lambda: {"hits": 3, "misses": 1, "hit_ratio": 0.75})
+        self.metrics.register_cache("embeddings", lambda: None)
+        self.metrics.record_error("google_search")
+        text = self.metrics.render()
+        self.assertIn('contextiq_cache_hit_ratio{cache="search"} 0.75', text)
+        self.assertNotIn('cache="embeddings"', text)
+        self.assertIn('contextiq_upstream_errors_total{kind="error",upstream="google_search"} 1', text)
+
+if __name__ == '__main__':
+    unittest.main()
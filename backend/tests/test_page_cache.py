@@ -0,0 +1,105 @@
+
+import random
+import string
+import unittest
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from helpers import FakeClock
+from tools.page_cache import PageCache, ttl_for
+
+def noise(seed, size=2000):
+    """Text that barely compresses, so blob sizes are predictable."""
+    rng = random.Random(seed)
+    return "".join(rng.choice(string.ascii_letters) for _ in range(size))
+
+class TestPageCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = PageCache(clock=self.clock)
+
+    def test_url_variants_share_one_blob(self):
+        self.cache.store("https://shop.example/e14?utm_source=ads", noise(1))
+        size = self.cache.stats()["bytes"]
+        self.cache.store("https://shop.example/e14-copy", noise(1))
+
+        self.assertEqual(self.cache.stats()["entries"], 2)
+        self.assertEqual(self.cache.stats()["bytes"], size)
+        entry, fresh = self.cache.lookup("https://shop.example/e14")
+        self.assertTrue(fresh)
+        self.assertEqual(self.cache.text(entry), noise(1))
+        self.assertEqual(self.cache._blobs[entry["content_hash"]][1], 2)
+
+    def test_blob_freed_only_when_its_last_entry_changes(self):
+        self.cache.store("https://a.example/", noise(1))
+        self.cache.store("https://b.example/", noise(1))
+        digest = self.cache.lookup("https://a.example/")[0]["content_hash"]
+
+        self.cache.store("https://a.example/", noise(2))
+        self.assertEqual(self.cache._blobs[digest][1], 1)
+        self.assertEqual(self.cache.text(self.cache.lookup("https://b.example/")[0]), noise(1))
+
+        self.cache.store("https://b.example/", noise(3))
+        self.assertNotIn(digest, self.cache._blobs)
+        self.assertEqual(self.cache.stats()["bytes"], sum(len(blob[0]) for blob in self.cache._blobs.values()))
+
+    def test_least_recently_used_evicted_at_the_byte_cap(self):
+        self.cache.store("https://a.example/", noise(1))
+        size = self.cache.stats()["bytes"]
+        cache = PageCache(max_bytes=int(size * 2.5), clock=self.clock)
+        cache.store("https://a.example/", noise(1))
+        cache.store("https://b.example/", noise(2))
+        cache.lookup("https://a.example/")            # a is now the most recent
+        cache.store("https://c.example/", noise(3))
+
+        self.assertEqual(cache.lookup("https://b.example/"), (None, False))
+        self.assertIsNotNone(cache.lookup("https://a.example/")[0])
+        self.assertIsNotNone(cache.lookup("https://c.example/")[0])
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_stale_lookup_keeps_validators_until_refreshed(self):
+        url = "https://shop.example/e14"
+        self.cache.store(url, noise(1), etag='"v1"', last_modified="Mon, 01 Jan 2024 00:00:00 GMT", tier="static")
+        self.clock.now += ttl_for(url) + 1
+
+        entry, fresh = self.cache.lookup(url)
+        self.assertFalse(fresh)
+        self.assertEqual((entry["etag"], entry["last_modified"]), ('"v1"', "Mon, 01 Jan 2024 00:00:00 GMT"))
+
+        self.cache.refresh(url)                        # the server answered 304
+        entry, fresh = self.cache.lookup(url)
+        self.assertTrue(fresh)
+        self.assertEqual(self.cache.text(entry), noise(1))
+        self.assertEqual(entry["expires_at"], self.clock.now + ttl_for(url))
+        self.assertEqual(self.cache.stats()["revalidated"], 1)
+
+    def test_entry_with_only_an_og_image(self):
+        url = "https://shop.example/e14"
+        self.cache.store(url, og_image="https://cdn.example/e14.jpg")
+
+        entry, fresh = self.cache.lookup(url)
+        self.assertTrue(fresh)
+        self.assertEqual(entry["og_image"], "https://cdn.example/e14.jpg")
+        self.assertIsNone(self.cache.text(entry))
+        self.assertEqual(self.cache.stats()["bytes"], 0)
+
+        # Text stored later joins the entry without losing the image
+        self.cache.store(url, noise(1))
+        entry, _ = self.cache.lookup(url)
+        self.assertEqual((entry["og_image"], self.cache.text(entry)), ("https://cdn.example/e14.jpg", noise(1)))
+
+    def test_og_image_does_not_extend_freshness(self):
+        url = "https://shop.example/e14"
+        self.cache.store(url, noise(1))
+        expires_at = self.cache.lookup(url)[0]["expires_at"]
+        self.clock.now += 60
+        self.cache.store(url, og_image="https://cdn.example/e14.jpg")
+        self.assertEqual(self.cache.lookup(url)[0]["expires_at"], expires_at)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+
+import unittest
+import os
+import sys
+import tempfile
+import threading
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.predictor import InsightStore, fallback_insight
+from helpers import FakeClock
+
+class TestInsightStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "insights.json")
+        self.clock = FakeClock()
+        self.generated = []
+        self.done = threading.Event()
+
+        def generator(category):
+            self.generated.append(category)
+            self.done.set()
+            return f"Prediction: accessories for {category}."
+
+        self.store = InsightStore(path=self.path, ttl=100, generator=generator, clock=self.clock)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_build_persists_and_skips_fresh(self):
+        self.assertEqual(self.store.build(["Gaming Laptops", "Running Shoes", "Gaming Laptops"]), 2)
+        self.assertEqual(self.store.build(["Gaming Laptops"]), 0)
+        reloaded = InsightStore(path=self.path, generator=None, clock=self.clock)
+        self.assertEqual(reloaded.lookup("gaming laptop")[0], "Prediction: accessories for Gaming Laptops.")
+
+    def test_fuzzy_matching(self):
+        self.store.build(["Gaming Laptops", "Laptops", "Running Shoes"])
+        self.assertIn("Gaming Laptops", self.store.lookup("best gaming laptop under 50000")[0])
+        self.assertIn("for Laptops", self.store.lookup("thin laptop")[0])
+        self.assertIn("Running Shoes", self.store.lookup("runing shoe")[0])
+        self.assertEqual(self.store.lookup("puppy crate"), (None, False))
+
+    def test_insight_for_products_uses_their_category(self):
+        self.store.build(["Laptops", "Running Shoes"])
+        products = [{"name": "Nike Pegasus 40", "category": "Running Shoes"}, {"name": "Dell Inspiron 15"}]
+        self.assertIn("Running Shoes", self.store.for_products(products))
+        self.assertIn("for Laptops", self.store.for_products([{"name": "Dell Inspiron 15 Laptop"}]))
+
+    def test_unknown_product_category_is_queued(self):
+        products = [{"name": "Mystery Gadget"}, {"name": "Crate", "category": "Puppy Crates"}]
+        self.assertEqual(self.store.for_products(products), fallback_insight("Puppy Crates"))
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.generated, ["Puppy Crates"])
+        self.assertIsNone(self.store.for_products([{"name": "Mystery Gadget"}]))   # names are never queued
+
+    def test_unmatched_category_uses_the_fallback_table(self):
+        insight = self.store.for_products([{"name": "Sony A7 IV", "category": "Mirrorless Cameras"}])
+        self.assertIn("SD Card", insight)
+
+    def test_stale_entries_served_and_refreshed_in_background(self):
+        self.store.build(["Cameras"])
+        self.clock.now += 101
+        insight, fresh = self.store.lookup("camera")
+        self.assertIsNotNone(insight)
+        self.assertFalse(fresh)
+        self.done.clear()
+        self.store.request("Cameras")
+        self.assertTrue(self.done.wait(5))
+        self.assertEqual(self.generated, ["Cameras", "Cameras"])
+
+    def test_fallback(self):
+        self.assertIn("USB-C Hub", fallback_insight("Gaming Laptop"))
+        self.assertIn("warranty", fallback_insight("Puppy Crate"))
+
+if __name__ == '__main__':
+    unittest.main()
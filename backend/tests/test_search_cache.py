@@ -0,0 +1,100 @@
+
+import unittest
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest.mock import patch
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.search_cache import SearchCache, normalize_query
+from helpers import FakeClock
+
+class TestSearchCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SearchCache(ttl=60, max_entries=2, db_path="", clock=self.clock)
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query("  iPhone 15 Price, India? "), "iphone 15 price india")
+        self.assertEqual(normalize_query("laptop under ₹50000"), "laptop under ₹50000")
+
+    def test_ttl_expiry(self):
+        self.cache.set("q", "results")
+        self.assertEqual(self.cache.get("q"), "results")
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get("q"))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_lru_eviction(self):
+        self.cache.set("a", "1")
+        self.cache.set("b", "2")
+        self.cache.get("a")          # 'b' is now least recently used
+        self.cache.set("c", "3")
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(self.cache.get("a"), "1")
+        self.assertEqual(self.cache.stats()["evictions"], 1)
+
+    def test_sqlite_backing_survives_restart(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "cache.db")
+            SearchCache(ttl=60, db_path=path, clock=self.clock).set("q", "results")
+            reopened = SearchCache(ttl=60, db_path=path, clock=self.clock)
+            self.assertEqual(reopened.get("q"), "results")
+            self.clock.now += 61
+            self.assertIsNone(SearchCache(ttl=60, db_path=path, clock=self.clock).get("q"))
+
+    def test_disk_eviction_runs_every_n_writes(self):
+        with tempfile.TemporaryDirectory() as tmp, \
+                patch("tools.search_cache.DISK_EVICT_EVERY", 3), patch("tools.search_cache.DISK_MAX_ENTRIES", 1):
+            cache = SearchCache(ttl=60, db_path=os.path.join(tmp, "cache.db"), clock=self.clock)
+            count = lambda: cache._db.execute("SELECT COUNT(*) FROM search_cache").fetchone()[0]
+            cache.set("a", "1")
+            cache.set("b", "2")
+            self.assertEqual(count(), 2)
+            cache.set("c", "3")
+            self.assertEqual(count(), 1)
+
+    def test_memory_hits_do_not_wait_for_disk(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = SearchCache(ttl=60, db_path=os.path.join(tmp, "cache.db"), clock=self.clock)
+            cache.set("q", "results")
+            with cache._db_lock:     # a slow disk write in another thread
+                self.assertEqual(cache.get("q"), "results")
+
+    def test_skips_uncacheable_results(self):
+        self.cache.get_or_compute("q", lambda: "unavailable", should_cache=lambda v: v != "unavailable")
+        self.assertIsNone(self.cache.get("q"))
+
+    def test_concurrent_identical_queries_are_coalesced(self):
+        calls = []
+        release = threading.Event()
+
+        def slow_search():
+            calls.append(1)
+            release.wait(2)
+            return "results"
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_compute("q", slow_search)))
+            for _ in range(5)
+        ]
+        for t in threads:
+            t.start()
+        time.sleep(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ["results"] * 5)
+        self.assertEqual(self.cache.stats()["coalesced"], 4)
+
+if __name__ == '__main__':
+    unittest.main()
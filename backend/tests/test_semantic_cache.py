@@ -0,0 +1,77 @@
+
+import unittest
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.semantic_cache import SemanticCache, canonical_tokens, is_self_contained
+from tools.embeddings import HashingEmbeddings
+from helpers import FakeClock
+
+class TestSemanticCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = SemanticCache(ttl=60, max_entries=3, threshold=0.85, db_path="", clock=self.clock)
+
+    def test_canonical_tokens(self):
+        self.assertEqual(canonical_tokens("Best laptops under Rs 50k"), ["best", "laptop", "under", "50000"])
+        self.assertEqual(canonical_tokens("laptop under ₹50,000"), ["laptop", "under", "50000"])
+
+    def test_near_duplicates_hit(self):
+        self.cache.set("best laptop under 50000", "answer")
+        self.assertEqual(self.cache.get("laptop under 50k best"), "answer")
+        self.assertEqual(self.cache.get("Best laptops under Rs. 50,000?"), "answer")
+
+    def test_different_budget_or_direction_misses(self):
+        self.cache.set("best laptop under 50000", "answer")
+        self.assertIsNone(self.cache.get("best laptop under 30000"))
+        self.assertIsNone(self.cache.get("best laptop above 50000"))
+
+    def test_different_variant_or_model_misses(self):
+        self.cache.set("iphone 15 price", "iphone 15 answer")
+        self.cache.set("samsung galaxy s24 256gb", "s24 answer")
+        for query in ["iphone 15 pro price", "iphone 15 pro max price", "iphone 15 plus price", "iphone 14 price",
+                      "samsung galaxy s23 256gb", "samsung galaxy s24 512gb", "samsung galaxy s24 fe 256gb"]:
+            self.assertIsNone(self.cache.get(query), query)
+        self.assertEqual(self.cache.get("price of iphone 15"), "iphone 15 answer")
+
+    def test_added_product_words_miss(self):
+        self.cache.set("best laptop under 50000", "answer")
+        for query in ["best laptop bag under 50000", "best hp laptop under 50000", "best gaming laptop under 50000",
+                      "best laptop under 50000 for coding", "best refurbished laptop under 50000"]:
+            self.assertIsNone(self.cache.get(query), query)
+        self.assertEqual(self.cache.get("laptops under 50k"), "answer")
+        self.assertEqual(self.cache.get("laptop under 50000"), "answer")
+
+    def test_embedder_vectors(self):
+        cache = SemanticCache(ttl=60, threshold=0.85, db_path="", clock=self.clock, embedder=HashingEmbeddings())
+        cache.set("best laptop under 50000", "answer")
+        self.assertEqual(cache.get("best laptops under 50k"), "answer")
+        self.assertIsNone(cache.get("best laptop under 30000"))
+        self.assertIsNone(cache.get("best phone under 50000"))
+
+    def test_unrelated_query_misses(self):
+        self.cache.set("best laptop under 50000", "answer")
+        self.assertIsNone(self.cache.get("best phone under 50000"))
+
+    def test_ttl_and_eviction(self):
+        self.cache.set("best laptop under 50000", "answer")
+        self.clock.now += 61
+        self.assertIsNone(self.cache.get("best laptop under 50000"))
+        for i in range(4):
+            self.cache.set(f"running shoes size {i + 5}", str(i))
+        self.assertEqual(self.cache.stats()["size"], 3)
+        self.assertIsNone(self.cache.get("running shoes size 5"))
+        self.assertEqual(self.cache.get("running shoes size 8"), "3")
+
+    def test_follow_ups_are_not_cacheable(self):
+        self.assertTrue(is_self_contained("best laptop under 50000"))
+        for message in ["show me cheaper ones", "is this one good?", "compare them",
+                        "https://www.amazon.in/dp/B0CHX1W1XY", "laptops"]:
+            self.assertFalse(is_self_contained(message), message)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,160 @@
+
+import unittest
+from unittest.mock import patch
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils import session_store
+from utils.session_store import PickleSessionStore, SQLiteSessionStore
+from utils.migrate_sessions import migrate
+from utils.session_manager import SessionManager
+
+def message(role, text):
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)])
+
+def fake_build_content(role, parts):
+    # Stand-in for google.generativeai.protos.Content (not installed in tests)
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=p.get("text")) for p in parts])
+
+def texts(history):
+    return [m.parts[0].text for m in history]
+
+def session(session_id, user_id, updated_at, history=None):
+    return {
+        "session_id": session_id,
+        "user_id": user_id,
+        "title": f"Chat {session_id}",
+        "created_at": updated_at,
+        "updated_at": updated_at,
+        "history": history or [],
+    }
+
+@patch("utils.history_codec.build_content", fake_build_content)
+class TestSQLiteSessionStore(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteSessionStore(os.path.join(self.tmp.name, "sessions.db"))
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def turn_rows(self, session_id):
+        return self.store._conn().execute(
+            "SELECT seq FROM session_turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+
+    def test_round_trip(self):
+        now = datetime.now()
+        history = [message("user", "best laptop under 50k"), message("model", "Here are a few options")]
+        self.store.put(session("s1", "u1", now, history))
+
+        data = self.store.get("s1")
+        self.assertEqual(data["user_id"], "u1")
+        self.assertEqual(data["updated_at"], now)
+        self.assertEqual(texts(data["history"]), ["best laptop under 50k", "Here are a few options"])
+        self.assertIsNone(self.store.get("missing"))
+
+    def test_save_history_appends_only_new_messages(self):
+        data = session("s1", "u1", datetime.now(), [message("user", "hi"), message("model", "hello")])
+        self.store.put(data)
+
+        data["history"] = data["history"] + [message("user", "phones?"), message("model", "sure")]
+        with patch("utils.history_codec.dumps_message", wraps=session_store.history_codec.dumps_message) as dumps:
+            self.store.save_history(data)
+        self.assertEqual(dumps.call_count, 2)
+        self.assertEqual(len(self.turn_rows("s1")), 4)
+        self.assertEqual(texts(self.store.get("s1")["history"]), ["hi", "hello", "phones?", "sure"])
+
+    def test_compaction_and_last_k(self):
+        history = [message("user", f"m{i}") for i in range(7)]
+        with patch.object(session_store, "COMPACT_AFTER", 5):
+            self.store.put(session("s1", "u1", datetime.now(), history[:3]))
+            self.store.save_history(session("s1", "u1", datetime.now(), history))
+
+        # Log was folded into the snapshot, reads are unchanged
+        self.assertEqual(self.turn_rows("s1"), [])
+        self.assertEqual(texts(self.store.get("s1")["history"]), [f"m{i}" for i in range(7)])
+
+        self.store.save_history(session("s1", "u1", datetime.now(), history + [message("model", "m7")]))
+        self.assertEqual(texts(self.store.get("s1", last_k=1)["history"]), ["m7"])
+        self.assertEqual(texts(self.store.get("s1", last_k=3)["history"]), ["m5", "m6", "m7"])
+
+    def test_list_for_user_is_scoped_and_sorted(self):
+        now = datetime.now()
+        self.store.put(session("old", "u1", now - timedelta(hours=1)))
+        self.store.put(session("new", "u1", now, [message("user", "x" * 80)]))
+        self.store.put(session("other", "u2", now))
+
+        sessions = self.store.list_for_user("u1")
+        self.assertEqual([s["id"] for s in sessions], ["new", "old"])
+        self.assertEqual(sessions[0]["preview"], "x" * 50)
+        self.assertEqual(sessions[1]["preview"], "Empty")
+
+    def test_migrate_from_pickle(self):
+        pickle_dir = os.path.join(self.tmp.name, "legacy")
+        legacy = PickleSessionStore(pickle_dir)
+        legacy.put(session("s1", "u1", datetime.now(), [message("user", "hi")]))
+        legacy.put(session("s2", "u1", datetime.now()))
+
+        db_path = os.path.join(self.tmp.name, "migrated.db")
+        self.assertEqual(migrate(pickle_dir, db_path), {"migrated": 2, "skipped": 0})
+        self.assertEqual(migrate(pickle_dir, db_path), {"migrated": 0, "skipped": 2})
+        self.assertEqual(len(SQLiteSessionStore(db_path).list_for_user("u1")), 2)
+
+@patch("utils.history_codec.build_content", fake_build_content)
+class TestSessionManagerCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = SQLiteSessionStore(os.path.join(self.tmp.name, "sessions.db"))
+        self.manager = SessionManager(store=self.store, cache_size=2)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hot_sessions_skip_the_store(self):
+        session_id = self.manager.create_session("u1", "s1")
+        with patch.object(self.store, "get", wraps=self.store.get) as store_get:
+            self.manager.save_session(session_id, [message("user", "hi")])
+            self.assertEqual(texts(self.manager.load_session(session_id)["history"]), ["hi"])
+        store_get.assert_not_called()
+
+    def test_write_behind_flushes_dirty_sessions(self):
+        session_id = self.manager.create_session("u1", "s1")
+        self.manager.write_behind = True
+        self.manager.save_session(session_id, [message("user", "hi")])
+        self.assertEqual(self.store.get(session_id)["history"], [])
+
+        self.manager.flush()
+        self.assertEqual(texts(self.store.get(session_id)["history"]), ["hi"])
+
+    def test_dirty_sessions_are_not_evicted_before_flush(self):
+        self.manager.write_behind = True
+        for sid in ("s1", "s2", "s3"):
+            self.manager.create_session("u1", sid)
+            self.manager.save_session(sid, [message("user", sid)])
+
+        self.manager.flush()
+        self.assertEqual(sorted(s["id"] for s in self.manager.list_user_sessions("u1")), ["s1", "s2", "s3"])
+        self.assertEqual(texts(self.store.get("s1")["history"]), ["s1"])
+
+    def test_listing_shows_unflushed_saves_without_flushing(self):
+        self.manager.write_behind = True
+        for user_id, sid in (("u1", "s1"), ("u2", "s2")):
+            self.manager.create_session(user_id, sid)
+            self.manager.save_session(sid, [message("user", f"hello from {sid}")], title=f"Chat {sid}")
+
+        listed = self.manager.list_user_sessions("u1")
+        self.assertEqual([(s["id"], s["title"], s["preview"]) for s in listed], [("s1", "Chat s1", "hello from s1")])
+        self.assertEqual(self.store.get("s1")["history"], [])     # nothing was written ...
+        self.assertEqual(self.manager._dirty, {"s1", "s2"})       # ... for either user
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,282 @@
+
+import asyncio
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from datetime import datetime
+from types import SimpleNamespace
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from utils.shared_state import LocalState, RedisState, RELEASE_LOCK_SCRIPT, RENEW_LOCK_SCRIPT
+from utils.session_store import SharedSessionStore
+from utils.session_manager import SessionManager
+from tools.search_cache import SearchCache
+from tools.page_cache import PageCache
+from helpers import FakeClock
+
+class FakeRedis:
+    """Stand-in for redis.Redis: the handful of commands RedisState uses, with PX expiry."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.values = {}   # key -> (expires_at | None, bytes)
+        self.zsets = {}
+        self.lists = {}
+
+    def _live(self, key):
+        entry = self.values.get(key)
+        if entry and entry[0] is not None and entry[0] <= self.clock():
+            del self.values[key]
+            return None
+        return entry
+
+    def get(self, key):
+        entry = self._live(key)
+        return entry[1] if entry else None
+
+    def set(self, key, value, px=None, nx=False):
+        if nx and self._live(key):
+            return None
+        self.values[key] = (self.clock() + px / 1000 if px else None, value)
+        return True
+
+    def delete(self, key):
+        self.values.pop(key, None)
+        self.zsets.pop(key, None)
+        self.lists.pop(key, None)
+
+    def rpush(self, key, *values):
+        self.lists.setdefault(key, []).extend(values)
+        return len(self.lists[key])
+
+    def lrange(self, key, start, stop):
+        return self.lists.get(key, [])[start:None if stop == -1 else stop + 1]
+
+    def incrby(self, key, amount):
+        entry = self._live(key)
+        value = int(entry[1]) + amount if entry else amount
+        self.values[key] = (entry[0] if entry else None, str(value).encode())
+        return value
+
+    def pexpire(self, key, px):
+        entry = self._live(key)
+        if entry:
+            self.values[key] = (self.clock() + px / 1000, entry[1])
+
+    def zadd(self, key, mapping):
+        self.zsets.setdefault(key, {}).update(mapping)
+
+    def zrem(self, key, member):
+        self.zsets.get(key, {}).pop(member, None)
+
+    def zrevrange(self, key, start, stop):
+        members = sorted(self.zsets.get(key, {}).items(), key=lambda item: item[1], reverse=True)
+        return [m.encode() for m, _ in members[start:None if stop == -1 else stop + 1]]
+
+    def register_script(self, script):
+        assert script in (RELEASE_LOCK_SCRIPT, RENEW_LOCK_SCRIPT)
+        def run(keys, args):
+            entry = self._live(keys[0])
+            if not entry or entry[1] != args[0].encode():
+                return 0
+            if script == RENEW_LOCK_SCRIPT:
+                self.values[keys[0]] = (self.clock() + args[1] / 1000, entry[1])
+            else:
+                del self.values[keys[0]]
+            return 1
+        return run
+
+def message(role, text):
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)])
+
+def fake_build_content(role, parts):
+    # Stand-in for google.generativeai.protos.Content (not installed in tests)
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=p.get("text")) for p in parts])
+
+class StateContract:
+    """Behaviour both backends must share."""
+
+    def test_set_get_with_ttl(self):
+        self.state.set("k", "v", ttl=10)
+        self.assertEqual(self.state.get("k"), b"v")
+        self.clock.now += 10
+        self.assertIsNone(self.state.get("k"))
+
+    def test_only_if_absent(self):
+        self.assertTrue(self.state.set("k", "a", only_if_absent=True))
+        self.assertFalse(self.state.set("k", "b", only_if_absent=True))
+        self.assertEqual(self.state.get("k"), b"a")
+
+    def test_incr_window(self):
+        self.assertEqual(self.state.incr("c", ttl=5), 1)
+        self.assertEqual(self.state.incr("c", 2, ttl=5), 3)
+        self.clock.now += 5
+        self.assertEqual(self.state.incr("c", ttl=5), 1)
+
+    def test_lists(self):
+        self.assertEqual(self.state.rpush("l", "a", "b"), 2)
+        self.assertEqual(self.state.rpush("l", "c"), 3)
+        self.assertEqual(self.state.lrange("l"), [b"a", b"b", b"c"])
+        self.assertEqual(self.state.lrange("l", 1, 1), [b"b"])
+        self.state.delete("l")
+        self.assertEqual(self.state.lrange("l"), [])
+
+    def test_sorted_index(self):
+        self.state.zadd("z", "old", 1)
+        self.state.zadd("z", "new", 2)
+        self.assertEqual(self.state.zrevrange("z"), ["new", "old"])
+        self.state.zrem("z", "new")
+        self.assertEqual(self.state.zrevrange("z"), ["old"])
+
+    def test_rate_limit_hit(self):
+        for _ in range(3):
+            self.assertEqual(self.state.hit("user:u1", 3, 60, clock=self.clock), (True, 0.0))
+        allowed, retry_after = self.state.hit("user:u1", 3, 60, clock=self.clock)
+        self.assertFalse(allowed)
+        self.assertEqual(retry_after, 20.0)   # clock 1000 -> window ends at 1020
+
+class TestLocalState(StateContract, unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.state = LocalState(clock=self.clock)
+
+class TestRedisState(StateContract, unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.redis = FakeRedis(self.clock)
+        self.state = RedisState(client=self.redis, prefix="t:")
+
+    def test_keys_are_prefixed(self):
+        self.state.set("k", "v")
+        self.assertIn("t:k", self.redis.values)
+
+    def test_lock_excludes_other_workers(self):
+        # Two RedisState instances over one server = two worker processes
+        other = RedisState(client=self.redis, prefix="t:")
+        order = []
+
+        async def turn(state, name):
+            async with state.lock("lock:session:s1", ttl=30):
+                order.append(f"{name} start")
+                await asyncio.sleep(0.1)
+                order.append(f"{name} end")
+
+        async def run():
+            await asyncio.gather(turn(self.state, "a"), turn(other, "b"))
+
+        asyncio.run(run())
+        self.assertEqual(order[:2], ["a start", "a end"])
+        self.assertNotIn("t:lock:session:s1", self.redis.values)
+
+    def test_lock_is_renewed_while_held(self):
+        async def run():
+            async with self.state.lock("lock:slow", ttl=0.09):
+                expires_at = self.redis.values["t:lock:slow"][0]
+                self.clock.now += 0.06        # most of the ttl gone ...
+                await asyncio.sleep(0.05)     # ... when the renewer (every ttl/3) runs
+                renewed = self.redis.values["t:lock:slow"][0]
+            return expires_at, renewed
+
+        expires_at, renewed = asyncio.run(run())
+        self.assertGreater(renewed, expires_at)
+        self.assertNotIn("t:lock:slow", self.redis.values)
+
+    def test_release_keeps_a_lock_taken_over_after_expiry(self):
+        async def run():
+            lock = self.state.lock("lock:x", ttl=1)
+            await lock.acquire()
+            self.clock.now += 2                              # expired ...
+            self.redis.set("t:lock:x", b"someone-else")      # ... and taken by another worker
+            await lock.release()
+
+        asyncio.run(run())
+        self.assertEqual(self.redis.get("t:lock:x"), b"someone-else")
+
+@patch("utils.history_codec.build_content", fake_build_content)
+class TestSharedSessions(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis(FakeClock())
+        self.state = RedisState(client=self.redis, prefix="t:")
+        # Two managers over the same state stand in for two workers
+        self.worker_a = SessionManager(store=SharedSessionStore(self.state))
+        self.worker_b = SessionManager(store=SharedSessionStore(self.state))
+
+    def test_workers_see_each_others_turns(self):
+        session_id = self.worker_a.create_session("u1", "s1")
+        self.worker_a.save_session(session_id, [message("user", "hi")])
+        history = self.worker_b.load_session(session_id)["history"]
+        self.worker_b.save_session(session_id, history + [message("model", "hello")])
+
+        data = self.worker_a.load_session(session_id)
+        self.assertEqual([m.parts[0].text for m in data["history"]], ["hi", "hello"])
+        self.assertEqual(data["user_id"], "u1")
+        self.assertIsInstance(data["updated_at"], datetime)
+
+    def test_turns_are_appended_not_rewritten(self):
+        session_id = self.worker_a.create_session("u1", "s1")
+        self.worker_a.save_session(session_id, [message("user", "hi")])
+        snapshot = self.redis.get("t:session:s1:history")
+        history = self.worker_b.load_session(session_id)["history"]
+        self.worker_b.save_session(session_id, history + [message("model", "hello"), message("user", "laptops?")])
+
+        self.assertEqual(self.redis.get("t:session:s1:history"), snapshot)
+        self.assertEqual(len(self.redis.lists["t:session:s1:turns"]), 3)   # every turn since create_session
+        data = self.worker_a.load_session(session_id)
+        self.assertEqual([m.parts[0].text for m in data["history"]], ["hi", "hello", "laptops?"])
+
+    def test_long_turn_log_is_compacted(self):
+        session_id = self.worker_a.create_session("u1", "s1")
+        history = []
+        with patch("utils.session_store.COMPACT_AFTER", 3):
+            for i in range(5):
+                history = history + [message("user", f"m{i}")]
+                self.worker_a.save_session(session_id, history)
+        self.assertLessEqual(len(self.redis.lists.get("t:session:s1:turns", [])), 3)
+        data = self.worker_b.load_session(session_id)
+        self.assertEqual([m.parts[0].text for m in data["history"]], [f"m{i}" for i in range(5)])
+
+    def test_list_and_transfer(self):
+        self.worker_a.create_session("guest", "s1")
+        self.worker_a.create_session("guest", "s2")
+        self.worker_b.transfer_session("s1", "u1")
+        self.assertEqual([s["id"] for s in self.worker_a.list_user_sessions("guest")], ["s2"])
+        self.assertEqual([s["id"] for s in self.worker_a.list_user_sessions("u1")], ["s1"])
+
+    def test_write_behind_disabled(self):
+        asyncio.run(self.worker_a.run_write_behind(interval=0))
+        self.assertFalse(self.worker_a.write_behind)
+
+    def test_turn_lock_is_shared(self):
+        self.assertIsInstance(self.worker_a.lock("s1"), type(self.state.lock("x", 1)))
+
+class TestSharedCacheLayers(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.state = LocalState(clock=self.clock)
+
+    def test_search_results_reach_other_workers(self):
+        a = SearchCache(ttl=60, db_path="", clock=self.clock, state=self.state)
+        b = SearchCache(ttl=60, db_path="", clock=self.clock, state=self.state)
+        a.set("laptop|5", "results")
+        self.assertEqual(b.get("laptop|5"), "results")
+        self.clock.now += 60
+        self.assertIsNone(b.get("laptop|5"))
+
+    def test_pages_reach_other_workers(self):
+        a = PageCache(clock=self.clock, state=self.state)
+        b = PageCache(clock=self.clock, state=self.state)
+        a.store("https://example.com/p?utm_source=x", text="page text", etag="abc")
+        entry, fresh = b.lookup("https://example.com/p")
+        self.assertTrue(fresh)
+        self.assertEqual(b.text(entry), "page text")
+        self.assertEqual(entry["etag"], "abc")
+
+if __name__ == '__main__':
+    unittest.main()
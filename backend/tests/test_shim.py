@@ -0,0 +1,234 @@
+
+import asyncio
+import time
+import unittest
+from unittest.mock import patch
+import os
+import sys
+from types import SimpleNamespace
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import google.generativeai as genai
+from core.shim import Agent, NO_TOOL_CALLS, SEARCH_UNAVAILABLE
+
+def text_part(text):
+    return genai.protos.Part(text=text)
+
+def search_call(query):
+    return genai.protos.Part(function_call=genai.protos.FunctionCall(name="search_web", args={"query": query}))
+
+class ScriptedResponse:
+    """Quacks like GenerateContentResponse; streams one chunk per part."""
+
+    def __init__(self, parts):
+        self.candidates = [SimpleNamespace(content=genai.protos.Content(role="model", parts=parts))]
+
+    @property
+    def text(self):
+        return "".join(p.text for p in self.candidates[0].content.parts if p.text)
+
+    def __aiter__(self):
+        return self._stream()
+
+    async def _stream(self):
+        for part in self.candidates[0].content.parts:
+            yield SimpleNamespace(candidates=[SimpleNamespace(content=SimpleNamespace(parts=[part]))])
+
+class ScriptedChat:
+    """ChatSession stand-in that replies from a script and records what it was sent."""
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+        self.history = []
+        self.sent = []
+
+    async def send_message_async(self, content, stream: bool = False, **kwargs):
+        self.sent.append((content, kwargs))
+        response = ScriptedResponse(self.replies.pop(0))
+        self.history += [content, response.candidates[0].content]
+        return response
+
+def scripted_agent(*replies):
+    """Agent over a scripted tool model; _gather_context records queries instead of searching."""
+    agent = Agent.__new__(Agent)
+    chat = ScriptedChat(replies)
+    agent.tool_model = SimpleNamespace(start_chat=lambda history=None: chat)
+    agent.queries = []
+
+    async def gather_context(query, emit=None):
+        agent.queries.append(query)
+        return f"results for {query}"
+
+    agent._gather_context = gather_context
+    return agent, chat
+
+class TestSingleShot(unittest.TestCase):
+
+    def test_second_search_then_answer_without_tools(self):
+        agent, chat = scripted_agent([search_call("laptop")], [search_call("laptop under 50000")],
+                                     [text_part('{"agent_response": "done", "products": []}')])
+        response = asyncio.run(agent._run_single_shot("laptop under 50k", []))
+
+        self.assertEqual(agent.queries, ["laptop", "laptop under 50000"])
+        self.assertEqual(response.output, '{"agent_response": "done", "products": []}')
+        self.assertNotIn("tool_config", chat.sent[1][1])
+        self.assertEqual(chat.sent[2][1]["tool_config"], NO_TOOL_CALLS)
+
+    def test_preamble_before_a_call_is_not_streamed(self):
+        agent, chat = scripted_agent([text_part("Let me look that up. "), search_call("phone")],
+                                     [text_part("Here you go.")])
+        tokens = []
+
+        async def emit(event, data):
+            if event == "token":
+                tokens.append(data["text"])
+
+        response = asyncio.run(agent._run_single_shot("best phone", [], emit=emit))
+        self.assertEqual("".join(tokens), "Here you go.")
+        self.assertEqual(response.output, "Here you go.")
+
+    def test_direct_answer_is_streamed(self):
+        agent, chat = scripted_agent([text_part("Hello"), text_part(" there")])
+        tokens = []
+
+        async def emit(event, data):
+            tokens.append(data.get("text"))
+
+        response = asyncio.run(agent._run_single_shot("hi", [], emit=emit))
+        self.assertEqual("".join(tokens), "Hello there")
+        self.assertEqual(agent.queries, [])
+        self.assertEqual(response.output, "Hello there")
+
+class TestRunHeavy(unittest.TestCase):
+
+    def test_blocking_entry_point_works_inside_a_running_loop(self):
+        agent = Agent.__new__(Agent)
+
+        async def run_heavy_async(user_input, chat_history, emit=None):
+            await asyncio.sleep(0)
+            return f"answer to {user_input}"
+
+        agent.run_heavy_async = run_heavy_async
+
+        async def caller():
+            return agent.run_heavy("laptops", [])
+
+        self.assertEqual(agent.run_heavy("phones", []), "answer to phones")
+        self.assertEqual(asyncio.run(caller()), "answer to laptops")
+
+SEARCH_RESULTS = "\n---\n".join(
+    f"Title: Laptop {i}\nLink: https://shop.example/laptop-{i}?utm_source=x\nSnippet: Listing {i}." for i in range(1, 5))
+
+def fake_scrape(delays):
+    """scrape_url stand-in: sleeps per URL; a negative delay returns a scraper error string."""
+    def scrape(url):
+        delay = delays.get(url.rsplit("/", 1)[-1], 0)
+        time.sleep(abs(delay))
+        return f"Error scraping {url}" if delay < 0 else f"page text of {url}"
+    return scrape
+
+NO_CATALOG = SimpleNamespace(search=lambda query: {"results": [], "sufficient": False, "coverage": 0.0})
+
+@patch("core.shim.catalog", NO_CATALOG)
+@patch("core.shim.FANOUT_RESULTS", 3)
+class TestFanout(unittest.TestCase):
+
+    def setUp(self):
+        self.agent = Agent.__new__(Agent)
+        self.searched = []
+
+        def search(query):
+            self.searched.append(query)
+            return SEARCH_RESULTS
+
+        patcher = patch("core.shim.search_web", search)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_top_results_scraped_concurrently_in_rank_order(self):
+        with patch("core.shim.scrape_url", fake_scrape({"laptop-1": 0.2, "laptop-2": 0.2, "laptop-3": 0.01})):
+            started = time.perf_counter()
+            context = asyncio.run(self.agent._gather_context("gaming laptop"))
+            elapsed = time.perf_counter() - started
+
+        self.assertEqual(self.searched, ["gaming laptop"])
+        self.assertLess(elapsed, 0.4)     # not 0.41s sequentially
+        order = [context.index(f"CONTENT FROM https://shop.example/laptop-{i}") for i in (1, 2, 3)]
+        self.assertEqual(order, sorted(order))
+        self.assertNotIn("laptop-4 ---", context)
+
+    def test_stragglers_and_failed_pages_are_dropped(self):
+        with patch("core.shim.scrape_url", fake_scrape({"laptop-1": 0.5, "laptop-2": -0.01})), \
+                patch("core.shim.FANOUT_BUDGET", 0.1):
+            pages = asyncio.run(self.agent._scrape_many(
+                [f"https://shop.example/laptop-{i}" for i in (1, 2, 3)]))
+        self.assertEqual(pages, [("https://shop.example/laptop-3", "page text of https://shop.example/laptop-3")])
+
+    def test_search_outage_skips_scraping(self):
+        with patch("core.shim.search_web", lambda query: SEARCH_UNAVAILABLE), \
+                patch("core.shim.scrape_url", fake_scrape({})):
+            context = asyncio.run(self.agent._gather_context("gaming laptop"))
+        self.assertIn(SEARCH_UNAVAILABLE, context)
+        self.assertNotIn("CONTENT FROM", context)
+
+def planned_agent(plan, search_delay=0.0):
+    """Agent over a scripted plan/answer model; _search sleeps and records queries, scraping is skipped."""
+    agent = Agent.__new__(Agent)
+    chat = ScriptedChat([[text_part(plan)], [text_part("final answer")]])
+    agent.model = SimpleNamespace(start_chat=lambda history=None: chat)
+    agent.searches = {"started": [], "finished": [], "cancelled": []}
+
+    async def search(query, emit=None):
+        agent.searches["started"].append(query)
+        try:
+            await asyncio.sleep(search_delay)
+        except asyncio.CancelledError:
+            agent.searches["cancelled"].append(query)
+            raise
+        agent.searches["finished"].append(query)
+        return f"results for {query}"
+
+    async def catalog_context(query, emit=None):
+        return "", False
+
+    async def scrape_context(search_results, emit=None):
+        return f"\n{search_results}\n"
+
+    agent._search = search
+    agent._catalog_context = catalog_context
+    agent._scrape_context = scrape_context
+    return agent, chat
+
+def run_planned(agent, user_input):
+    """Runs a speculative turn; returns its response and the tasks still pending once it returned."""
+    async def turn():
+        response = await agent._run_planned(user_input, [], speculative=True)
+        return response, [t for t in asyncio.all_tasks() if t is not asyncio.current_task() and not t.done()]
+    return asyncio.run(turn())
+
+class TestSpeculativePlan(unittest.TestCase):
+
+    def test_speculative_search_is_reused_when_the_plan_searches(self):
+        agent, chat = planned_agent("SEARCH: gaming laptop under 50000", search_delay=0.01)
+        response, pending = run_planned(agent, "gaming laptop under 50k")
+
+        self.assertEqual(agent.searches["started"], ["gaming laptop under 50k"])    # no second search
+        self.assertEqual(agent.searches["finished"], ["gaming laptop under 50k"])
+        self.assertIn("results for gaming laptop under 50k", chat.sent[1][0])
+        self.assertEqual(response.output, "final answer")
+        self.assertEqual(pending, [])
+
+    def test_speculative_search_is_cancelled_when_the_plan_answers(self):
+        agent, chat = planned_agent("ANSWER", search_delay=10)
+        response, pending = run_planned(agent, "thanks, that helps")
+
+        self.assertEqual(agent.searches["cancelled"], ["thanks, that helps"])
+        self.assertEqual(agent.searches["finished"], [])
+        self.assertNotIn("results for", chat.sent[1][0])
+        self.assertEqual(response.output, "final answer")
+        self.assertEqual(pending, [])
+
+if __name__ == '__main__':
+    unittest.main()
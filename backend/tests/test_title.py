@@ -0,0 +1,64 @@
+
+import asyncio
+import threading
+import unittest
+import os
+import sys
+from types import SimpleNamespace
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from helpers import AppTestCase
+
+def message(role, text):
+    return SimpleNamespace(role=role, parts=[SimpleNamespace(text=text)])
+
+class TestGenerateTitle(AppTestCase):
+
+    def test_title_from_first_user_message(self):
+        session_id = self.manager.create_session("mock_user_123", "s1")
+        self.manager.save_session(session_id, [message("user", "best gaming laptop under 50000"), message("model", "ok")])
+        response = self.client.post("/agent/title", json={"session_id": session_id})
+        self.assertEqual(response.json(), {"title": "Best Gaming Laptop Under"})
+        self.assertEqual(self.manager.load_session(session_id)["title"], "Best Gaming Laptop Under")
+
+    def test_other_users_session_is_not_found(self):
+        session_id = self.manager.create_session("someone_else", "s1")
+        self.assertEqual(self.client.post("/agent/title", json={"session_id": session_id}).status_code, 404)
+
+    def test_turn_saved_meanwhile_is_kept(self):
+        session_id = self.manager.create_session("mock_user_123", "s1")
+        first_turn = [message("user", "best laptop"), message("model", "Here are a few")]
+        self.manager.save_session(session_id, first_turn)
+
+        # The title request's load blocks until the turn has saved, to force the race deterministically
+        loaded, saved = threading.Event(), threading.Event()
+        load_session = self.manager.load_session
+        def load_and_signal(*args, **kwargs):
+            data = load_session(*args, **kwargs)
+            loaded.set()
+            saved.wait(timeout=1)
+            return data
+        self.manager.load_session = load_and_signal
+
+        async def scenario():
+            # A chat turn holds the session lock while the title request arrives
+            async with self.manager.lock(session_id):
+                titling = asyncio.create_task(
+                    self.main.generate_title(self.main.TitleRequest(session_id=session_id), {"uid": "mock_user_123"}))
+                for _ in range(20):
+                    await asyncio.sleep(0.005)
+                    if loaded.is_set():
+                        break     # without the lock the old history was read before this save
+                self.manager.save_session(session_id, first_turn + [message("user", "and phones?"), message("model", "Sure")])
+                saved.set()
+            return await titling
+
+        self.assertEqual(asyncio.run(scenario()), {"title": "Best Laptop"})
+        data = load_session(session_id)
+        self.assertEqual(len(data["history"]), 4)
+        self.assertEqual(data["title"], "Best Laptop")
+
+if __name__ == '__main__':
+    unittest.main()
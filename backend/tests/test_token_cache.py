@@ -0,0 +1,54 @@
+
+import unittest
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.token_cache import TokenCache, FirebaseKeyRing, EXP_LEEWAY
+from helpers import FakeClock
+
+class TestTokenCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = TokenCache(max_entries=2, max_ttl=600, clock=self.clock)
+
+    def test_hit_until_exp(self):
+        self.cache.set("token-a", {"uid": "a", "exp": self.clock.now + 120})
+        self.assertEqual(self.cache.get("token-a")["uid"], "a")
+        self.clock.now += 120 - EXP_LEEWAY
+        self.assertIsNone(self.cache.get("token-a"))
+        self.assertEqual(self.cache.stats()["hits"], 1)
+
+    def test_max_ttl_caps_long_lived_tokens(self):
+        self.cache.set("token-a", {"uid": "a", "exp": self.clock.now + 10000})
+        self.clock.now += 601
+        self.assertIsNone(self.cache.get("token-a"))
+
+    def test_expired_tokens_not_cached(self):
+        self.cache.set("token-a", {"uid": "a", "exp": self.clock.now + 5})
+        self.assertIsNone(self.cache.get("token-a"))
+
+    def test_lru_bound_and_raw_token_not_stored(self):
+        for name in ["a", "b", "c"]:
+            self.cache.set(f"token-{name}", {"uid": name})
+        self.assertIsNone(self.cache.get("token-a"))
+        self.assertEqual(self.cache.get("token-c")["uid"], "c")
+        self.assertNotIn("token-c", self.cache._entries)
+
+class TestFirebaseKeyRing(unittest.TestCase):
+
+    def test_not_ready_defers_to_firebase_admin(self):
+        clock = FakeClock()
+        ring = FirebaseKeyRing(project_id=None, clock=clock)
+        ring.certs, ring.expires_at = {"kid": "cert"}, clock.now + 60
+        self.assertIsNone(ring.verify("anything"))
+        ring.project_id = "demo"
+        clock.now += 61
+        self.assertFalse(ring.ready)
+        self.assertIsNone(ring.verify("anything"))
+
+if __name__ == '__main__':
+    unittest.main()
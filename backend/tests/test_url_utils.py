@@ -0,0 +1,43 @@
+
+import unittest
+import os
+import sys
+
+# Ensure backend modules can be imported
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from tools.url_utils import canonicalize_url, extract_links
+
+class TestCanonicalizeUrl(unittest.TestCase):
+
+    def test_generic_trackers_dropped_everywhere(self):
+        self.assertEqual(canonicalize_url("https://www.Example.com/p/?utm_source=x&gclid=1&id=7#reviews"),
+                         "https://example.com/p?id=7")
+
+    def test_content_params_on_other_sites_do_not_collide(self):
+        for a, b in [("https://example.com/search?keywords=laptop", "https://example.com/search?keywords=phone"),
+                     ("https://example.com/list?tag=gpu", "https://example.com/list?tag=ssd"),
+                     ("https://forum.example.com/t?th=1", "https://forum.example.com/t?th=2"),
+                     ("https://shop.example.com/c?sr=price", "https://shop.example.com/c?sr=rating"),
+                     ("https://blog.example.com/post?ref=a", "https://blog.example.com/post?ref=b")]:
+            self.assertNotEqual(canonicalize_url(a), canonicalize_url(b), a)
+
+    def test_retailer_trackers_scoped_to_retailer(self):
+        self.assertEqual(
+            canonicalize_url("https://www.amazon.in/Some-Laptop/dp/b0chx1w1xy/ref=sr_1_1?keywords=laptop&qid=1&th=1"),
+            "https://amazon.in/dp/B0CHX1W1XY")
+        self.assertEqual(canonicalize_url("https://www.amazon.in/s?k=laptop&crid=X&sprefix=lap&ref=nb_sb"),
+                         "https://amazon.in/s?k=laptop")
+        self.assertEqual(canonicalize_url("https://www.flipkart.com/p/itm1?pid=ABC&lid=L1&otracker=search"),
+                         "https://flipkart.com/p/itm1?pid=ABC")
+        self.assertEqual(canonicalize_url("https://notflipkart.com/p?lid=L1"), "https://notflipkart.com/p?lid=L1")
+
+    def test_extract_links_keeps_distinct_results(self):
+        text = ("1. https://example.com/search?keywords=laptop\n"
+                "2. https://example.com/search?keywords=phone\n"
+                "3. https://example.com/search?keywords=laptop&utm_medium=email\n")
+        self.assertEqual(extract_links(text), ["https://example.com/search?keywords=laptop",
+                                               "https://example.com/search?keywords=phone"])
+
+if __name__ == '__main__':
+    unittest.main()
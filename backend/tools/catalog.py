@@ -0,0 +1,297 @@
+"""
+Hybrid retrieval over the ingested product catalog (see tools/ingest.py).
+
+Two legs, fused with reciprocal rank fusion:
+  - vector: Chroma nearest neighbours of the query embedding
+  - keyword: BM25 over the catalog documents (held in memory)
+Both legs honour the same metadata filters, parsed from the query: a price range
+("under 50k", "between 20000 and 30000") on `price_value` and a category whose
+name appears in the query.
+
+Lookups take milliseconds, so the heavy agent asks the catalog first and only
+goes to search_web (seconds) when catalog recall looks poor.
+"""
+import math
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import List, Optional
+from tools.search_cache import normalize_query
+from tools.embeddings import get_embedder, collection_name
+
+try:
+    import chromadb
+    CHROMA_AVAILABLE = True
+except ImportError:
+    CHROMA_AVAILABLE = False
+
+CHROMA_PATH = os.getenv("CATALOG_CHROMA_PATH", "./chroma_data")
+COLLECTION_NAME = "hackathon_catalog"
+CATALOG_ENABLED = os.getenv("CATALOG_ENABLED", "1") == "1"
+CATALOG_RESULTS = int(os.getenv("CATALOG_RESULTS", "5"))
+CATALOG_MIN_COVERAGE = float(os.getenv("CATALOG_MIN_COVERAGE", "0.6"))  # share of query terms the best hit must contain
+CATALOG_REFRESH = 60            # seconds between checks for a re-ingested collection
+INGEST_VERSION_KEY = "ingest_version"   # collection metadata stamped by tools/ingest.py
+RRF_K = 60
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+NUMBER = r"₹?\s*(\d+(?:\.\d+)?)\s*(k|l|lakh|lakhs|lac)?"
+MULTIPLIERS = {"k": 1000, "l": 100000, "lakh": 100000, "lakhs": 100000, "lac": 100000}
+BETWEEN = re.compile(rf"\bbetween\s+{NUMBER}\s+(?:and|to|-)\s+{NUMBER}")
+UPPER = re.compile(rf"\b(?:under|below|within|upto|up to|less than|max|maximum|budget(?: of)?)\s+(?:rs\.?\s*)?{NUMBER}")
+LOWER = re.compile(rf"\b(?:above|over|more than|min|minimum|at least|atleast)\s+(?:rs\.?\s*)?{NUMBER}")
+# Words that carry no product meaning for recall scoring
+STOPWORDS = {"a", "an", "the", "for", "of", "in", "me", "i", "my", "show", "please", "some", "any", "best",
+             "good", "top", "what", "which", "is", "are", "to", "can", "you", "find", "get", "with", "and",
+             "on", "under", "below", "above", "over", "between", "within", "upto", "rs", "inr", "price",
+             "buy", "cheap", "cheapest", "budget", "recommend", "suggest", "india", "online", "want", "need"}
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for token in normalize_query(text).split():
+        token = token.strip(".-₹")
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        if token:
+            tokens.append(token)
+    return tokens
+
+
+def _amount(value: str, unit: Optional[str]) -> float:
+    return float(value) * MULTIPLIERS.get((unit or "").lower(), 1)
+
+
+def parse_price_range(query: str):
+    """'laptop under 50k' -> (None, 50000.0); 'between 20k and 30k' -> (20000.0, 30000.0)"""
+    text = re.sub(r"(?<=\d),(?=\d)", "", query.lower())
+    match = BETWEEN.search(text)
+    if match:
+        low, high = sorted([_amount(match.group(1), match.group(2)), _amount(match.group(3), match.group(4))])
+        return low, high
+    low = high = None
+    match = UPPER.search(text)
+    if match:
+        high = _amount(match.group(1), match.group(2))
+    match = LOWER.search(text)
+    if match:
+        low = _amount(match.group(1), match.group(2))
+    return low, high
+
+
+class BM25:
+    """Okapi BM25 over an inverted index, so a query only visits the postings of its own terms."""
+
+    def __init__(self, documents: List[str]):
+        self.postings = {}   # term -> [(doc index, term frequency)]
+        self.lengths = []
+        for i, doc in enumerate(documents):
+            counts = Counter(tokenize(doc))
+            self.lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((i, tf))
+        n = len(self.lengths)
+        self.avg_length = (sum(self.lengths) / n) if n else 0.0
+        self.idf = {term: math.log(1 + (n - len(p) + 0.5) / (len(p) + 0.5)) for term, p in self.postings.items()}
+
+    def scores(self, query: str, candidates=None) -> List[tuple]:
+        """(index, score) for documents matching any query term, best first."""
+        allowed = set(candidates) if candidates is not None else None
+        totals = Counter()
+        for term in set(tokenize(query)):
+            for i, tf in self.postings.get(term, ()):
+                if allowed is not None and i not in allowed:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[i] / (self.avg_length or 1))
+                totals[i] += self.idf[term] * tf * (BM25_K1 + 1) / (tf + norm)
+        return sorted(totals.items(), key=lambda r: r[1], reverse=True)
+
+
+class CatalogRetriever:
+    """
+    Hybrid catalog search. The collection's documents are mirrored in memory for
+    BM25 and category detection, and reloaded when the ingest version stamp (or
+    the size, for collections without one) changes.
+    """
+
+    def __init__(self, collection=None, embedder=None, results: int = CATALOG_RESULTS,
+                 min_coverage: float = CATALOG_MIN_COVERAGE):
+        self.collection = collection
+        self.embedder = embedder
+        self.results = results
+        self.min_coverage = min_coverage
+        self._lock = threading.Lock()
+        self._client = None
+        self._loaded_version = None
+        self._loaded_count = 0
+        self._checked_at = 0.0
+        self.ids, self.documents, self.metadatas = [], [], []
+        self.position = {}     # id -> index
+        self.categories = {}   # category -> token set
+        self.bm25 = BM25([])
+
+    # --- Loading ---
+
+    def _connect(self):
+        if self.collection is not None:
+            return self.collection
+        if not (CATALOG_ENABLED and CHROMA_AVAILABLE and os.path.isdir(CHROMA_PATH)):
+            return None
+        try:
+            self._client = chromadb.PersistentClient(path=CHROMA_PATH)
+            self.embedder = self.embedder or get_embedder()
+            self.collection = self._client.get_collection(collection_name(COLLECTION_NAME, self.embedder))
+        except Exception as e:
+            print(f"⚠️ Catalog unavailable: {e}")
+        return self.collection
+
+    def _ensure_loaded(self) -> bool:
+        """True if there is a non-empty catalog. Checks for re-ingestion at most every CATALOG_REFRESH seconds."""
+        with self._lock:
+            now = time.time()
+            if now - self._checked_at < CATALOG_REFRESH:
+                return self._loaded_count > 0
+            self._checked_at = now
+            collection = self._connect()
+            if collection is None:
+                return False
+            version = self._version(collection)
+            if version != self._loaded_version:
+                data = collection.get(include=["documents", "metadatas"])
+                self.ids = list(data["ids"])
+                self.documents = list(data["documents"])
+                self.metadatas = [m or {} for m in data["metadatas"]]
+                self.position = {doc_id: i for i, doc_id in enumerate(self.ids)}
+                self.bm25 = BM25(self.documents)
+                self.categories = {}
+                for meta in self.metadatas:
+                    category = str(meta.get("Category") or "").strip()
+                    if category and category not in self.categories:
+                        self.categories[category] = set(tokenize(category))
+                self._loaded_version = version
+                self._loaded_count = len(self.ids)
+                print(f"📚 Catalog loaded: {self._loaded_count} products")
+            return self._loaded_count > 0
+
+    def _version(self, collection) -> tuple:
+        """(ingest version stamp, size). The stamp changes on every ingest that modified rows."""
+        metadata = collection.metadata
+        if self._client is not None:
+            # Collection objects cache their metadata; re-read it from the store
+            metadata = self._client.get_collection(collection.name).metadata
+        return (metadata or {}).get(INGEST_VERSION_KEY), collection.count()
+
+    # --- Query understanding ---
+
+    def parse_filters(self, query: str) -> dict:
+        low, high = parse_price_range(query)
+        terms = set(tokenize(query))
+        category = None
+        best = 0
+        for name, tokens in self.categories.items():
+            if tokens and tokens <= terms and len(tokens) > best:
+                category, best = name, len(tokens)
+        return {"min_price": low, "max_price": high, "category": category}
+
+    @staticmethod
+    def _where(filters: dict):
+        clauses = []
+        if filters["min_price"] is not None:
+            clauses.append({"price_value": {"$gte": filters["min_price"]}})
+        if filters["max_price"] is not None:
+            clauses.append({"price_value": {"$lte": filters["max_price"]}})
+        if filters["category"]:
+            clauses.append({"Category": {"$eq": filters["category"]}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+    @staticmethod
+    def _matches(meta: dict, filters: dict) -> bool:
+        price = meta.get("price_value")
+        if filters["min_price"] is not None and (price is None or price < filters["min_price"]):
+            return False
+        if filters["max_price"] is not None and (price is None or price > filters["max_price"]):
+            return False
+        if filters["category"] and meta.get("Category") != filters["category"]:
+            return False
+        return True
+
+    # --- Search ---
+
+    def search(self, query: str, k: int = None) -> dict:
+        """
+        Returns {"results": [{"id", "document", "metadata", "score"}], "filters", "coverage", "sufficient"}.
+        `sufficient` is False when the web should be searched instead.
+        """
+        k = k or self.results
+        empty = {"results": [], "filters": None, "coverage": 0.0, "sufficient": False}
+        try:
+            if not self._ensure_loaded():
+                return empty
+            filters = self.parse_filters(query)
+            where = self._where(filters)
+            candidates = None   # no filters: every document
+            if where is not None:
+                candidates = [i for i, meta in enumerate(self.metadatas) if self._matches(meta, filters)]
+                if not candidates:
+                    return dict(empty, filters=filters)
+
+            fused = Counter()
+            for rank, (i, _) in enumerate(self.bm25.scores(query, candidates)[:k * 4]):
+                fused[self.ids[i]] += 1.0 / (RRF_K + rank + 1)
+
+            self.embedder = self.embedder or get_embedder()
+            vector_hits = self.collection.query(
+                query_embeddings=[self.embedder.embed_query(query).tolist()],
+                n_results=min(k * 4, len(self.ids) if candidates is None else len(candidates)),
+                where=where,
+            )
+            for rank, doc_id in enumerate(vector_hits["ids"][0]):
+                fused[doc_id] += 1.0 / (RRF_K + rank + 1)
+        except Exception as e:
+            print(f"⚠️ Catalog search failed: {e}")
+            return empty
+
+        results = []
+        for doc_id, score in fused.most_common(k):
+            i = self.position.get(doc_id)
+            if i is None:
+                continue
+            results.append({"id": doc_id, "document": self.documents[i], "metadata": self.metadatas[i],
+                            "score": round(score, 5)})
+
+        coverage = self._coverage(query, results)
+        return {"results": results, "filters": filters, "coverage": coverage,
+                "sufficient": bool(results) and coverage >= self.min_coverage}
+
+    def _coverage(self, query: str, results: list) -> float:
+        """Share of the query's product terms found in the best of the top 3 hits."""
+        terms = {t for t in tokenize(query) if t not in STOPWORDS and not t[0].isdigit()}
+        if not terms:
+            return 1.0 if results else 0.0
+        best = 0.0
+        for result in results[:3]:
+            doc_terms = set(tokenize(result["document"]))
+            best = max(best, len(terms & doc_terms) / len(terms))
+        return round(best, 3)
+
+
+def format_results(results: list) -> str:
+    """Catalog hits as context for the synthesis prompt."""
+    lines = []
+    for n, result in enumerate(results, 1):
+        extras = ", ".join(
+            f"{key}: {value}" for key, value in result["metadata"].items()
+            if key not in ("content_hash", "price_value", "Product Name", "Category", "Price", "Description")
+            and value not in ("", None)
+        )
+        lines.append(f"{n}. {result['document']}" + (f" ({extras})" if extras else ""))
+    return "\n".join(lines)
+
+
+# Singleton instance
+catalog = CatalogRetriever()
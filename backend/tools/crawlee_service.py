@@ -1,41 +1,198 @@
 import asyncio
-from crawlee.crawlers import PlaywrightCrawler, PlaywrightCrawlingContext
-from crawlee.browsers import BrowserPool
+import os
+import threading
+from playwright.async_api import async_playwright
+from utils.metrics import metrics
 
-async def scrape_with_crawlee(url: str) -> str:
+# Pool tuning (env overridable)
+MAX_PAGES = int(os.getenv("BROWSER_MAX_PAGES", "4"))                 # concurrent pages across the pool
+NUM_CONTEXTS = int(os.getenv("BROWSER_CONTEXTS", "2"))               # warm browser contexts kept open
+PAGE_TIMEOUT = float(os.getenv("BROWSER_PAGE_TIMEOUT", "15"))        # seconds per page fetch
+RECYCLE_AFTER = int(os.getenv("BROWSER_CONTEXT_RECYCLE_AFTER", "50"))  # pages before a context is replaced
+BLOCKED_RESOURCES = {"image", "font", "media"}
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36"
+)
+
+
+class BrowserPool:
     """
-    Scrapes a single URL using Crawlee + Playwright.
-    Returns the cleaned text content.
+    Process-wide headless Chromium with a few warm contexts.
+
+    The browser lives on its own event loop thread, so it can be shared by
+    sync callers (worker threads) and async callers (the API loop) alike,
+    and is never tied to a short-lived `asyncio.run()` loop.
     """
-    result = {"text": ""}
-
-    crawler = PlaywrightCrawler(
-        # Limit to 1 request since we just want this one page
-        max_requests_per_crawl=1,
-        headless=True,
-    )
-
-    @crawler.router.default_handler
-    async def request_handler(context: PlaywrightCrawlerContext):
-        # Wait for body to be visible
-        await context.page.wait_for_selector("body")
-        
-        # Simple text extraction
-        # You might want to enhance this with specific selectors for Amazon/Flipkart
-        # e.g. await context.page.content() and use BS4, or use page.inner_text()
-        
-        # Let's use inner_text for simplicity and JS rendering
-        text = await context.page.inner_text("body")
-        result["text"] = text
-
-    await crawler.run([url])
-    return result["text"]
+
+    def __init__(self, max_pages: int = MAX_PAGES, num_contexts: int = NUM_CONTEXTS):
+        self.max_pages = max_pages
+        self.num_contexts = max(1, num_contexts)
+        self._loop = None
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._start_lock = None
+        self._playwright = None
+        self._browser = None
+        self._semaphore = None
+        self._contexts = []   # [{"context": ..., "served": int, "active": int}]
+        self._next = 0
+
+    # --- Loop management ---
+
+    def _ensure_loop(self):
+        with self._thread_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name="browser-pool", daemon=True
+                )
+                self._thread.start()
+        return self._loop
+
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    # --- Browser lifecycle (runs on the pool loop) ---
+
+    async def _start(self):
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._browser and self._browser.is_connected():
+                return
+            print("🌐 Starting browser pool...")
+            if self._playwright is None:
+                self._playwright = await async_playwright().start()
+            self._browser = await self._playwright.chromium.launch(
+                headless=True,
+                args=["--disable-dev-shm-usage", "--disable-gpu", "--no-sandbox"],
+            )
+            self._semaphore = asyncio.Semaphore(self.max_pages)
+            self._contexts = [await self._new_context() for _ in range(self.num_contexts)]
+            print(f"✅ Browser pool ready ({self.num_contexts} contexts, {self.max_pages} pages)")
+
+    async def _new_context(self):
+        context = await self._browser.new_context(user_agent=USER_AGENT, locale="en-IN")
+        context.set_default_timeout(PAGE_TIMEOUT * 1000)
+        await context.route("**/*", self._block_heavy_resources)
+        return {"context": context, "served": 0, "active": 0}
+
+    @staticmethod
+    async def _block_heavy_resources(route):
+        if route.request.resource_type in BLOCKED_RESOURCES:
+            await route.abort()
+        else:
+            await route.continue_()
+
+    def _checkout_context(self):
+        # Retired slots are out of rotation (unless their replacement isn't ready and nothing else is)
+        live = [slot for slot in self._contexts if not slot.get("retired")] or self._contexts
+        slot = live[self._next % len(live)]
+        self._next += 1
+        slot["served"] += 1
+        slot["active"] += 1
+        return slot
+
+    async def _checkin_context(self, slot):
+        slot["active"] -= 1
+        # Recycle long-lived contexts to keep memory bounded. Retire before awaiting the
+        # replacement so a concurrent checkin of the same slot doesn't recycle it twice.
+        if slot["served"] >= RECYCLE_AFTER and not slot.get("retired") and slot in self._contexts:
+            slot["retired"] = True
+            fresh = await self._new_context()
+            if slot in self._contexts:
+                self._contexts = [fresh if s is slot else s for s in self._contexts]
+            else:   # the pool was closed meanwhile
+                await self._close_slot(fresh)
+        if slot.get("retired") and slot["active"] == 0 and slot not in self._contexts:
+            await self._close_slot(slot)
+
+    @staticmethod
+    async def _close_slot(slot):
+        try:
+            await slot["context"].close()
+        except Exception:
+            pass
+
+    async def _fetch_text(self, url: str) -> str:
+        if not (self._browser and self._browser.is_connected()):
+            await self._start()
+
+        async with self._semaphore:
+            slot = self._checkout_context()
+            page = None
+            try:
+                page = await slot["context"].new_page()
+                await page.goto(url, wait_until="domcontentloaded", timeout=PAGE_TIMEOUT * 1000)
+                await page.wait_for_selector("body", timeout=PAGE_TIMEOUT * 1000)
+                return await page.inner_text("body")
+            finally:
+                if page:
+                    try:
+                        await page.close()
+                    except Exception:
+                        pass
+                await self._checkin_context(slot)
+
+    async def _close(self):
+        slots, self._contexts = self._contexts, []
+        for slot in slots:
+            await self._close_slot(slot)
+        if self._browser:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright:
+            await self._playwright.stop()
+            self._playwright = None
+
+    # --- Public API ---
+
+    def warm(self):
+        """Starts the browser in the background without waiting for it."""
+        self._submit(self._start())
+
+    def fetch_text(self, url: str) -> str:
+        """Blocking fetch, safe to call from any thread (including inside a running loop's executor)."""
+        future = self._submit(asyncio.wait_for(self._fetch_text(url), PAGE_TIMEOUT))
+        return future.result(timeout=PAGE_TIMEOUT + 5)
+
+    async def fetch_text_async(self, url: str) -> str:
+        """Awaitable fetch for code already running on an event loop."""
+        future = self._submit(asyncio.wait_for(self._fetch_text(url), PAGE_TIMEOUT))
+        return await asyncio.wrap_future(future)
+
+    def close(self):
+        if self._loop is None:
+            return
+        try:
+            self._submit(self._close()).result(timeout=10)
+        except Exception as e:
+            print(f"⚠️ Browser pool shutdown error: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+# Singleton instance
+browser_pool = BrowserPool()
+
 
 def scrape_url_dynamic(url: str) -> str:
     """
-    Synchronous wrapper for the async crawler.
+    Synchronous wrapper around the shared browser pool.
+    Returns the page's rendered body text.
     """
     try:
-        return asyncio.run(scrape_with_crawlee(url))
+        return browser_pool.fetch_text(url)
+    except Exception as e:
+        metrics.record_error("browser", type(e).__name__)
+        return f"Error scraping with browser pool: {e!r}"
+
+
+async def scrape_url_dynamic_async(url: str) -> str:
+    """Async wrapper around the shared browser pool."""
+    try:
+        return await browser_pool.fetch_text_async(url)
     except Exception as e:
-        return f"Error scraping with Crawlee: {e}"
+        metrics.record_error("browser", type(e).__name__)
+        return f"Error scraping with browser pool: {e!r}"
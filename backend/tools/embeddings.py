@@ -0,0 +1,259 @@
+"""
+Embedding providers for the product catalog.
+
+    gemini  - remote models/text-embedding-004 (768-d, network round trip per batch)
+    onnx    - local quantized sentence-transformer exported to ONNX (CPU, needs onnxruntime + tokenizers)
+    hashing - local signed hashing vectorizer over words and character trigrams (NumPy only, always available)
+
+EMBEDDING_PROVIDER picks one ("auto": onnx if a model is configured, else gemini if
+an API key is set, else hashing). Every provider is wrapped in a cache keyed by
+the SHA-256 of the text, so re-ingesting or re-querying the same text is free.
+Vectors from different providers are not comparable, so each provider gets its
+own Chroma collection (see collection_name).
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import zlib
+from collections import OrderedDict
+from typing import List
+import numpy as np
+from tools.search_cache import normalize_query
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "auto")
+GEMINI_EMBEDDING_MODEL = "models/text-embedding-004"
+ONNX_MODEL_DIR = os.getenv("EMBEDDING_ONNX_MODEL", "")          # dir with model.onnx + tokenizer.json
+HASHING_DIM = int(os.getenv("EMBEDDING_HASHING_DIM", "512"))
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", os.path.join("storage", "embedding_cache.db"))  # "" disables disk
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "4096"))  # in-memory vectors
+BATCH_SIZE = 100
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class EmbeddingProvider:
+    """Interface: embed a batch of texts into an (n, dim) float32 array."""
+    name = "base"
+    remote = False  # remote providers are rate limited by callers
+
+    def embed(self, texts: List[str], task: str = "document") -> np.ndarray:
+        raise NotImplementedError
+
+    def embed_query(self, text: str) -> np.ndarray:
+        return self.embed([text], task="query")[0]
+
+
+class GeminiEmbeddings(EmbeddingProvider):
+    name = "gemini"
+    remote = True
+
+    def __init__(self, model: str = GEMINI_EMBEDDING_MODEL):
+        import google.generativeai as genai
+        self.genai = genai
+        self.model = model
+
+    def embed(self, texts: List[str], task: str = "document") -> np.ndarray:
+        vectors = []
+        for i in range(0, len(texts), BATCH_SIZE):
+            vectors.extend(self.genai.embed_content(
+                model=self.model,
+                content=texts[i:i + BATCH_SIZE],
+                task_type="retrieval_query" if task == "query" else "retrieval_document"
+            )['embedding'])
+        return np.asarray(vectors, dtype=np.float32)
+
+
+class OnnxEmbeddings(EmbeddingProvider):
+    """Mean-pooled sentence-transformer (e.g. a quantized all-MiniLM-L6-v2 export) on CPU."""
+    name = "onnx"
+
+    def __init__(self, model_dir: str = ONNX_MODEL_DIR, max_length: int = 256):
+        if not ONNX_AVAILABLE:
+            raise RuntimeError("onnxruntime and tokenizers are required for the onnx embedding provider")
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def embed(self, texts: List[str], task: str = "document") -> np.ndarray:
+        outputs = []
+        for i in range(0, len(texts), BATCH_SIZE):
+            encodings = self.tokenizer.encode_batch(texts[i:i + BATCH_SIZE])
+            ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+            mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feeds)[0]
+            weights = mask[..., None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            outputs.append(_normalize_rows(pooled.astype(np.float32)))
+        return np.vstack(outputs) if outputs else np.zeros((0, 0), dtype=np.float32)
+
+
+class HashingEmbeddings(EmbeddingProvider):
+    """Signed feature hashing of words (weight 1) and character trigrams (weight 0.3)."""
+    name = "hashing"
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+
+    def _features(self, text: str):
+        for token in normalize_query(text).split():
+            yield token, 1.0
+            padded = f"#{token}#"
+            for i in range(len(padded) - 2):
+                yield padded[i:i + 3], 0.3
+
+    def embed(self, texts: List[str], task: str = "document") -> np.ndarray:
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                h = zlib.crc32(feature.encode("utf-8"))
+                matrix[row, h % self.dim] += weight if h & 0x80000000 else -weight
+        return _normalize_rows(matrix)
+
+
+class CachedEmbeddings(EmbeddingProvider):
+    """
+    Wraps a provider with a text-hash keyed cache: an in-memory LRU in front of
+    an optional SQLite table. Only texts never seen before reach the provider.
+    """
+
+    def __init__(self, provider: EmbeddingProvider, db_path: str = EMBEDDING_CACHE_DB,
+                 max_entries: int = EMBEDDING_CACHE_SIZE):
+        self.provider = provider
+        self.name = provider.name
+        self.remote = provider.remote
+        self.max_entries = max_entries
+        self._memory = OrderedDict()   # key -> vector
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._db = None
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+                self._db = sqlite3.connect(db_path, check_same_thread=False)
+                self._db.execute("PRAGMA journal_mode=WAL")
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS embeddings ("
+                    "key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                print(f"⚠️ Embedding cache disk store disabled: {e}")
+                self._db = None
+
+    def _key(self, text: str, task: str) -> str:
+        # Gemini embeds queries and documents differently; local providers don't
+        task = task if self.remote else "any"
+        return f"{self.name}{getattr(self.provider, 'dim', '')}:{task}:" + hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _remember(self, key: str, vector: np.ndarray):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def embed(self, texts: List[str], task: str = "document") -> np.ndarray:
+        keys = [self._key(text, task) for text in texts]
+        vectors = {}
+        with self._lock:
+            for key in keys:
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    vectors[key] = self._memory[key]
+            missing = [k for k in dict.fromkeys(keys) if k not in vectors]
+            if missing and self._db is not None:
+                try:
+                    for i in range(0, len(missing), 500):
+                        batch = missing[i:i + 500]
+                        rows = self._db.execute(
+                            f"SELECT key, vector FROM embeddings WHERE key IN ({','.join('?' * len(batch))})",
+                            batch,
+                        ).fetchall()
+                        for key, blob in rows:
+                            vectors[key] = np.frombuffer(blob, dtype=np.float32)
+                            self._remember(key, vectors[key])
+                except sqlite3.Error:
+                    pass
+
+        todo = OrderedDict((key, text) for key, text in zip(keys, texts) if key not in vectors)
+        self.hits += len(keys) - len(todo)
+        self.misses += len(todo)
+        if todo:
+            computed = self.provider.embed(list(todo.values()), task=task)
+            with self._lock:
+                for key, vector in zip(todo, computed):
+                    vectors[key] = np.asarray(vector, dtype=np.float32)
+                    self._remember(key, vectors[key])
+                if self._db is not None:
+                    try:
+                        self._db.executemany(
+                            "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                            [(key, vectors[key].tobytes()) for key in todo],
+                        )
+                        self._db.commit()
+                    except sqlite3.Error as e:
+                        print(f"⚠️ Embedding cache write failed: {e}")
+
+        return np.vstack([vectors[key] for key in keys]) if keys else np.zeros((0, 0), dtype=np.float32)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._memory),
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+def build_provider(name: str = EMBEDDING_PROVIDER) -> EmbeddingProvider:
+    if name == "auto":
+        if ONNX_AVAILABLE and ONNX_MODEL_DIR:
+            name = "onnx"
+        elif os.getenv("GOOGLE_API_KEY"):
+            name = "gemini"
+        else:
+            name = "hashing"
+    if name == "gemini":
+        return GeminiEmbeddings()
+    if name == "onnx":
+        return OnnxEmbeddings()
+    if name == "hashing":
+        return HashingEmbeddings()
+    raise ValueError(f"Unknown embedding provider: {name}")
+
+
+def collection_name(base: str, provider: EmbeddingProvider) -> str:
+    """Gemini keeps the original collection name; local providers get their own."""
+    return base if provider.name == "gemini" else f"{base}_{provider.name}"
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder() -> CachedEmbeddings:
+    """Process-wide cached embedder for EMBEDDING_PROVIDER (built on first use)."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            _embedder = CachedEmbeddings(build_provider())
+            print(f"🧮 Embedding provider: {_embedder.name}")
+        return _embedder
@@ -0,0 +1,174 @@
+import json
+import os
+import re
+import threading
+import time
+from urllib.parse import urlparse
+from curl_cffi import requests
+from bs4 import BeautifulSoup
+from tools.crawlee_service import scrape_url_dynamic
+from utils.metrics import metrics
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = "lxml"
+except ImportError:
+    HTML_PARSER = "html.parser"
+
+STATIC_TIMEOUT = float(os.getenv("STATIC_FETCH_TIMEOUT", "8"))
+MIN_STATIC_TEXT = int(os.getenv("STATIC_MIN_TEXT_CHARS", "600"))
+ROUTES_PATH = os.getenv("FETCH_ROUTES_PATH", os.path.join("storage", "fetch_routes.json"))
+JS_ROUTE_AFTER = 2               # consecutive JS-only pages before a domain goes straight to the browser
+JS_ROUTE_TTL = 6 * 60 * 60       # re-probe the static tier after this many seconds
+
+# Markers of pages that only render client-side (or are bot walls the browser may get past)
+JS_MARKERS = [
+    "enable javascript", "javascript is disabled", "please turn on javascript",
+    "you need to enable javascript", "robot check", "captcha", "are you a human",
+]
+EMPTY_APP_ROOT = re.compile(r'<div[^>]+id=["\'](root|app|__next)["\'][^>]*>\s*</div>', re.IGNORECASE)
+
+# --- Pooled HTTP sessions (curl_cffi sessions are not thread-safe: one per worker thread) ---
+
+_local = threading.local()
+
+def get_session() -> requests.Session:
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = requests.Session(impersonate="chrome")
+        _local.session = session
+    return session
+
+# --- Extraction ---
+
+def extract_text(html) -> str:
+    """Visible text from an HTML document (scripts, styles and SVG removed)."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    for tag in soup(["script", "style", "noscript", "svg", "template"]):
+        tag.decompose()
+    return soup.get_text("\n")
+
+def needs_javascript(html: str, text: str) -> bool:
+    """Heuristics for pages whose useful content only appears after JS runs."""
+    visible = " ".join(text.split())
+    if len(visible) < MIN_STATIC_TEXT:
+        return True
+    lowered = visible[:3000].lower()
+    if any(marker in lowered for marker in JS_MARKERS):
+        return True
+    if EMPTY_APP_ROOT.search(html):
+        return True
+    # Script-heavy shells: lots of <script> bytes, very little text
+    script_count = html.lower().count("<script")
+    if script_count > 30 and len(visible) < 4 * MIN_STATIC_TEXT:
+        return True
+    return False
+
+# --- Per-domain learned routing ---
+
+class DomainRouter:
+    """Remembers which domains need the browser so we stop probing them statically."""
+
+    def __init__(self, path: str = ROUTES_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._routes = self._load()
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _persist(self):
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = f"{self.path}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self._routes, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"⚠️ Could not persist fetch routes: {e}")
+
+    def prefers_browser(self, domain: str) -> bool:
+        route = self._routes.get(domain)
+        if not route or route.get("mode") != "browser":
+            return False
+        return time.time() - route.get("since", 0) < JS_ROUTE_TTL
+
+    def record(self, domain: str, needed_js: bool):
+        with self._lock:
+            route = self._routes.setdefault(domain, {"mode": "static", "js_streak": 0})
+            previous_mode = route.get("mode")
+            if needed_js:
+                route["js_streak"] = route.get("js_streak", 0) + 1
+                if route["js_streak"] >= JS_ROUTE_AFTER:
+                    route["mode"] = "browser"
+                    route["since"] = time.time()
+            else:
+                route["js_streak"] = 0
+                route["mode"] = "static"
+            if route["mode"] != previous_mode:
+                print(f"🧭 Fetch route for {domain}: {route['mode']}")
+                self._persist()
+
+# Singleton instance
+domain_router = DomainRouter()
+
+# --- Tiered fetch ---
+
+def fetch_static(url: str, validators: dict = None):
+    """Tier 1: impersonated HTTP GET (conditional when validators are given). Returns the response or raises."""
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return get_session().get(url, timeout=STATIC_TIMEOUT, allow_redirects=True, headers=headers or None)
+
+def fetch_page(url: str, validators: dict = None) -> dict:
+    """
+    Fetches a page's visible text, trying static HTTP first and escalating to
+    the headless browser only when the page looks JS-rendered or blocked.
+    With `validators` (etag / last_modified from a cached copy) the static
+    request is conditional and may come back as {"not_modified": True}.
+    Returns {"text", "tier", "url", "etag", "last_modified"}.
+    """
+    domain = urlparse(url).netloc.lower()
+
+    if not domain_router.prefers_browser(domain):
+        try:
+            with metrics.span("fetch_static"):
+                response = fetch_static(url, validators)
+            status = response.status_code
+            if status == 304:
+                return {"not_modified": True, "tier": "static", "url": url}
+            if status < 400:
+                html = response.text
+                text = extract_text(html)
+                needed_js = needs_javascript(html, text)
+                domain_router.record(domain, needed_js)
+                if not needed_js:
+                    return {
+                        "text": text,
+                        "tier": "static",
+                        "url": str(response.url),
+                        "etag": response.headers.get("ETag"),
+                        "last_modified": response.headers.get("Last-Modified"),
+                    }
+            else:
+                print(f"⚠️ Static fetch for {url}: Status {status}, escalating")
+                metrics.record_error("fetch_static", str(status))
+                if status in (403, 429, 503):
+                    # Typical bot walls that a real browser tends to get past
+                    domain_router.record(domain, True)
+        except Exception as e:
+            print(f"⚠️ Static fetch failed for {url}: {e}, escalating")
+            metrics.record_error("fetch_static", type(e).__name__)
+
+    # Tier 2: headless browser
+    with metrics.span("scrape_url_dynamic"):
+        text = scrape_url_dynamic(url)
+    return {"text": text, "tier": "browser", "url": url}
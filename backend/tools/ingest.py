@@ -1,38 +1,253 @@
+"""
+Catalog ingestion: products.csv -> Chroma.
+
+The CSV is streamed in chunks; each chunk's rows are hashed and compared with the
+hashes already stored in Chroma so unchanged products are skipped. Chroma ids come
+from a stable product key (the link, else name + category), so inserting or
+reordering rows doesn't shift them. Changed rows are embedded in batches (several
+batches in flight, under a requests-per-minute limit) and bulk-upserted. Progress
+is checkpointed after every chunk, so an interrupted run resumes where it stopped.
+A completed run deletes products that are no longer in the file:
+
+    python -m tools.ingest products.csv [--restart]
+
+Embeddings come from tools/embeddings (EMBEDDING_PROVIDER); the rate limit only
+applies to the remote Gemini provider.
+"""
+import argparse
+import hashlib
+import json
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import google.generativeai as genai
 import chromadb
-import os
 from dotenv import load_dotenv
 
 load_dotenv()
 genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 
-def ingest_data(csv_path="products.csv"):
-    client = chromadb.PersistentClient(path="./chroma_data")
-    collection = client.get_or_create_collection("hackathon_catalog")
-    
-    df = pd.read_csv(csv_path)
-    print(f"🔄 Ingesting {len(df)} products...")
-
-    for i, row in df.iterrows():
-        # Create a rich description for the vector
-        content = f"Product: {row['Product Name']}. Category: {row['Category']}. Price: {row['Price']}. Description: {row['Description']}"
-        
-        # Embed
-        emb = genai.embed_content(
-            model="models/text-embedding-004",
-            content=content,
-            task_type="retrieval_document"
-        )['embedding']
-
-        # Save
-        collection.add(
-            ids=[str(i)],
-            documents=[content],
-            embeddings=[emb],
-            metadatas=[row.to_dict()]
-        )
-    print("✅ Ingestion Complete!")
+from tools.embeddings import get_embedder, collection_name
+from tools.catalog import INGEST_VERSION_KEY
+
+CHROMA_PATH = "./chroma_data"
+COLLECTION_NAME = "hackathon_catalog"
+CHECKPOINT_PATH = os.getenv("INGEST_CHECKPOINT", os.path.join("storage", "ingest_checkpoint.json"))
+
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "1000"))          # CSV rows read at a time
+EMBED_BATCH = int(os.getenv("INGEST_EMBED_BATCH", "100"))         # texts per embedding request (API max 100)
+EMBED_CONCURRENCY = int(os.getenv("INGEST_CONCURRENCY", "4"))     # embedding requests in flight
+EMBED_RPM = float(os.getenv("INGEST_RPM", "120"))                 # remote embedding requests per minute
+EMBED_RETRIES = 5
+
+PRICE = re.compile(r"\d+(?:\.\d+)?")
+
+
+def row_content(row: dict) -> str:
+    """The text that gets embedded for a product."""
+    return (f"Product: {row.get('Product Name')}. Category: {row.get('Category')}. "
+            f"Price: {row.get('Price')}. Description: {row.get('Description')}")
+
+
+def parse_price(value) -> float:
+    """'₹49,990' / 'Rs. 1,299.00' / 49990 -> 49990.0 (None if there is no number)."""
+    if isinstance(value, (int, float)) and not (isinstance(value, float) and math.isnan(value)):
+        return float(value)
+    match = PRICE.search(str(value or "").replace(",", ""))
+    return float(match.group(0)) if match else None
+
+
+def row_metadata(row: dict, content_hash: str) -> dict:
+    """Chroma only accepts str/int/float/bool metadata values (no None/NaN)."""
+    metadata = {}
+    for key, value in row.items():
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            value = ""
+        elif not isinstance(value, (str, int, float, bool)):
+            value = str(value)
+        metadata[str(key)] = value
+    price = parse_price(row.get("Price"))
+    if price is not None:
+        metadata["price_value"] = price  # numeric, for range filters
+    metadata["content_hash"] = content_hash
+    return metadata
+
+
+def product_id(row: dict) -> str:
+    """Stable id: hash of the product link, else of name + category. Rows sharing a key are one product."""
+    link = next((str(row[k]).strip() for k in ("Link", "URL") if _present(row.get(k))), "")
+    key = link or f"{row.get('Product Name')}|{row.get('Category')}"
+    return "p_" + hashlib.sha1(key.strip().lower().encode("utf-8")).hexdigest()[:20]
+
+
+def _present(value) -> bool:
+    return value is not None and not (isinstance(value, float) and math.isnan(value)) and str(value).strip() != ""
+
+
+def content_hash(content: str, row: dict) -> str:
+    payload = content + json.dumps(row, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class RateLimiter:
+    """Spaces calls so at most `per_minute` start in any minute (shared across threads)."""
+
+    def __init__(self, per_minute: float):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0.0
+        self._next = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def embed_batch(embedder, texts, limiter: RateLimiter):
+    """Embeds up to EMBED_BATCH texts; remote calls are rate limited and retried with exponential backoff."""
+    if not embedder.remote:
+        return embedder.embed(texts).tolist()
+    for attempt in range(EMBED_RETRIES):
+        limiter.wait()
+        try:
+            return embedder.embed(texts).tolist()
+        except Exception as e:
+            if attempt == EMBED_RETRIES - 1:
+                raise
+            delay = 2 ** attempt
+            print(f"⚠️ Embedding batch failed ({e}); retrying in {delay}s")
+            time.sleep(delay)
+
+
+# --- Checkpointing ---
+
+def _csv_signature(csv_path: str) -> dict:
+    stat = os.stat(csv_path)
+    return {"csv": os.path.abspath(csv_path), "size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def load_checkpoint(csv_path: str, path: str = CHECKPOINT_PATH) -> int:
+    """Rows already ingested from this exact file (0 if the file changed or there is no checkpoint)."""
+    try:
+        with open(path) as f:
+            checkpoint = json.load(f)
+    except (OSError, ValueError):
+        return 0
+    signature = _csv_signature(csv_path)
+    if any(checkpoint.get(k) != v for k, v in signature.items()):
+        return 0
+    return int(checkpoint.get("rows_done", 0))
+
+
+def save_checkpoint(csv_path: str, rows_done: int, path: str = CHECKPOINT_PATH):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(dict(_csv_signature(csv_path), rows_done=rows_done), f)
+    os.replace(tmp_path, path)
+
+
+# --- Pipeline ---
+
+def _ingest_chunk(collection, df: pd.DataFrame, embedder, executor, limiter) -> tuple:
+    """Upserts the changed rows of one chunk. Returns (upserted, skipped)."""
+    rows = {}
+    for row in df.to_dict("records"):
+        rows[product_id(row)] = row   # a repeated key within the chunk: the last row wins
+    ids, documents, metadatas = [], [], []
+    for row_id, row in rows.items():
+        content = row_content(row)
+        ids.append(row_id)
+        documents.append(content)
+        metadatas.append(row_metadata(row, content_hash(content, row)))
+
+    # Skip rows whose stored hash already matches
+    existing = collection.get(ids=ids, include=["metadatas"])
+    stored = {
+        row_id: (meta or {}).get("content_hash")
+        for row_id, meta in zip(existing.get("ids", []), existing.get("metadatas") or [])
+    }
+    changed = [i for i, row_id in enumerate(ids) if stored.get(row_id) != metadatas[i]["content_hash"]]
+    if not changed:
+        return 0, len(ids)
+
+    texts = [documents[i] for i in changed]
+    batches = [texts[i:i + EMBED_BATCH] for i in range(0, len(texts), EMBED_BATCH)]
+    embeddings = []
+    for batch_embeddings in executor.map(lambda batch: embed_batch(embedder, batch, limiter), batches):
+        embeddings.extend(batch_embeddings)
+
+    collection.upsert(
+        ids=[ids[i] for i in changed],
+        documents=texts,
+        embeddings=embeddings,
+        metadatas=[metadatas[i] for i in changed],
+    )
+    return len(changed), len(ids) - len(changed)
+
+
+def csv_ids(csv_path: str, chunk_rows: int = CHUNK_ROWS) -> set:
+    """Every product id in the file (a cheap pass: no embedding)."""
+    ids = set()
+    for chunk in pd.read_csv(csv_path, chunksize=chunk_rows):
+        ids.update(product_id(row) for row in chunk.to_dict("records"))
+    return ids
+
+
+def delete_missing(collection, keep: set, batch: int = 5000) -> int:
+    """Deletes products (and pre-key positional ids) that are no longer in the file."""
+    stale = [row_id for row_id in collection.get(include=[])["ids"] if row_id not in keep]
+    for i in range(0, len(stale), batch):
+        collection.delete(ids=stale[i:i + batch])
+    return len(stale)
+
+
+def ingest_data(csv_path="products.csv", restart: bool = False, chunk_rows: int = CHUNK_ROWS,
+                concurrency: int = EMBED_CONCURRENCY, rpm: float = EMBED_RPM):
+    embedder = get_embedder()
+    client = chromadb.PersistentClient(path=CHROMA_PATH)
+    collection = client.get_or_create_collection(collection_name(COLLECTION_NAME, embedder))
+
+    rows_done = 0 if restart else load_checkpoint(csv_path)
+    if rows_done:
+        print(f"↩️ Resuming after {rows_done} rows")
+    print(f"🔄 Ingesting {csv_path} with {embedder.name} embeddings...")
+
+    limiter = RateLimiter(rpm)
+    upserted = skipped = 0
+    started = time.time()
+    reader = pd.read_csv(csv_path, chunksize=chunk_rows, skiprows=range(1, rows_done + 1))
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for chunk in reader:
+            added, unchanged = _ingest_chunk(collection, chunk, embedder, executor, limiter)
+            upserted += added
+            skipped += unchanged
+            save_checkpoint(csv_path, rows_done + upserted + skipped)
+            print(f"   {rows_done + upserted + skipped} rows ({upserted} upserted, {skipped} unchanged)")
+
+    deleted = delete_missing(collection, csv_ids(csv_path, chunk_rows))
+    if upserted or deleted:
+        # Tells running catalog retrievers to reload (a changed row keeps the count the same)
+        collection.modify(metadata={INGEST_VERSION_KEY: f"{time.time():.6f}"})
+    print(f"✅ Ingestion Complete! {upserted} upserted, {skipped} unchanged, {deleted} deleted "
+          f"in {time.time() - started:.1f}s")
+    return {"upserted": upserted, "skipped": skipped, "deleted": deleted}
+
 
 if __name__ == "__main__":
-    ingest_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Ingest the product catalog into Chroma")
+    parser.add_argument("csv_path", nargs="?", default="products.csv")
+    parser.add_argument("--restart", action="store_true", help="ignore the checkpoint and rescan every row")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY)
+    parser.add_argument("--rpm", type=float, default=EMBED_RPM, help="embedding requests per minute")
+    args = parser.parse_args()
+    ingest_data(args.csv_path, restart=args.restart, chunk_rows=args.chunk_rows,
+                concurrency=args.concurrency, rpm=args.rpm)
@@ -0,0 +1,216 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from urllib.parse import urlparse
+from tools.url_utils import canonicalize_url
+from utils.shared_state import shared_state
+
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # compressed bytes
+PAGE_CACHE_DEFAULT_TTL = float(os.getenv("PAGE_CACHE_TTL", "3600"))
+PAGE_SHARED_KEEP = float(os.getenv("PAGE_SHARED_KEEP", "86400"))  # stale shared copies stay this long for revalidation
+
+# Retailer pages change prices often; everything else can live longer
+DOMAIN_TTLS = {
+    "amazon.in": 900,
+    "amazon.com": 900,
+    "flipkart.com": 900,
+    "myntra.com": 1800,
+    "croma.com": 1800,
+    "reliancedigital.in": 1800,
+}
+
+
+def ttl_for(url: str) -> float:
+    host = urlparse(url).netloc.lower()
+    for domain, ttl in DOMAIN_TTLS.items():
+        if host == domain or host.endswith("." + domain):
+            return ttl
+    return PAGE_CACHE_DEFAULT_TTL
+
+
+class PageCache:
+    """
+    In-memory cache of scraped pages keyed by canonical URL.
+
+    Page text is stored zlib-compressed and content-addressed (by SHA-256), so
+    URL variants that serve the same content share one blob. Entries also hold
+    the og:image and the validators (ETag / Last-Modified) needed for cheap
+    conditional revalidation once they go stale. Total compressed size is capped;
+    least recently used entries are evicted first.
+
+    With a shared `state` (STATE_BACKEND=redis), pages one worker scraped are
+    published there and picked up by the others on a local miss.
+    """
+
+    def __init__(self, max_bytes: int = PAGE_CACHE_MAX_BYTES, clock=time.time, state=None):
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.state = state
+        self._entries = OrderedDict()   # canonical url -> metadata dict
+        self._blobs = {}                # sha256 -> [compressed bytes, refcount]
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.evictions = 0
+
+    # --- Blob store ---
+
+    def _put_blob(self, text: str) -> str:
+        digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        blob = self._blobs.get(digest)
+        if blob:
+            blob[1] += 1
+        else:
+            data = zlib.compress(text.encode("utf-8"), 6)
+            self._blobs[digest] = [data, 1]
+            self._bytes += len(data)
+        return digest
+
+    def _drop_blob(self, digest):
+        blob = self._blobs.get(digest) if digest else None
+        if not blob:
+            return
+        blob[1] -= 1
+        if blob[1] <= 0:
+            self._bytes -= len(blob[0])
+            del self._blobs[digest]
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, entry = self._entries.popitem(last=False)
+            self._drop_blob(entry.get("content_hash"))
+            self.evictions += 1
+
+    # --- Shared layer ---
+
+    def _publish(self, key: str):
+        """Copies an entry (metadata + compressed text) to the shared state."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                return
+            blob = self._blobs.get(entry.get("content_hash"))
+            payload = json.dumps(entry).encode("utf-8") + b"\n" + (blob[0] if blob else b"")
+        try:
+            self.state.set(f"page:{key}", payload, ttl=ttl_for(key) + PAGE_SHARED_KEEP)
+        except Exception as e:
+            print(f"⚠️ Shared page cache write failed: {e}")
+
+    def _fetch_shared(self, key: str):
+        """Takes the shared copy of a page if it is newer than the local one."""
+        try:
+            payload = self.state.get(f"page:{key}")
+        except Exception as e:
+            print(f"⚠️ Shared page cache read failed: {e}")
+            return
+        if not payload:
+            return
+        meta, _, data = payload.partition(b"\n")
+        entry = json.loads(meta)
+        with self._lock:
+            current = self._entries.get(key)
+            if current and current["expires_at"] >= entry["expires_at"]:
+                return
+            if current:
+                self._drop_blob(current.get("content_hash"))
+            if data:
+                entry["content_hash"] = self._put_blob(zlib.decompress(data).decode("utf-8"))
+            else:
+                entry.pop("content_hash", None)
+            self._entries[key] = entry
+            self._evict()
+
+    # --- Public API ---
+
+    def lookup(self, url: str):
+        """Returns (entry, is_fresh). entry is None on a miss; stale entries keep their validators."""
+        key = canonicalize_url(url)
+        if self.state is not None:
+            with self._lock:
+                local = self._entries.get(key)
+                fresh = local is not None and local["expires_at"] > self.clock()
+            if not fresh:
+                self._fetch_shared(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if not entry:
+                self.misses += 1
+                return None, False
+            self._entries.move_to_end(key)
+            fresh = entry["expires_at"] > self.clock()
+            if fresh:
+                self.hits += 1
+            else:
+                self.misses += 1
+            return dict(entry), fresh
+
+    def text(self, entry) -> str:
+        """Decompressed page text for an entry returned by lookup()."""
+        digest = entry.get("content_hash") if entry else None
+        with self._lock:
+            blob = self._blobs.get(digest)
+        return zlib.decompress(blob[0]).decode("utf-8") if blob else None
+
+    def store(self, url: str, text: str = None, og_image: str = None, etag: str = None,
+              last_modified: str = None, tier: str = None):
+        """Inserts or updates a page. Fields left as None keep their previous value."""
+        key = canonicalize_url(url)
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.pop(key, None) or {"url": key}
+            if text is not None:
+                new_hash = self._put_blob(text)
+                self._drop_blob(entry.get("content_hash"))
+                entry["content_hash"] = new_hash
+                entry["tier"] = tier
+                entry["etag"] = etag
+                entry["last_modified"] = last_modified
+            if og_image is not None:
+                entry["og_image"] = og_image
+            if text is not None or "expires_at" not in entry:
+                entry["fetched_at"] = now
+                entry["expires_at"] = now + ttl_for(key)
+            self._entries[key] = entry
+            self._evict()
+        if self.state is not None:
+            self._publish(key)
+
+    def refresh(self, url: str):
+        """Marks a stale entry fresh again after a 304 Not Modified."""
+        key = canonicalize_url(url)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry:
+                entry["expires_at"] = self.clock() + ttl_for(key)
+                self.revalidated += 1
+        if entry and self.state is not None:
+            self._publish(key)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "revalidated": self.revalidated,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._blobs.clear()
+            self._bytes = 0
+
+
+# Singleton instance
+page_cache = PageCache(state=shared_state if shared_state.shared else None)
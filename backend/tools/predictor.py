@@ -1,39 +1,258 @@
-import google.generativeai as genai
+"""
+Predictive insights ("since you are buying X, you might need Y soon").
+
+Insights are precomputed per catalog category and served from a JSON-persisted
+store, so a lookup never waits on the LLM:
+
+    python -m tools.predictor --build --csv products.csv   # batch-generate for every category
+    python -m tools.predictor "gaming laptop"               # look one up
+
+Lookups fuzzy-match the category against the store. Unknown or stale categories
+are answered from the fallback table (or the stale insight) and queued for a
+background thread that generates and persists a fresh insight.
+"""
+import argparse
+import difflib
+import json
 import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
+from tools.search_cache import normalize_query
 
 load_dotenv()
-# Ensure API key is set - although it should be set by main.py or vector_db already
-api_key = os.getenv("GOOGLE_API_KEY")
-if api_key:
-    genai.configure(api_key=api_key)
 
-model = genai.GenerativeModel("gemini-2.5-flash-lite")
+INSIGHTS_PATH = os.getenv("INSIGHTS_PATH", os.path.join("storage", "insights.json"))
+INSIGHT_TTL = float(os.getenv("INSIGHT_TTL", str(7 * 24 * 60 * 60)))   # regenerate after a week
+INSIGHT_MODEL = "gemini-2.5-flash-lite"
+FUZZY_CUTOFF = 0.75
+RETRY_AFTER = 10 * 60           # seconds before a failed category is generated again
+MEMO_SIZE = 2048
+
+INSIGHT_PROMPT = """
+Based on the user's interest in {category}, generate a short predictive insight about what they might need in 1-3 months.
+Focus on accessories, maintenance, or complementary items.
+Format: "Prediction: Since you are buying X, you might need Y soon because Z."
+Keep it under 2 sentences.
+"""
+
+FALLBACK_INSIGHTS = {
+    "laptop": "Prediction: You will likely need a USB-C Hub and Screen Cleaner in 2 months.",
+    "shoes": "Prediction: High mileage runners often need replacement insoles after 3 months.",
+    "camera": "Prediction: 4K video fills storage fast. You will need a V90 SD Card soon."
+}
+DEFAULT_INSIGHT = "Prediction: Consider adding a warranty or protection plan for long-term care."
+
+
+def normalize_category(category: str) -> str:
+    """'Gaming Laptops ' -> 'gaming laptop'"""
+    tokens = []
+    for token in normalize_query(category or "").split():
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return " ".join(tokens)
+
+
+def _generate(category: str) -> str:
+    """One live LLM call (offline build and background refresh only)."""
+    from utils.llm_client import llm
+    return llm.generate_sync(INSIGHT_PROMPT.format(category=category), model=INSIGHT_MODEL).text.strip()
 
-def generate_future_insight(current_product_category: str):
+
+class InsightStore:
     """
-    Predicts a future need based on a current purchase.
-    Input: Category of item (e.g., 'Gaming Laptop', 'Puppy Crate').
-    Output: A string advice.
+    category -> insight, memoized in memory and persisted as JSON:
+        {"gaming laptop": {"category": "Gaming Laptops", "insight": "...", "generated_at": 1700000000}}
     """
-    try:
-        response = model.generate_content(
-            f"""
-            Based on the user's interest in {current_product_category}, generate a short predictive insight about what they might need in 1-3 months.
-            Focus on accessories, maintenance, or complementary items.
-            Format: "Prediction: Since you are buying X, you might need Y soon because Z."
-            Keep it under 2 sentences.
-            """
-        )
-        return response.text
-    except Exception as e:
-        # Fallback if AI fails
-        insights = {
-            "laptop": "Prediction: You will likely need a USB-C Hub and Screen Cleaner in 2 months.",
-            "shoes": "Prediction: High mileage runners often need replacement insoles after 3 months.",
-            "camera": "Prediction: 4K video fills storage fast. You will need a V90 SD Card soon."
-        }
-        for key in insights:
-            if key in current_product_category.lower():
-                return insights[key]
-        return "Prediction: Consider adding a warranty or protection plan for long-term care."
\ No newline at end of file
+
+    def __init__(self, path: str = INSIGHTS_PATH, ttl: float = INSIGHT_TTL, generator=_generate,
+                 clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self.generator = generator
+        self.clock = clock
+        self._insights = self._load()
+        self._memo = {}                 # raw category -> matched key (or None)
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._queued = set()
+        self._failed = {}               # key -> time of the last failed generation
+        self._worker = None
+
+    def _load(self) -> dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except Exception:
+            return {}
+
+    def _persist(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._insights, f, indent=1, ensure_ascii=False, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    # --- Lookup ---
+
+    def _match(self, category: str):
+        """Store key for a category: exact, then all-words containment, then closest spelling."""
+        key = normalize_category(category)
+        if not key:
+            return None
+        if key in self._insights:
+            return key
+        words = set(key.split())
+        contained = [k for k in self._insights if set(k.split()) <= words]
+        if contained:
+            return max(contained, key=len)
+        close = difflib.get_close_matches(key, list(self._insights), n=1, cutoff=FUZZY_CUTOFF)
+        return close[0] if close else None
+
+    def lookup(self, category: str):
+        """(insight, fresh) for the best-matching stored category, or (None, False)."""
+        with self._lock:
+            if category in self._memo:
+                key = self._memo[category]
+            else:
+                key = self._match(category)
+                if len(self._memo) >= MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[category] = key
+            entry = self._insights.get(key) if key else None
+        if not entry:
+            return None, False
+        return entry["insight"], self.clock() - entry.get("generated_at", 0) < self.ttl
+
+    def for_products(self, products: list):
+        """
+        Insight for the first product whose category (else name) matches the store.
+        A product's missing or stale category is queued for generation; names never are.
+        With no match, the first category present gets the fallback table's insight.
+        """
+        first_category = None
+        for product in products:
+            if not isinstance(product, dict):
+                continue
+            category = str(product.get("category") or "").strip()
+            insight, fresh = self.lookup(category or str(product.get("name") or ""))
+            if category and not fresh:
+                self.request(category)
+            if insight:
+                return insight
+            first_category = first_category or category
+        return fallback_insight(first_category) if first_category else None
+
+    def put(self, category: str, insight: str, persist: bool = True):
+        key = normalize_category(category)
+        with self._lock:
+            self._insights[key] = {"category": category, "insight": insight, "generated_at": self.clock()}
+            self._memo.clear()
+            if persist:
+                self._persist()
+
+    def categories(self) -> list:
+        with self._lock:
+            return [entry.get("category", key) for key, entry in self._insights.items()]
+
+    # --- Background refresh ---
+
+    def request(self, category: str):
+        """Queues a category for (re)generation on the background thread."""
+        key = normalize_category(category)
+        with self._lock:
+            if not key or key in self._queued:
+                return
+            if self.clock() - self._failed.get(key, float("-inf")) < RETRY_AFTER:
+                return
+            self._queued.add(key)
+            self._queue.put(category)
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run_worker, name="insight-refresh", daemon=True)
+                self._worker.start()
+
+    def _run_worker(self):
+        while True:
+            try:
+                category = self._queue.get(timeout=30)
+            except queue.Empty:
+                with self._lock:
+                    if self._queue.empty():
+                        self._worker = None
+                        return
+                continue
+            try:
+                self.put(category, self.generator(category))
+            except Exception as e:
+                print(f"⚠️ Insight refresh failed for '{category}': {e}")
+                with self._lock:
+                    self._failed[normalize_category(category)] = self.clock()
+            finally:
+                with self._lock:
+                    self._queued.discard(normalize_category(category))
+
+    # --- Offline build ---
+
+    def build(self, categories, workers: int = 4, refresh: bool = False) -> int:
+        """Generates insights for every category that is missing or stale. Returns how many were written."""
+        todo = []
+        for category in dict.fromkeys(c for c in categories if c and str(c).strip()):
+            with self._lock:
+                entry = self._insights.get(normalize_category(category))
+            if refresh or not entry or self.clock() - entry.get("generated_at", 0) >= self.ttl:
+                todo.append(category)
+
+        def generate(category):
+            try:
+                return category, self.generator(category)
+            except Exception as e:
+                print(f"⚠️ Insight generation failed for '{category}': {e}")
+                return category, None
+
+        written = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for category, insight in executor.map(generate, todo):
+                if insight:
+                    self.put(category, insight, persist=False)
+                    written += 1
+        with self._lock:
+            self._persist()
+        return written
+
+
+def fallback_insight(category: str) -> str:
+    lowered = (category or "").lower()
+    for key in FALLBACK_INSIGHTS:
+        if key in lowered:
+            return FALLBACK_INSIGHTS[key]
+    return DEFAULT_INSIGHT
+
+
+# Singleton instance
+insight_store = InsightStore()
+
+
+def catalog_categories(csv_path: str) -> list:
+    import pandas as pd
+    return sorted(pd.read_csv(csv_path, usecols=["Category"])["Category"].dropna().astype(str).str.strip().unique())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precomputed predictive insights")
+    parser.add_argument("--build", action="store_true", help="generate insights for catalog categories")
+    parser.add_argument("--csv", default="products.csv", help="catalog CSV with a Category column")
+    parser.add_argument("--refresh", action="store_true", help="regenerate fresh entries too")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("category", nargs="*", help="look up a category")
+    args = parser.parse_args()
+
+    if args.build:
+        categories = catalog_categories(args.csv) + insight_store.categories()
+        written = insight_store.build(categories, workers=args.workers, refresh=args.refresh)
+        print(f"✅ Wrote {written} insights -> {INSIGHTS_PATH}")
+    if args.category:
+        category = " ".join(args.category)
+        print(insight_store.lookup(category)[0] or fallback_insight(category))
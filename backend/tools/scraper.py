@@ -1,14 +1,31 @@
-from tools.crawlee_service import scrape_url_dynamic
-from curl_cffi import requests
+from tools.fetcher import fetch_page, get_session
+from tools.page_cache import page_cache
 from bs4 import BeautifulSoup
 
 def scrape_url(url: str):
     """
-    Scrapes the text content from a given URL using Crawlee (Playwright) for JS support.
+    Scrapes the text content from a given URL.
+    Static HTTP first; escalates to the shared Playwright browser pool for JS-only pages.
     """
     try:
-        print(f"🕷️ Scraping with Crawlee: {url}")
-        content = scrape_url_dynamic(url)
+        # Serve hot pages from the page cache; revalidate stale ones with their validators
+        cached, fresh = page_cache.lookup(url)
+        cached_text = page_cache.text(cached) if cached else None
+        if fresh and cached_text is not None:
+            print(f"⚡ Page cache hit: {url}")
+            return cached_text
+
+        validators = cached if cached_text is not None else None
+        page = fetch_page(url, validators=validators)
+        if page.get("not_modified"):
+            print(f"⚡ Page not modified, cache revalidated: {url}")
+            page_cache.refresh(url)
+            return cached_text
+
+        print(f"🕷️ Scraped ({page['tier']}): {url}")
+        content = page["text"]
+        if content.startswith("Error"):
+            return content
         
         # Post-processing to clean up whitespace
         lines = (line.strip() for line in content.splitlines())
@@ -16,7 +33,15 @@ def scrape_url(url: str):
         clean_text = '\n'.join(chunk for chunk in chunks if chunk)
         
         # Limit length
-        return clean_text[:15000] + ("..." if len(clean_text) > 15000 else "")
+        clean_text = clean_text[:15000] + ("..." if len(clean_text) > 15000 else "")
+        page_cache.store(
+            url,
+            text=clean_text,
+            etag=page.get("etag"),
+            last_modified=page.get("last_modified"),
+            tier=page["tier"],
+        )
+        return clean_text
 
     except Exception as e:
         return f"Error scraping URL: {str(e)}"
@@ -26,9 +51,18 @@ def fetch_meta_image(url: str) -> str | None:
     Fetches the Open Graph image (og:image) from a given URL.
     Returns None if no image is found or an error occurs.
     """
+    cached, _ = page_cache.lookup(url)
+    if cached and cached.get("og_image"):
+        return cached["og_image"]
+
+    image = _fetch_meta_image(url)
+    if image:
+        page_cache.store(url, og_image=image)
+    return image
+
+def _fetch_meta_image(url: str) -> str | None:
     try:
-        session = requests.Session(impersonate="chrome")
-        response = session.get(url, timeout=10, allow_redirects=True)
+        response = get_session().get(url, timeout=10, allow_redirects=True)
         
         # Warn but proceed on non-200
         if response.status_code != 200:
@@ -0,0 +1,222 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from utils.shared_state import shared_state
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "1800"))      # seconds
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "512"))       # in-memory entries
+SEARCH_CACHE_DB = os.getenv("SEARCH_CACHE_DB", os.path.join("storage", "search_cache.db"))  # "" disables disk
+DISK_MAX_ENTRIES = 20000
+DISK_EVICT_EVERY = 100      # disk writes between evictions of expired/overflow rows
+
+def normalize_query(query: str) -> str:
+    """'  iPhone 15 Price, India? ' -> 'iphone 15 price india'"""
+    query = re.sub(r"[^\w\s₹.-]", " ", query.lower())
+    return " ".join(query.split())
+
+
+class SearchCache:
+    """
+    TTL + LRU cache for search results with an optional SQLite backing store
+    and, with a shared `state` (STATE_BACKEND=redis), a layer every worker sees.
+
+    Concurrent lookups for the same key are coalesced: the first caller runs
+    the upstream search, the others wait for its result. SQLite is only touched
+    under its own lock, never while holding the in-memory one.
+    """
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, max_entries: int = SEARCH_CACHE_SIZE,
+                 db_path: str = SEARCH_CACHE_DB, clock=time.time, state=None):
+        self.ttl = ttl
+        self.state = state
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    # --- Disk layer ---
+
+    def _open_db(self, db_path: str):
+        try:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS search_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS search_cache_expires ON search_cache (expires_at)")
+            self._db.execute("DELETE FROM search_cache WHERE expires_at < ?", (self.clock(),))
+            self._db.commit()
+        except sqlite3.Error as e:
+            print(f"⚠️ Search cache disk store disabled: {e}")
+            self._db = None
+
+    def _disk_get(self, key: str):
+        with self._db_lock:
+            row = self._db.execute(
+                "SELECT value, expires_at FROM search_cache WHERE key = ?", (key,)
+            ).fetchone()
+        if row and row[1] > self.clock():
+            return row
+        return None
+
+    def _disk_set(self, key: str, value: str, expires_at: float):
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO search_cache (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % DISK_EVICT_EVERY == 0:
+                # Keep the table bounded: drop expired rows, then the soonest-to-expire overflow
+                self._db.execute("DELETE FROM search_cache WHERE expires_at < ?", (self.clock(),))
+                self._db.execute(
+                    "DELETE FROM search_cache WHERE key IN (SELECT key FROM search_cache "
+                    "ORDER BY expires_at DESC LIMIT -1 OFFSET ?)",
+                    (DISK_MAX_ENTRIES,),
+                )
+            self._db.commit()
+
+    # --- Memory layer ---
+
+    def _remember(self, key: str, value: str, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def get(self, key: str):
+        """Returns the cached value or None. Counts a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > self.clock():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                del self._entries[key]
+
+        if self._db is not None:
+            try:
+                row = self._disk_get(key)
+            except sqlite3.Error:
+                row = None
+            if row:
+                with self._lock:
+                    self._remember(key, row[0], row[1])
+                    self.hits += 1
+                return row[0]
+
+        if self.state is None:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        # Shared layer: a network round trip, so outside the lock
+        shared = self._shared_get(key)
+        with self._lock:
+            if shared:
+                self._remember(key, shared["value"], shared["expires_at"])
+                self.hits += 1
+                return shared["value"]
+            self.misses += 1
+            return None
+
+    def _shared_get(self, key: str):
+        try:
+            raw = self.state.get(f"search:{key}")
+        except Exception as e:
+            print(f"⚠️ Shared search cache read failed: {e}")
+            return None
+        entry = json.loads(raw) if raw else None
+        return entry if entry and entry["expires_at"] > self.clock() else None
+
+    def set(self, key: str, value: str):
+        expires_at = self.clock() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires_at)
+        if self._db is not None:
+            try:
+                self._disk_set(key, value, expires_at)
+            except sqlite3.Error as e:
+                print(f"⚠️ Search cache write failed: {e}")
+        if self.state is not None:
+            try:
+                self.state.set(f"search:{key}", json.dumps({"value": value, "expires_at": expires_at}), ttl=self.ttl)
+            except Exception as e:
+                print(f"⚠️ Shared search cache write failed: {e}")
+
+    def get_or_compute(self, key: str, compute, should_cache=lambda value: True):
+        """
+        Cached value for `key`, or the result of `compute()`.
+        Only one `compute()` runs per key at a time; concurrent callers share it.
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return future.result()
+
+        try:
+            value = compute()
+            if should_cache(value):
+                self.set(key, value)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self._db is not None:
+            with self._db_lock:
+                self._db.execute("DELETE FROM search_cache")
+                self._db.commit()
+
+
+# Singleton instance
+search_cache = SearchCache(state=shared_state if shared_state.shared else None)
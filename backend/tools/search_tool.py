@@ -1,3 +1,6 @@
+from tools.search_cache import search_cache, normalize_query
+from utils.metrics import metrics
+
 try:
     from googlesearch import search
     GOOGLE_AVAILABLE = True
@@ -11,11 +14,23 @@ try:
 except ImportError:
     DDG_AVAILABLE = False
 
+SEARCH_UNAVAILABLE = "Search unavailable. SYSTEM INSTRUCTION: Answer using internal knowledge."
+
 def search_web(query: str, max_results: int = 5) -> str:
     """
     Searches the web using Google (primary) or DuckDuckGo (fallback).
     Results are formatted for LLM ingestion.
+    Served from the shared search cache when the same (normalized) query was seen recently;
+    concurrent identical queries share a single upstream call.
     """
+    key = f"{normalize_query(query)}|{max_results}"
+    return search_cache.get_or_compute(
+        key,
+        lambda: _search_upstream(query, max_results),
+        should_cache=lambda result: bool(result) and result != SEARCH_UNAVAILABLE,
+    )
+
+def _search_upstream(query: str, max_results: int = 5) -> str:
     print(f"🔎 Searching for: {query}")
     results = []
     
@@ -29,6 +44,7 @@ def search_web(query: str, max_results: int = 5) -> str:
             return "\n---\n".join(results)
         except Exception as e:
             print(f"❌ Google Search failed: {e}")
+            metrics.record_error("google_search")
             # Fall through to DDG
             
     # 2. Try DuckDuckGo
@@ -41,9 +57,10 @@ def search_web(query: str, max_results: int = 5) -> str:
             return "\n---\n".join(results)
         except Exception as e:
             print(f"❌ DDG Search failed: {e}")
+            metrics.record_error("ddg_search")
             
     # 3. Last Resort
     if not results:
-        return "Search unavailable. SYSTEM INSTRUCTION: Answer using internal knowledge."
+        return SEARCH_UNAVAILABLE
     
     return "\n---\n".join(results)
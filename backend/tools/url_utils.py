@@ -0,0 +1,75 @@
+import re
+from urllib.parse import urlparse, urlunparse, parse_qsl, urlencode
+
+# Query params that only track the click and never change the page content, on any site
+TRACKING_PARAMS = {
+    "gclid", "gbraid", "wbraid", "fbclid", "msclkid", "dclid", "yclid", "srsltid", "mc_cid", "mc_eid",
+}
+TRACKING_PREFIXES = ("utm_",)
+
+# Retailer-specific trackers. Names like "tag", "ref" or "keywords" select content
+# elsewhere (?tag=gpu, ?keywords=laptop), so they are only dropped on these hosts.
+AMAZON_HOST = re.compile(r"(^|\.)amazon\.[a-z.]+$")
+RETAILER_TRACKING = [
+    (AMAZON_HOST, {
+        "_encoding", "psc", "ref", "ref_", "tag", "linkcode", "linkid", "camp", "creative", "creativeasin",
+        "qid", "sr", "crid", "sprefix", "keywords", "th", "smid", "spla",
+    }, ("pf_rd_", "pd_rd_", "ascsubtag")),
+    (re.compile(r"(^|\.)flipkart\.com$"), {
+        "otracker", "otracker1", "lid", "marketplace", "fm", "iid", "ppt", "ppn", "ssid", "affid",
+    }, ()),
+]
+
+AMAZON_ASIN = re.compile(r"/(?:dp|gp/product|gp/aw/d)/([A-Z0-9]{10})", re.IGNORECASE)
+LINK_PATTERN = re.compile(r"https?://[^\s<>\"')\]]+")
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalizes a product URL so the same page always maps to the same key:
+    lowercase host without 'www.', no fragment, no tracking params (generic ones
+    everywhere, retailer ones only on that retailer), sorted query, and Amazon
+    product pages collapsed to /dp/<ASIN>.
+    """
+    try:
+        parts = urlparse(url.strip())
+    except ValueError:
+        return url
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+
+    path = parts.path or "/"
+    if AMAZON_HOST.search(host):
+        asin = AMAZON_ASIN.search(path)
+        if asin:
+            return f"https://{host}/dp/{asin.group(1).upper()}"
+        path = re.sub(r"/ref=[^/]*$", "", path)
+    if len(path) > 1:
+        path = path.rstrip("/")
+
+    names, prefixes = set(TRACKING_PARAMS), TRACKING_PREFIXES
+    for pattern, retailer_names, retailer_prefixes in RETAILER_TRACKING:
+        if pattern.search(host):
+            names |= retailer_names
+            prefixes += retailer_prefixes
+    query = [
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if k.lower() not in names and not k.lower().startswith(prefixes)
+    ]
+    scheme = parts.scheme.lower() if parts.scheme in ("http", "https") else "https"
+    return urlunparse((scheme, host, path, "", urlencode(sorted(query)), ""))
+
+def extract_links(text: str, limit: int = 5) -> list:
+    """First `limit` distinct (by canonical URL) links found in formatted search results."""
+    links = []
+    seen = set()
+    for match in LINK_PATTERN.finditer(text or ""):
+        url = match.group(0).rstrip(".,;:")
+        key = canonicalize_url(url)
+        if key in seen:
+            continue
+        seen.add(key)
+        links.append(url)
+        if len(links) >= limit:
+            break
+    return links
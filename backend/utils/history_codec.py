@@ -0,0 +1,110 @@
+"""
+Compact, version-stable serialization for Gemini chat history.
+
+Each message becomes a small JSON document:
+    {"v": 1, "role": "user", "parts": [{"text": "..."}, {"inline_data": {"mime_type": ..., "data": <base64>}}]}
+
+Unlike pickle, the format does not depend on the installed google-generativeai
+version and one message can be appended to storage without touching the rest.
+"""
+import base64
+import json
+import zlib
+from typing import Any, Dict, List
+
+CODEC_VERSION = 1
+
+
+def _to_plain(value):
+    """Proto-plus / MapComposite values -> plain JSON types."""
+    if hasattr(type(value), "to_dict"):
+        return type(value).to_dict(value)
+    if hasattr(value, "items"):
+        return {k: _to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)) or (hasattr(value, "__iter__") and not isinstance(value, (str, bytes))):
+        return [_to_plain(v) for v in value]
+    return value
+
+
+def field_value(obj, name):
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def _encode_part(part) -> Dict[str, Any]:
+    if isinstance(part, str):
+        return {"text": part}
+
+    text = field_value(part, "text")
+    if text:
+        return {"text": text}
+
+    inline = field_value(part, "inline_data")
+    data = field_value(inline, "data") if inline else None
+    if data:
+        return {"inline_data": {
+            "mime_type": field_value(inline, "mime_type"),
+            "data": base64.b64encode(data).decode("ascii") if isinstance(data, bytes) else data,
+        }}
+
+    call = field_value(part, "function_call")
+    if call and field_value(call, "name"):
+        return {"function_call": {
+            "name": field_value(call, "name"),
+            "args": _to_plain(field_value(call, "args") or {}),
+        }}
+
+    response = field_value(part, "function_response")
+    if response and field_value(response, "name"):
+        return {"function_response": {
+            "name": field_value(response, "name"),
+            "response": _to_plain(field_value(response, "response") or {}),
+        }}
+
+    return {"text": ""}
+
+
+def encode_message(message) -> Dict[str, Any]:
+    """Content proto (or {'role', 'parts'} dict) -> JSON-able dict."""
+    role = field_value(message, "role") or "user"
+    parts = field_value(message, "parts") or []
+    return {"v": CODEC_VERSION, "role": role, "parts": [_encode_part(p) for p in parts]}
+
+
+def build_content(role: str, parts: List[Dict[str, Any]]):
+    """Rebuilds a genai Content proto from decoded parts."""
+    from google.generativeai import protos
+
+    proto_parts = []
+    for part in parts:
+        if "inline_data" in part:
+            blob = part["inline_data"]
+            proto_parts.append(protos.Part(inline_data=protos.Blob(
+                mime_type=blob.get("mime_type"), data=base64.b64decode(blob.get("data") or ""))))
+        elif "function_call" in part:
+            proto_parts.append(protos.Part(function_call=protos.FunctionCall(**part["function_call"])))
+        elif "function_response" in part:
+            proto_parts.append(protos.Part(function_response=protos.FunctionResponse(**part["function_response"])))
+        else:
+            proto_parts.append(protos.Part(text=part.get("text", "")))
+    return protos.Content(role=role, parts=proto_parts)
+
+
+def decode_message(doc: Dict[str, Any]):
+    return build_content(doc.get("role", "user"), doc.get("parts", []))
+
+
+def dumps_message(message) -> str:
+    return json.dumps(encode_message(message), ensure_ascii=False, separators=(",", ":"))
+
+
+def loads_message(payload: str):
+    return decode_message(json.loads(payload))
+
+
+def compress_docs(docs: List[Dict[str, Any]]) -> bytes:
+    """Encoded messages -> compressed JSON blob (used for compacted snapshots)."""
+    return zlib.compress(json.dumps(docs, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def decompress_docs(blob: bytes) -> List[Dict[str, Any]]:
+    return json.loads(zlib.decompress(blob).decode("utf-8")) if blob else []
@@ -0,0 +1,330 @@
+"""
+Shared Gemini client: every model call in the backend goes through `llm`.
+
+- One `genai.configure` per process and a cache of GenerativeModel objects
+  (so the underlying transport is reused across requests).
+- Per-call timeouts, a token bucket (LLM_RPS / LLM_BURST) shared by all callers,
+  and retries with full-jitter exponential backoff on 429 / 5xx / timeouts.
+- With a shared state backend (STATE_BACKEND=redis), LLM_CLUSTER_RPS also caps
+  calls per second across every worker, since they all spend one API quota.
+- Optional hedging for stateless calls: if the first attempt hasn't answered after
+  LLM_HEDGE_AFTER seconds a second one is sent and the first answer wins.
+- A circuit breaker: after BREAKER_FAILURES consecutive failures calls fail fast
+  with LLMUnavailable for BREAKER_COOLDOWN seconds, then one probe is let through.
+  Callers catch LLMUnavailable and take their fallback path.
+
+Chat sends are never hedged (a ChatSession is stateful) and streamed sends are
+only retried before the stream starts.
+"""
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Optional
+import google.generativeai as genai
+from utils.metrics import metrics
+from utils.shared_state import shared_state
+
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "45"))               # seconds per attempt (until the stream starts)
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", "2"))                  # extra attempts on retryable errors
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))    # seconds; doubles per attempt, full jitter
+LLM_BACKOFF_MAX = 8.0
+LLM_RPS = float(os.getenv("LLM_RPS", "10"))                       # sustained calls/second per process, 0 = unlimited
+LLM_BURST = int(os.getenv("LLM_BURST", "20"))
+LLM_CLUSTER_RPS = int(os.getenv("LLM_CLUSTER_RPS", "0"))          # calls/second across all workers, 0 = off
+LLM_HEDGE_AFTER = float(os.getenv("LLM_HEDGE_AFTER", "0"))        # seconds, 0 disables hedging
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+
+class LLMUnavailable(Exception):
+    """The circuit is open or every attempt failed; use the fallback path."""
+
+
+def is_retryable(error: Exception) -> bool:
+    """google.api_core errors carry the HTTP status in `.code`; timeouts are retryable too."""
+    if isinstance(error, (asyncio.TimeoutError, TimeoutError, ConnectionError)):
+        return True
+    code = getattr(error, "code", None)
+    code = code() if callable(code) else code
+    return isinstance(code, int) and code in RETRYABLE_CODES
+
+
+def backoff(attempt: int, base: float = LLM_BACKOFF_BASE, cap: float = LLM_BACKOFF_MAX) -> float:
+    """Full jitter: uniform in [0, min(cap, base * 2^attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """`rate` tokens/second up to `burst`. Thread-safe; reserve() says how long to wait."""
+
+    def __init__(self, rate: float = LLM_RPS, burst: int = LLM_BURST, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Takes a token (possibly going into debt) and returns the seconds to wait before using it."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = self.clock()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class CircuitBreaker:
+    """closed -> open after `failures` consecutive failures -> half-open after `cooldown` (one probe)."""
+
+    def __init__(self, failures: int = BREAKER_FAILURES, cooldown: float = BREAKER_COOLDOWN, clock=time.monotonic):
+        self.failures = failures
+        self.cooldown = cooldown
+        self.clock = clock
+        self.consecutive = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive += 1
+            if self.probing or self.consecutive >= self.failures:
+                if self.opened_at is None:
+                    metrics.event("llm_breaker_open")
+                self.opened_at = self.clock()
+            self.probing = False
+
+
+class LLMClient:
+    def __init__(self, api_key: str = None, timeout: float = LLM_TIMEOUT, retries: int = LLM_RETRIES,
+                 hedge_after: float = LLM_HEDGE_AFTER, bucket: TokenBucket = None, breaker: CircuitBreaker = None,
+                 state=None, cluster_rps: int = LLM_CLUSTER_RPS):
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.hedge_after = hedge_after
+        self.bucket = bucket or TokenBucket()
+        self.breaker = breaker or CircuitBreaker()
+        self.state = state
+        self.cluster_rps = cluster_rps
+        self._configured = False
+        self._models = {}
+        self._lock = threading.Lock()
+        self.counters = {"calls": 0, "retries": 0, "failures": 0, "timeouts": 0,
+                         "hedges": 0, "hedge_wins": 0, "rejected": 0, "throttled": 0}
+
+    # --- Setup ---
+
+    def configure(self):
+        with self._lock:
+            if self._configured:
+                return
+            api_key = self.api_key or os.getenv("GOOGLE_API_KEY")
+            if not api_key:
+                print("❌ Error: GOOGLE_API_KEY not found")
+            genai.configure(api_key=api_key)
+            self._configured = True
+
+    def model(self, name: str, system_instruction: str = None, tools=None):
+        """Shared GenerativeModel per (name, instruction, tools)."""
+        self.configure()
+        key = (name, system_instruction, tuple(id(tool) for tool in tools) if tools else None)
+        with self._lock:
+            model = self._models.get(key)
+            if model is None:
+                kwargs = {"model_name": name}
+                if system_instruction:
+                    kwargs["system_instruction"] = system_instruction
+                if tools is not None:
+                    kwargs["tools"] = tools
+                model = genai.GenerativeModel(**kwargs)
+                self._models[key] = model
+            return model
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        state = self.breaker.state
+        return dict(counters, breaker=state, breaker_open=int(state != "closed"))
+
+    # --- Attempt loop ---
+
+    def _admit(self):
+        if not self.breaker.allow():
+            self._count("rejected")
+            raise LLMUnavailable("LLM circuit open")
+
+    def _settle(self, error: Optional[Exception]):
+        if error is not None:
+            self._count("failures")
+            metrics.record_error("gemini", type(error).__name__)
+        # Only overload/outage errors count against the breaker; a 400 still means the API is up
+        if error is not None and is_retryable(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _cluster_delay(self) -> float:
+        """Seconds until the cluster-wide window has room; 0 when this call may go (blocking)."""
+        if self.state is None or self.cluster_rps <= 0:
+            return 0.0
+        try:
+            allowed, retry_after = self.state.hit("llm", self.cluster_rps, 1.0)
+        except Exception as e:
+            print(f"⚠️ Cluster LLM limit unavailable, using the local bucket only: {e}")
+            return 0.0
+        return 0.0 if allowed else max(retry_after, 0.01)
+
+    async def _throttle(self):
+        wait = self.bucket.reserve()
+        if wait:
+            self._count("throttled")
+            await asyncio.sleep(wait)
+        while True:
+            wait = await asyncio.to_thread(self._cluster_delay) if self.cluster_rps > 0 and self.state else 0.0
+            if not wait:
+                return
+            self._count("throttled")
+            await asyncio.sleep(wait)
+
+    async def _attempt(self, make_call, timeout: float):
+        await self._throttle()
+        self._count("calls")
+        try:
+            return await asyncio.wait_for(make_call(), timeout)
+        except asyncio.TimeoutError:
+            self._count("timeouts")
+            raise
+
+    async def _hedged(self, make_call, timeout: float):
+        """First attempt, plus a duplicate once hedge_after passes without an answer."""
+        first = asyncio.create_task(self._attempt(make_call, timeout))
+        done, _ = await asyncio.wait({first}, timeout=self.hedge_after)
+        if done:
+            return first.result()
+        self._count("hedges")
+        second = asyncio.create_task(self._attempt(make_call, timeout))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._count("hedge_wins")
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _call(self, make_call, timeout: float = None, hedge: bool = False):
+        timeout = timeout or self.timeout
+        last_error = None
+        for attempt in range(self.retries + 1):
+            self._admit()
+            try:
+                if hedge and self.hedge_after > 0:
+                    result = await self._hedged(make_call, timeout)
+                else:
+                    result = await self._attempt(make_call, timeout)
+            except Exception as e:
+                self._settle(e)
+                last_error = e
+                if not is_retryable(e) or attempt == self.retries:
+                    break
+                self._count("retries")
+                await asyncio.sleep(backoff(attempt))
+                continue
+            self._settle(None)
+            return result
+        if is_retryable(last_error):
+            raise LLMUnavailable(f"LLM call failed: {last_error!r}") from last_error
+        raise last_error
+
+    # --- Public API ---
+
+    async def generate(self, prompt, model: str, system_instruction: str = None,
+                       timeout: float = None, hedge: bool = True, **kwargs):
+        """Stateless generate_content_async (router, summaries, JSON repair): retried and optionally hedged."""
+        target = self.model(model, system_instruction)
+        return await self._call(lambda: target.generate_content_async(prompt, **kwargs), timeout, hedge)
+
+    async def send(self, chat, content, stream: bool = False, timeout: float = None, **kwargs):
+        """ChatSession.send_message_async with timeout/retries; history only grows on success."""
+        if stream:
+            kwargs["stream"] = True
+        return await self._call(lambda: chat.send_message_async(content, **kwargs), timeout)
+
+    def generate_sync(self, prompt, model: str, timeout: float = None, **kwargs):
+        """Blocking generate_content for worker threads and scripts (no hedging)."""
+        target = self.model(model)
+        timeout = timeout or self.timeout
+        last_error = None
+        for attempt in range(self.retries + 1):
+            self._admit()
+            wait = self.bucket.reserve()
+            if wait:
+                self._count("throttled")
+                time.sleep(wait)
+            wait = self._cluster_delay()
+            while wait:
+                self._count("throttled")
+                time.sleep(wait)
+                wait = self._cluster_delay()
+            self._count("calls")
+            try:
+                result = target.generate_content(prompt, request_options={"timeout": timeout}, **kwargs)
+            except Exception as e:
+                self._settle(e)
+                last_error = e
+                if not is_retryable(e) or attempt == self.retries:
+                    break
+                self._count("retries")
+                time.sleep(backoff(attempt))
+                continue
+            self._settle(None)
+            return result
+        if is_retryable(last_error):
+            raise LLMUnavailable(f"LLM call failed: {last_error!r}") from last_error
+        raise last_error
+
+
+# Singleton instance
+llm = LLMClient(state=shared_state if shared_state.shared else None)
@@ -0,0 +1,325 @@
+"""
+Per-stage tracing and Prometheus metrics (stdlib only).
+
+- `trace(endpoint, session_id)` opens a trace for one request; `span(stage)` times a
+  stage inside it (or on its own when no trace is active). Spans started in worker
+  threads via asyncio.to_thread attach to the caller's trace, since to_thread copies
+  the context.
+- Every span feeds the `contextiq_stage_duration_seconds` histogram; every trace
+  feeds `contextiq_request_duration_seconds`.
+- `record_error(upstream)` counts failures of external dependencies.
+- Cache stats() providers registered with `register_cache` are exported as
+  hit/miss counters and a hit-ratio gauge.
+- Other stats() providers registered with `register_stats` (LLM client, admission
+  pools) are exported as one gauge per numeric field.
+- Traces slower than TRACE_SLOW_MS are sampled (TRACE_SAMPLE_RATE) to TRACE_LOG as JSON lines,
+  written by a background thread (never on the request path) and rotated to TRACE_LOG.1
+  past TRACE_LOG_MAX_BYTES.
+
+`metrics.render()` produces the Prometheus text exposition served at /metrics.
+"""
+import bisect
+import contextvars
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+TRACE_SLOW_MS = float(os.getenv("TRACE_SLOW_MS", "8000"))       # requests slower than this are trace candidates
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1"))  # share of slow requests written to the log
+TRACE_LOG = os.getenv("TRACE_LOG", os.path.join("storage", "slow_traces.jsonl"))  # "" disables the log
+TRACE_LOG_MAX_BYTES = int(os.getenv("TRACE_LOG_MAX_BYTES", str(10 * 1024 * 1024)))  # rotate to .1 past this
+TRACE_QUEUE_SIZE = 1000         # slow traces waiting for the writer; more are dropped
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by label tuples."""
+
+    def __init__(self, name: str, help_text: str, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        self._series = {}   # labels -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.setdefault(key, [0] * (len(self.buckets) + 2))
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for key, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(key + (('le', bound),))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(key)} {round(values[-1], 6)}")
+            lines.append(f"{self.name}_count{_labels(key)} {cumulative}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help = help_text
+        self._values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def value(self, **labels) -> float:
+        with self._lock:
+            return self._values.get(tuple(sorted(labels.items())), 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(key)} {value:g}")
+        return lines
+
+
+class Trace:
+    """Spans of one request. Appended to from the event loop and worker threads."""
+
+    def __init__(self, endpoint: str, request_id: str = None, session_id: str = None, clock=time.perf_counter):
+        self.endpoint = endpoint
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.session_id = session_id
+        self.clock = clock
+        self.started = clock()
+        self.spans = []
+        self.attrs = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, start: float, seconds: float, status: str, attrs: dict):
+        span = {"stage": stage, "start_ms": round((start - self.started) * 1000, 2),
+                "duration_ms": round(seconds * 1000, 2), "status": status}
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+
+    def to_dict(self, seconds: float, status: str) -> dict:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s["start_ms"])
+        return {
+            "request_id": self.request_id,
+            "session_id": self.session_id,
+            "endpoint": self.endpoint,
+            "status": status,
+            "duration_ms": round(seconds * 1000, 2),
+            "timestamp": time.time(),
+            "attrs": self.attrs,
+            "spans": spans,
+        }
+
+
+_current_trace = contextvars.ContextVar("contextiq_trace", default=None)
+
+
+class Metrics:
+    def __init__(self, slow_ms: float = TRACE_SLOW_MS, sample_rate: float = TRACE_SAMPLE_RATE,
+                 trace_log: str = TRACE_LOG, clock=time.perf_counter, max_bytes: int = TRACE_LOG_MAX_BYTES):
+        self.slow_ms = slow_ms
+        self.sample_rate = sample_rate
+        self.trace_log = trace_log
+        self.max_bytes = max_bytes
+        self.clock = clock
+        self.stage_seconds = Histogram("contextiq_stage_duration_seconds", "Duration of one pipeline stage.")
+        self.request_seconds = Histogram("contextiq_request_duration_seconds", "End-to-end request duration.")
+        self.stage_errors = Counter("contextiq_stage_errors_total", "Stages that raised.")
+        self.upstream_errors = Counter("contextiq_upstream_errors_total", "Failed calls to external services.")
+        self.events = Counter("contextiq_events_total", "Notable pipeline events (routing, cache outcomes, ...).")
+        self.slow_traces = Counter("contextiq_slow_traces_total", "Requests slower than TRACE_SLOW_MS.")
+        self._caches = {}   # name -> stats() callable
+        self._stats = {}    # component -> stats() callable
+        self.dropped_traces = Counter("contextiq_dropped_traces_total", "Slow traces dropped (writer queue full).")
+        self._log_lock = threading.Lock()
+        self._trace_queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+        self._writer = None
+
+    # --- Tracing ---
+
+    @staticmethod
+    def current() -> Optional[Trace]:
+        return _current_trace.get()
+
+    def set_session(self, session_id: str):
+        current = _current_trace.get()
+        if current is not None:
+            current.session_id = session_id
+
+    def annotate(self, **attrs):
+        """Adds request-level attributes (e.g. intent) to the active trace."""
+        current = _current_trace.get()
+        if current is not None:
+            current.attrs.update(attrs)
+
+    @contextmanager
+    def trace(self, endpoint: str, session_id: str = None, request_id: str = None):
+        current = Trace(endpoint, request_id, session_id, clock=self.clock)
+        token = _current_trace.set(current)
+        status = "ok"
+        try:
+            yield current
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            _current_trace.reset(token)
+            seconds = self.clock() - current.started
+            self.request_seconds.observe(seconds, endpoint=endpoint, status=status)
+            if seconds * 1000 >= self.slow_ms:
+                self.slow_traces.inc(endpoint=endpoint)
+                if self.trace_log and random.random() < self.sample_rate:
+                    self._write_trace(current.to_dict(seconds, status))
+
+    @contextmanager
+    def span(self, stage: str, **attrs):
+        """Times a stage; works with or without an active trace."""
+        started = self.clock()
+        status = "ok"
+        try:
+            yield
+        except BaseException:
+            status = "error"
+            self.stage_errors.inc(stage=stage)
+            raise
+        finally:
+            seconds = self.clock() - started
+            self.stage_seconds.observe(seconds, stage=stage)
+            current = _current_trace.get()
+            if current is not None:
+                current.add(stage, started, seconds, status, attrs)
+
+    def timed(self, stage: str, fn: Callable) -> Callable:
+        """`fn` wrapped in a span; handy for functions handed to worker threads."""
+        def wrapper(*args, **kwargs):
+            with self.span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+
+    def _write_trace(self, record: dict):
+        """Queues a slow trace for the writer thread (started on first use)."""
+        try:
+            self._trace_queue.put_nowait(record)
+        except queue.Full:
+            self.dropped_traces.inc()
+            return
+        with self._log_lock:
+            if self._writer is None or not self._writer.is_alive():
+                self._writer = threading.Thread(target=self._run_writer, name="trace-writer", daemon=True)
+                self._writer.start()
+
+    def _run_writer(self):
+        while True:
+            record = self._trace_queue.get()
+            try:
+                self._append_trace(record)
+            finally:
+                self._trace_queue.task_done()
+
+    def _append_trace(self, record: dict):
+        try:
+            directory = os.path.dirname(self.trace_log)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            try:
+                if os.path.getsize(self.trace_log) >= self.max_bytes:
+                    os.replace(self.trace_log, self.trace_log + ".1")
+            except FileNotFoundError:
+                pass
+            with open(self.trace_log, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except OSError as e:
+            print(f"⚠️ Could not write slow trace: {e}")
+
+    def flush_traces(self):
+        """Blocks until queued slow traces are written (tests, shutdown)."""
+        self._trace_queue.join()
+
+    # --- Counters / caches ---
+
+    def record_error(self, upstream: str, kind: str = "error"):
+        self.upstream_errors.inc(upstream=upstream, kind=kind)
+
+    def event(self, name: str, amount: float = 1, **labels):
+        self.events.inc(amount, event=name, **labels)
+
+    def register_cache(self, name: str, stats: Callable[[], Optional[dict]]):
+        """`stats` returns a dict with hits/misses/hit_ratio (or None while the cache doesn't exist)."""
+        self._caches[name] = stats
+
+    def _cache_lines(self) -> list:
+        hits = ["# HELP contextiq_cache_hits_total Cache hits.", "# TYPE contextiq_cache_hits_total counter"]
+        misses = ["# HELP contextiq_cache_misses_total Cache misses.", "# TYPE contextiq_cache_misses_total counter"]
+        ratio = ["# HELP contextiq_cache_hit_ratio Hits / lookups since start.", "# TYPE contextiq_cache_hit_ratio gauge"]
+        for name, stats in sorted(self._caches.items()):
+            try:
+                values = stats()
+            except Exception:
+                values = None
+            if not values:
+                continue
+            label = _labels((("cache", name),))
+            hits.append(f"contextiq_cache_hits_total{label} {values.get('hits', 0)}")
+            misses.append(f"contextiq_cache_misses_total{label} {values.get('misses', 0)}")
+            ratio.append(f"contextiq_cache_hit_ratio{label} {values.get('hit_ratio', 0.0)}")
+        return hits + misses + ratio
+
+    def register_stats(self, component: str, stats: Callable[[], Optional[dict]]):
+        """Numeric fields of `stats()` become contextiq_component_stat{component, stat} gauges."""
+        self._stats[component] = stats
+
+    def _stats_lines(self) -> list:
+        lines = ["# HELP contextiq_component_stat Point-in-time counters of internal components.",
+                 "# TYPE contextiq_component_stat gauge"]
+        for component, stats in sorted(self._stats.items()):
+            try:
+                values = stats() or {}
+            except Exception:
+                values = {}
+            for stat, value in sorted(values.items()):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    lines.append(f"contextiq_component_stat{_labels((('component', component), ('stat', stat)))} {value:g}")
+        return lines
+
+    def render(self) -> str:
+        lines = []
+        for metric in (self.request_seconds, self.stage_seconds, self.stage_errors,
+                       self.upstream_errors, self.events, self.slow_traces, self.dropped_traces):
+            lines.extend(metric.render())
+        lines.extend(self._cache_lines())
+        lines.extend(self._stats_lines())
+        return "\n".join(lines) + "\n"
+
+
+# Singleton instance
+metrics = Metrics()
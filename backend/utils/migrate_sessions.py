@@ -0,0 +1,42 @@
+"""
+Copies legacy pickle sessions (sessions/*.pkl) into the SQLite session store.
+
+Usage (from backend/):
+    python -m utils.migrate_sessions [--sessions-dir sessions] [--db sessions/sessions.db]
+
+Safe to re-run: sessions already in the database are only overwritten when the
+pickle copy is newer.
+"""
+import argparse
+from utils.session_store import PickleSessionStore, SQLiteSessionStore
+
+def migrate(sessions_dir: str, db_path: str) -> dict:
+    source = PickleSessionStore(sessions_dir)
+    target = SQLiteSessionStore(db_path)
+    counts = {"migrated": 0, "skipped": 0}
+
+    for data in source.iter_all():
+        if not data.get("session_id"):
+            counts["skipped"] += 1
+            continue
+        existing = target.get(data["session_id"])
+        if existing and existing.get("updated_at") and data.get("updated_at") \
+                and existing["updated_at"] >= data["updated_at"]:
+            counts["skipped"] += 1
+            continue
+        target.put(data)
+        counts["migrated"] += 1
+
+    return counts
+
+if __name__ == "__main__":
+    from utils.session_manager import SESSION_DIR, SESSION_DB
+
+    parser = argparse.ArgumentParser(description="Migrate pickle sessions into SQLite")
+    parser.add_argument("--sessions-dir", default=SESSION_DIR)
+    parser.add_argument("--db", default=SESSION_DB)
+    args = parser.parse_args()
+
+    print(f"🔄 Migrating sessions from {args.sessions_dir}/*.pkl to {args.db}...")
+    result = migrate(args.sessions_dir, args.db)
+    print(f"✅ Migration Complete! {result['migrated']} migrated, {result['skipped']} skipped")
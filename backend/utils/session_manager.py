@@ -1,51 +1,129 @@
+import asyncio
 import os
-import pickle
+import threading
 import time
+import weakref
+from collections import OrderedDict
 from typing import List, Dict, Any
 from datetime import datetime
+from utils.session_store import SessionStore, PickleSessionStore, SQLiteSessionStore, SharedSessionStore, history_preview
+from utils.shared_state import shared_state
 
 SESSION_DIR = "sessions"
 os.makedirs(SESSION_DIR, exist_ok=True)
 
+# "sqlite" (default), "pickle" (legacy one-file-per-session store) or "shared"
+# (utils/shared_state; the default when STATE_BACKEND=redis, needed for more than one worker)
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "shared" if shared_state.shared else "sqlite")
+SESSION_DB = os.getenv("SESSION_DB", os.path.join(SESSION_DIR, "sessions.db"))
+
+# Hot-session cache + write-behind
+SESSION_CACHE_SIZE = int(os.getenv("SESSION_CACHE_SIZE", "256"))
+SESSION_FLUSH_INTERVAL = float(os.getenv("SESSION_FLUSH_INTERVAL", "2"))  # seconds
+SESSION_LOCK_TTL = float(os.getenv("SESSION_LOCK_TTL", "300"))  # a crashed worker's turn lock expires after this
+
+def build_session_store(backend: str = SESSION_BACKEND, base_dir: str = SESSION_DIR) -> SessionStore:
+    if backend == "pickle":
+        return PickleSessionStore(base_dir)
+    if backend == "shared":
+        return SharedSessionStore(shared_state)
+    return SQLiteSessionStore(SESSION_DB)
+
 class SessionManager:
-    def __init__(self, base_dir=SESSION_DIR):
+    """
+    Session API used by the endpoints.
+
+    Active sessions are kept in an in-process LRU cache so the chat hot path
+    never re-reads them from disk. Once `run_write_behind()` is running, saves
+    only update the cache and mark the session dirty; the background task
+    flushes dirty sessions to the store. Without it, saves write through.
+
+    With a shared store (other workers write the same sessions) there is no
+    local cache and no write-behind, and turn locks are held in the shared state.
+    """
+
+    def __init__(self, base_dir=SESSION_DIR, store: SessionStore = None, cache_size: int = SESSION_CACHE_SIZE,
+                 state=None):
         self.base_dir = base_dir
+        self.store = store or build_session_store(base_dir=base_dir)
+        self.cache_size = cache_size
+        self.write_behind = False
+        self._cache = OrderedDict()    # session_id -> full session dict
+        self._dirty = set()
+        self._cache_lock = threading.RLock()
+        self._flush_lock = threading.Lock()  # one flush at a time, so an older copy never overwrites a newer one
+        self._locks = weakref.WeakValueDictionary()  # session_id -> asyncio.Lock
+        self.state = state or (self.store.state if self.store.shared else None)
 
-    def _get_path(self, session_id: str) -> str:
-        return os.path.join(self.base_dir, f"{session_id}.pkl")
+    # --- Per-session locking ---
+
+    def lock(self, session_id: str):
+        """Lock serializing chat turns on one session (prevents lost updates), across workers when shared."""
+        if self.state is not None:
+            return self.state.lock(f"lock:session:{session_id}", SESSION_LOCK_TTL)
+        lock = self._locks.get(session_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._locks[session_id] = lock
+        return lock
+
+    # --- Cache helpers ---
+
+    def _cache_put(self, data: Dict[str, Any]):
+        if self.store.shared:
+            return
+        with self._cache_lock:
+            self._cache[data["session_id"]] = data
+            self._cache.move_to_end(data["session_id"])
+            # Evict least recently used clean sessions; dirty ones wait for the next flush
+            overflow = len(self._cache) - self.cache_size
+            if overflow > 0:
+                clean = [sid for sid in self._cache if sid not in self._dirty][:overflow]
+                for session_id in clean:
+                    del self._cache[session_id]
+
+    @staticmethod
+    def _copy(data: Dict[str, Any], last_k: int = None) -> Dict[str, Any]:
+        history = data["history"][-last_k:] if last_k else data["history"]
+        return dict(data, history=list(history))
+
+    # --- Session API ---
 
     def create_session(self, user_id: str, session_id: str = None) -> str:
         """Creates a new session for the user."""
         if not session_id:
             session_id = f"{user_id}_{int(time.time())}"
-        
+
         data = {
             "session_id": session_id,
             "user_id": user_id,
             "title": "New Chat",
             "created_at": datetime.now(),
             "updated_at": datetime.now(),
-            "history": [] 
+            "history": []
         }
         self._save(session_id, data)
         return session_id
 
-    def load_session(self, session_id: str) -> Dict[str, Any]:
-        """Loads a session's data (history + metadata)."""
-        path = self._get_path(session_id)
-        if not os.path.exists(path):
-            return None
-        
-        try:
-            with open(path, "rb") as f:
-                return pickle.load(f)
-        except Exception as e:
-            print(f"Error loading session {session_id}: {e}")
-            return None
+    def load_session(self, session_id: str, last_k: int = None) -> Dict[str, Any]:
+        """Loads a session's data (history + metadata). `last_k` limits history to the most recent messages."""
+        with self._cache_lock:
+            data = self._cache.get(session_id)
+            if data:
+                self._cache.move_to_end(session_id)
+                return self._copy(data, last_k)
+
+        data = self.store.get(session_id, last_k=last_k)
+        if data and not last_k:
+            self._cache_put(data)
+            return self._copy(data)
+        return data
 
     def save_session(self, session_id: str, history: List[Any], title: str = None):
-        """Updates session history and title."""
-        data = self.load_session(session_id)
+        """Updates session history and title. Only messages not yet stored are written."""
+        with self._cache_lock:
+            cached = self._cache.get(session_id)
+        data = dict(cached) if cached else self.store.get_meta(session_id)
         # If session doesn't exist (legacy migration), create wrapper
         if not data:
             # Try to see if it was a legacy raw history file
@@ -57,13 +135,28 @@ class SessionManager:
                 "created_at": datetime.now(),
                 "history": []
             }
-        
-        data["history"] = history
+
+        data["history"] = list(history)
         data["updated_at"] = datetime.now()
         if title:
             data["title"] = title
-            
-        self._save(session_id, data)
+
+        data["session_id"] = session_id
+        if self.write_behind:
+            with self._cache_lock:
+                self._dirty.add(session_id)
+                self._cache_put(data)
+        else:
+            self.store.save_history(data)
+            self._cache_put(data)
+
+    def set_summary(self, session_id: str, summary: Dict[str, Any]):
+        """Caches and stores the running conversation summary (see core/context_manager)."""
+        with self._cache_lock:
+            cached = self._cache.get(session_id)
+            if cached:
+                self._cache[session_id] = dict(cached, summary=summary)
+        self.store.set_summary(session_id, summary)
 
     def transfer_session(self, session_id: str, new_user_id: str):
         """Transfers session ownership to a new user (e.g. guest -> real user)."""
@@ -73,35 +166,56 @@ class SessionManager:
             self._save(session_id, data)
 
     def _save(self, session_id: str, data: Dict[str, Any]):
-        with open(self._get_path(session_id), "wb") as f:
-            pickle.dump(data, f)
+        data["session_id"] = session_id
+        with self._cache_lock:
+            self._dirty.discard(session_id)
+        self.store.put(data)
+        self._cache_put(data)
 
     def list_user_sessions(self, user_id: str) -> List[Dict[str, Any]]:
         """Lists all sessions for a user, sorted by recency."""
-        sessions = []
-        for filename in os.listdir(self.base_dir):
-            if filename.endswith(".pkl"):
+        sessions = {s["id"]: s for s in self.store.list_for_user(user_id)}
+        # Pending writes must be visible in the sidebar: overlay this user's dirty sessions
+        with self._cache_lock:
+            pending = [self._cache[sid] for sid in self._dirty if sid in self._cache]
+        for data in pending:
+            if data.get("user_id") == user_id:
+                sessions[data["session_id"]] = {
+                    "id": data["session_id"],
+                    "title": data.get("title") or "Untitled Chat",
+                    "updated_at": data.get("updated_at"),
+                    "preview": history_preview(data["history"]),
+                }
+        return sorted(sessions.values(), key=lambda s: s.get("updated_at") or datetime.min, reverse=True)
+
+    # --- Write-behind ---
+
+    def flush(self):
+        """Writes every dirty cached session to the store."""
+        with self._flush_lock:
+            with self._cache_lock:
+                pending = [self._cache[sid] for sid in self._dirty if sid in self._cache]
+                self._dirty.clear()
+            for data in pending:
                 try:
-                    path = os.path.join(self.base_dir, filename)
-                    with open(path, "rb") as f:
-                        data = pickle.load(f)
-                        
-                        # Handle legacy raw list files (migration check)
-                        if isinstance(data, list):
-                            continue # Skip legacy or migrate them
-                            
-                        if data.get("user_id") == user_id:
-                            sessions.append({
-                                "id": data["session_id"],
-                                "title": data.get("title", "Untitled Chat"),
-                                "updated_at": data.get("updated_at"),
-                                "preview": str(data["history"][-1].parts[0].text)[:50] if data["history"] else "Empty"
-                            })
-                except Exception:
-                    continue
-        
-        # Sort by updated_at desc
-        return sorted(sessions, key=lambda x: x.get("updated_at", datetime.min), reverse=True)
+                    self.store.save_history(data)
+                except Exception as e:
+                    print(f"❌ Failed to flush session {data['session_id']}: {e}")
+                    with self._cache_lock:
+                        self._dirty.add(data["session_id"])
+
+    async def run_write_behind(self, interval: float = SESSION_FLUSH_INTERVAL):
+        """Background task: flush dirty sessions every `interval` seconds until cancelled."""
+        if self.store.shared:
+            return  # other workers must see every save immediately
+        self.write_behind = True
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                await asyncio.to_thread(self.flush)
+        finally:
+            self.write_behind = False
+            await asyncio.to_thread(self.flush)
 
 # Singleton instance
-session_manager = SessionManager()
\ No newline at end of file
+session_manager = SessionManager()
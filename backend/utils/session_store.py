@@ -0,0 +1,483 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+from utils import history_codec
+
+# Fold a session's turn log into its snapshot once it holds this many rows
+COMPACT_AFTER = int(os.getenv("SESSION_COMPACT_AFTER", "200"))
+
+
+def history_preview(history: List[Any]) -> str:
+    """First 50 chars of the last message, as shown in the chat sidebar."""
+    if not history:
+        return "Empty"
+    try:
+        return str(history[-1].parts[0].text)[:50]
+    except Exception:
+        return ""
+
+
+class SessionStore:
+    """Storage backend interface used by SessionManager."""
+    shared = False  # True when other workers/nodes read and write the same sessions
+
+    def get(self, session_id: str, last_k: int = None) -> Optional[Dict[str, Any]]:
+        """Session metadata + history (only the last `last_k` messages when given)."""
+        raise NotImplementedError
+
+    def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Session metadata without loading the history."""
+        data = self.get(session_id)
+        if data:
+            data.pop("history", None)
+        return data
+
+    def put(self, data: Dict[str, Any]):
+        """Writes metadata and the full history."""
+        raise NotImplementedError
+
+    def save_history(self, data: Dict[str, Any]):
+        """Persists a grown history. Backends that can append should only write the new messages."""
+        self.put(data)
+
+    def set_summary(self, session_id: str, summary: Dict[str, Any]):
+        """Stores the running conversation summary ({"text", "upto"})."""
+        data = self.get(session_id)
+        if data:
+            data["summary"] = summary
+            self.put(data)
+
+    def list_for_user(self, user_id: str) -> List[Dict[str, Any]]:
+        """Session summaries ({id, title, updated_at, preview}) for a user, newest first."""
+        raise NotImplementedError
+
+
+class PickleSessionStore(SessionStore):
+    """Legacy backend: one pickle file per session. Listing scans every file."""
+
+    def __init__(self, base_dir: str):
+        self.base_dir = base_dir
+        os.makedirs(base_dir, exist_ok=True)
+
+    def _get_path(self, session_id: str) -> str:
+        return os.path.join(self.base_dir, f"{session_id}.pkl")
+
+    def get(self, session_id: str, last_k: int = None) -> Optional[Dict[str, Any]]:
+        path = self._get_path(session_id)
+        if not os.path.exists(path):
+            return None
+
+        try:
+            with open(path, "rb") as f:
+                data = pickle.load(f)
+        except Exception as e:
+            print(f"Error loading session {session_id}: {e}")
+            return None
+        if last_k and isinstance(data, dict):
+            data["history"] = data["history"][-last_k:]
+        return data
+
+    def put(self, data: Dict[str, Any]):
+        with open(self._get_path(data["session_id"]), "wb") as f:
+            pickle.dump(data, f)
+
+    def iter_all(self):
+        """Yields every readable session dict (used by the SQLite migration)."""
+        for filename in os.listdir(self.base_dir):
+            if not filename.endswith(".pkl"):
+                continue
+            try:
+                with open(os.path.join(self.base_dir, filename), "rb") as f:
+                    data = pickle.load(f)
+            except Exception:
+                continue
+            # Skip legacy raw list files
+            if isinstance(data, dict):
+                yield data
+
+    def list_for_user(self, user_id: str) -> List[Dict[str, Any]]:
+        sessions = []
+        for data in self.iter_all():
+            if data.get("user_id") == user_id:
+                sessions.append({
+                    "id": data["session_id"],
+                    "title": data.get("title", "Untitled Chat"),
+                    "updated_at": data.get("updated_at"),
+                    "preview": history_preview(data.get("history"))
+                })
+
+        # Sort by updated_at desc
+        return sorted(sessions, key=lambda x: x.get("updated_at") or datetime.min, reverse=True)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Indexed SQLite backend (WAL mode).
+
+    Metadata lives in plain columns with an index on (user_id, updated_at), so
+    listing a user's sessions is one indexed query that never touches history.
+
+    History is an append-only turn log: each message is one JSON row in
+    `session_turns` (see utils/history_codec), so a chat turn only writes its
+    new messages. Once the log grows past COMPACT_AFTER rows it is folded into
+    a compressed `snapshot` on the session row. Message `seq` numbers are global,
+    so the snapshot always holds messages [0, snapshot_count).
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        conn = self._conn()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS sessions (
+                session_id TEXT PRIMARY KEY,
+                user_id    TEXT NOT NULL,
+                title      TEXT,
+                created_at TEXT,
+                updated_at TEXT,
+                preview    TEXT,
+                history    BLOB
+            );
+            CREATE INDEX IF NOT EXISTS idx_sessions_user_updated
+                ON sessions (user_id, updated_at DESC);
+            CREATE TABLE IF NOT EXISTS session_turns (
+                session_id TEXT NOT NULL,
+                seq        INTEGER NOT NULL,
+                payload    TEXT NOT NULL,
+                PRIMARY KEY (session_id, seq)
+            );
+        """)
+        # Columns added after the first release of this store
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+        for column, ddl in (
+            ("turn_count", "INTEGER NOT NULL DEFAULT 0"),
+            ("snapshot", "BLOB"),
+            ("snapshot_count", "INTEGER NOT NULL DEFAULT 0"),
+            ("summary", "TEXT"),
+        ):
+            if column not in columns:
+                conn.execute(f"ALTER TABLE sessions ADD COLUMN {column} {ddl}")
+        conn.commit()
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread (requests are served from a thread pool)
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _ts(value) -> Optional[str]:
+        return value.isoformat(timespec="microseconds") if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _dt(value) -> Optional[datetime]:
+        return datetime.fromisoformat(value) if value else None
+
+    # --- Reads ---
+
+    def _meta_row(self, conn, session_id: str):
+        return conn.execute(
+            "SELECT session_id, user_id, title, created_at, updated_at, turn_count, "
+            "snapshot_count, history IS NOT NULL, summary FROM sessions WHERE session_id = ?",
+            (session_id,),
+        ).fetchone()
+
+    def _meta(self, row) -> Dict[str, Any]:
+        return {
+            "session_id": row[0],
+            "user_id": row[1],
+            "title": row[2],
+            "created_at": self._dt(row[3]),
+            "updated_at": self._dt(row[4]),
+            "summary": json.loads(row[8]) if row[8] else None,
+        }
+
+    def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        row = self._meta_row(self._conn(), session_id)
+        return self._meta(row) if row else None
+
+    def _load_docs(self, conn, session_id: str, snapshot_count: int, last_k: int = None):
+        if last_k:
+            rows = conn.execute(
+                "SELECT payload FROM session_turns WHERE session_id = ? ORDER BY seq DESC LIMIT ?",
+                (session_id, last_k),
+            ).fetchall()[::-1]
+        else:
+            rows = conn.execute(
+                "SELECT payload FROM session_turns WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+        docs = [json.loads(row[0]) for row in rows]
+
+        # Only decompress the snapshot when the tail alone isn't enough
+        if snapshot_count and (not last_k or len(docs) < last_k):
+            blob = conn.execute(
+                "SELECT snapshot FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()[0]
+            snapshot_docs = history_codec.decompress_docs(blob)
+            if last_k:
+                snapshot_docs = snapshot_docs[-(last_k - len(docs)):]
+            docs = snapshot_docs + docs
+        return docs
+
+    def get(self, session_id: str, last_k: int = None) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        row = self._meta_row(conn, session_id)
+        if not row:
+            return None
+        data = self._meta(row)
+        try:
+            if row[7]:
+                # Written before the turn log existed (pickled blob)
+                legacy = conn.execute(
+                    "SELECT history FROM sessions WHERE session_id = ?", (session_id,)
+                ).fetchone()[0]
+                history = pickle.loads(legacy)
+                data["history"] = history[-last_k:] if last_k else history
+            else:
+                docs = self._load_docs(conn, session_id, row[6], last_k)
+                data["history"] = [history_codec.decode_message(doc) for doc in docs]
+        except Exception as e:
+            print(f"Error loading session {session_id}: {e}")
+            return None
+        return data
+
+    # --- Writes ---
+
+    def put(self, data: Dict[str, Any]):
+        history = data.get("history") or []
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions "
+                "(session_id, user_id, title, created_at, updated_at, preview, history, "
+                "turn_count, snapshot, snapshot_count, summary) "
+                "VALUES (?, ?, ?, ?, ?, ?, NULL, ?, NULL, 0, ?)",
+                (
+                    data["session_id"],
+                    data.get("user_id") or "unknown",
+                    data.get("title"),
+                    self._ts(data.get("created_at")),
+                    self._ts(data.get("updated_at")),
+                    history_preview(history),
+                    len(history),
+                    json.dumps(data["summary"]) if data.get("summary") else None,
+                ),
+            )
+            conn.execute("DELETE FROM session_turns WHERE session_id = ?", (data["session_id"],))
+            self._append_turns(conn, data["session_id"], 0, history)
+            if len(history) > COMPACT_AFTER:
+                self._compact(conn, data["session_id"])
+
+    def save_history(self, data: Dict[str, Any]):
+        history = data.get("history") or []
+        conn = self._conn()
+        row = self._meta_row(conn, data["session_id"])
+        # Fall back to a full rewrite for new/legacy sessions or a history that shrank
+        if not row or row[7] or len(history) < row[5]:
+            return self.put(data)
+
+        turn_count = row[5]
+        with conn:
+            self._append_turns(conn, data["session_id"], turn_count, history[turn_count:])
+            conn.execute(
+                "UPDATE sessions SET user_id = ?, title = ?, updated_at = ?, preview = ?, turn_count = ? "
+                "WHERE session_id = ?",
+                (
+                    data.get("user_id") or row[1],
+                    data.get("title"),
+                    self._ts(data.get("updated_at")),
+                    history_preview(history),
+                    len(history),
+                    data["session_id"],
+                ),
+            )
+            if len(history) - row[6] > COMPACT_AFTER:
+                self._compact(conn, data["session_id"])
+
+    @staticmethod
+    def _append_turns(conn, session_id: str, start_seq: int, messages: List[Any]):
+        conn.executemany(
+            "INSERT OR REPLACE INTO session_turns (session_id, seq, payload) VALUES (?, ?, ?)",
+            [
+                (session_id, start_seq + i, history_codec.dumps_message(message))
+                for i, message in enumerate(messages)
+            ],
+        )
+
+    def set_summary(self, session_id: str, summary: Dict[str, Any]):
+        conn = self._conn()
+        with conn:
+            conn.execute(
+                "UPDATE sessions SET summary = ? WHERE session_id = ?",
+                (json.dumps(summary) if summary else None, session_id),
+            )
+
+    def _compact(self, conn, session_id: str):
+        """Folds the turn log into the session's compressed snapshot."""
+        snapshot, snapshot_count = conn.execute(
+            "SELECT snapshot, snapshot_count FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        docs = history_codec.decompress_docs(snapshot) if snapshot_count else []
+        rows = conn.execute(
+            "SELECT payload FROM session_turns WHERE session_id = ? ORDER BY seq", (session_id,)
+        ).fetchall()
+        docs += [json.loads(row[0]) for row in rows]
+        conn.execute(
+            "UPDATE sessions SET snapshot = ?, snapshot_count = ? WHERE session_id = ?",
+            (history_codec.compress_docs(docs), len(docs), session_id),
+        )
+        conn.execute("DELETE FROM session_turns WHERE session_id = ?", (session_id,))
+
+    def list_for_user(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self._conn().execute(
+            "SELECT session_id, title, updated_at, preview FROM sessions "
+            "WHERE user_id = ? ORDER BY updated_at DESC",
+            (user_id,),
+        ).fetchall()
+        return [
+            {
+                "id": row[0],
+                "title": row[1] or "Untitled Chat",
+                "updated_at": self._dt(row[2]),
+                "preview": row[3],
+            }
+            for row in rows
+        ]
+
+
+class SharedSessionStore(SessionStore):
+    """
+    Sessions in the shared state (utils/shared_state), so every worker and node
+    sees the same history. Per session: a JSON metadata document, a compressed
+    history snapshot and a turn log (a list, appended with RPUSH each turn and
+    folded into the snapshot past COMPACT_AFTER entries); per user: a sorted
+    index of session ids by updated_at. Log entries carry their position, so a
+    reader racing a compaction never sees a message twice.
+    """
+    shared = True
+
+    def __init__(self, state):
+        self.state = state
+
+    @staticmethod
+    def _ts(value) -> Optional[str]:
+        return value.isoformat(timespec="microseconds") if isinstance(value, datetime) else value
+
+    @staticmethod
+    def _dt(value) -> Optional[datetime]:
+        return datetime.fromisoformat(value) if value else None
+
+    def get_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.state.get(f"session:{session_id}:meta")
+        if not raw:
+            return None
+        meta = json.loads(raw)
+        for internal in ("preview", "turn_count", "snapshot_count"):
+            meta.pop(internal, None)
+        meta["created_at"] = self._dt(meta.get("created_at"))
+        meta["updated_at"] = self._dt(meta.get("updated_at"))
+        return meta
+
+    def get(self, session_id: str, last_k: int = None) -> Optional[Dict[str, Any]]:
+        data = self.get_meta(session_id)
+        if not data:
+            return None
+        try:
+            docs = history_codec.decompress_docs(self.state.get(f"session:{session_id}:history"))
+            for raw in self.state.lrange(f"session:{session_id}:turns"):
+                entry = json.loads(raw)
+                if entry["seq"] == len(docs):
+                    docs.append(entry["doc"])
+            if last_k:
+                docs = docs[-last_k:]
+            data["history"] = [history_codec.decode_message(doc) for doc in docs]
+        except Exception as e:
+            print(f"Error loading session {session_id}: {e}")
+            return None
+        return data
+
+    def _raw_meta(self, session_id: str) -> Optional[Dict[str, Any]]:
+        raw = self.state.get(f"session:{session_id}:meta")
+        return json.loads(raw) if raw else None
+
+    def _write_meta(self, data: Dict[str, Any], history: List[Any], snapshot_count: int, previous):
+        session_id = data["session_id"]
+        user_id = data.get("user_id") or "unknown"
+        meta = {
+            "session_id": session_id,
+            "user_id": user_id,
+            "title": data.get("title"),
+            "created_at": self._ts(data.get("created_at")),
+            "updated_at": self._ts(data.get("updated_at")),
+            "summary": data.get("summary"),
+            "preview": history_preview(history),
+            "turn_count": len(history),
+            "snapshot_count": snapshot_count,
+        }
+        self.state.set(f"session:{session_id}:meta", json.dumps(meta))
+        if previous and previous.get("user_id") != user_id:
+            self.state.zrem(f"user_sessions:{previous['user_id']}", session_id)
+        updated_at = data.get("updated_at")
+        self.state.zadd(f"user_sessions:{user_id}", session_id,
+                        updated_at.timestamp() if isinstance(updated_at, datetime) else 0)
+
+    def put(self, data: Dict[str, Any]):
+        """Full rewrite: the whole history becomes the snapshot and the turn log is dropped."""
+        session_id = data["session_id"]
+        history = data.get("history") or []
+        previous = self._raw_meta(session_id)
+        docs = [history_codec.encode_message(message) for message in history]
+        # History first: a reader that sees the new metadata also sees the new history
+        self.state.set(f"session:{session_id}:history", history_codec.compress_docs(docs))
+        self.state.delete(f"session:{session_id}:turns")
+        self._write_meta(data, history, len(docs), previous)
+
+    def save_history(self, data: Dict[str, Any]):
+        """RPUSHes only the new messages; constant cost per turn until compaction."""
+        session_id = data["session_id"]
+        history = data.get("history") or []
+        previous = self._raw_meta(session_id)
+        # Fall back to a full rewrite for new/older sessions, a shrunk history or a long log
+        if (not previous or "turn_count" not in previous or len(history) < previous["turn_count"]
+                or len(history) - previous["snapshot_count"] > COMPACT_AFTER):
+            return self.put(data)
+
+        start = previous["turn_count"]
+        if len(history) > start:
+            self.state.rpush(f"session:{session_id}:turns", *[
+                json.dumps({"seq": start + i, "doc": history_codec.encode_message(message)})
+                for i, message in enumerate(history[start:])
+            ])
+        self._write_meta(data, history, previous["snapshot_count"], previous)
+
+    def set_summary(self, session_id: str, summary: Dict[str, Any]):
+        raw = self.state.get(f"session:{session_id}:meta")
+        if raw:
+            meta = json.loads(raw)
+            meta["summary"] = summary
+            self.state.set(f"session:{session_id}:meta", json.dumps(meta))
+
+    def list_for_user(self, user_id: str) -> List[Dict[str, Any]]:
+        sessions = []
+        for session_id in self.state.zrevrange(f"user_sessions:{user_id}"):
+            raw = self.state.get(f"session:{session_id}:meta")
+            if not raw:
+                continue
+            meta = json.loads(raw)
+            sessions.append({
+                "id": session_id,
+                "title": meta.get("title") or "Untitled Chat",
+                "updated_at": self._dt(meta.get("updated_at")),
+                "preview": meta.get("preview"),
+            })
+        return sessions
@@ -0,0 +1,324 @@
+"""
+State shared between workers (and nodes): sessions, cache layers, per-session
+locks and rate-limit counters.
+
+STATE_BACKEND=local keeps everything in this process (single worker, the default).
+STATE_BACKEND=redis puts it in Redis (REDIS_URL), so gunicorn can run several
+workers per box and several boxes behind a load balancer. Both implement the
+same small interface:
+
+    get / set (ttl, only_if_absent) / delete     bytes values
+    incr(key, amount, ttl)                        counters; ttl starts with the counter
+    zadd / zrem / zrevrange                       scored index (sessions per user)
+    rpush / lrange                                append-only lists (session turn logs)
+    lock(name, ttl)                               async context manager, one holder across workers
+                                                  (Redis locks are renewed while held)
+    hit(key, limit, window)                       fixed-window rate limiting on top of incr
+                                                  (the cluster-wide LLM limit, utils/llm_client)
+"""
+import asyncio
+import os
+import threading
+import time
+import uuid
+import weakref
+from typing import List, Optional
+
+try:
+    import redis
+    REDIS_AVAILABLE = True
+except ImportError:
+    REDIS_AVAILABLE = False
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")   # "local" or "redis"
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+STATE_PREFIX = os.getenv("STATE_PREFIX", "contextiq:")  # namespaces every key
+LOCK_POLL = 0.05   # first wait between attempts on a held lock (doubles up to LOCK_POLL_MAX)
+LOCK_POLL_MAX = 0.5
+
+# Delete the lock only if we still own it (it may have expired and been taken by someone else)
+RELEASE_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+# Push the expiry out while we still own the lock
+RENEW_LOCK_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+
+def _bytes(value) -> bytes:
+    return value if isinstance(value, bytes) else str(value).encode("utf-8")
+
+
+class SharedState:
+    """Interface; see the module docstring."""
+    shared = False   # True when other processes see the same state
+
+    def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    def set(self, key: str, value, ttl: float = None, only_if_absent: bool = False) -> bool:
+        raise NotImplementedError
+
+    def delete(self, key: str):
+        raise NotImplementedError
+
+    def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        raise NotImplementedError
+
+    def zadd(self, key: str, member: str, score: float):
+        raise NotImplementedError
+
+    def zrem(self, key: str, member: str):
+        raise NotImplementedError
+
+    def zrevrange(self, key: str, start: int = 0, stop: int = -1) -> List[str]:
+        raise NotImplementedError
+
+    def rpush(self, key: str, *values) -> int:
+        raise NotImplementedError
+
+    def lrange(self, key: str, start: int = 0, stop: int = -1) -> List[bytes]:
+        raise NotImplementedError
+
+    def lock(self, name: str, ttl: float):
+        raise NotImplementedError
+
+    def hit(self, key: str, limit: int, window: float, clock=time.time) -> tuple:
+        """
+        Counts one event against `limit` per `window` seconds.
+        Returns (allowed, retry_after_seconds).
+        """
+        now = clock()
+        bucket = int(now // window)
+        count = self.incr(f"rate:{key}:{bucket}", ttl=window + 1)
+        if count <= limit:
+            return True, 0.0
+        return False, round((bucket + 1) * window - now, 3)
+
+
+class LocalState(SharedState):
+    """In-process implementation (and the stand-in for Redis in tests)."""
+
+    def __init__(self, clock=time.time):
+        self.clock = clock
+        self._values = {}   # key -> (expires_at | None, value)
+        self._sorted = {}   # key -> {member: score}
+        self._lists = {}    # key -> [bytes]
+        self._locks = weakref.WeakValueDictionary()  # name -> asyncio.Lock
+        self._lock = threading.Lock()
+
+    def _live(self, key: str):
+        entry = self._values.get(key)
+        if entry and entry[0] is not None and entry[0] <= self.clock():
+            del self._values[key]
+            return None
+        return entry
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._live(key)
+            return entry[1] if entry else None
+
+    def set(self, key: str, value, ttl: float = None, only_if_absent: bool = False) -> bool:
+        with self._lock:
+            if only_if_absent and self._live(key):
+                return False
+            self._values[key] = (self.clock() + ttl if ttl else None, _bytes(value))
+            return True
+
+    def delete(self, key: str):
+        with self._lock:
+            self._values.pop(key, None)
+            self._sorted.pop(key, None)
+            self._lists.pop(key, None)
+
+    def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        with self._lock:
+            entry = self._live(key)
+            if entry:
+                expires_at, value = entry[0], int(entry[1]) + amount
+            else:
+                expires_at, value = (self.clock() + ttl if ttl else None), amount
+            self._values[key] = (expires_at, _bytes(value))
+            return value
+
+    def zadd(self, key: str, member: str, score: float):
+        with self._lock:
+            self._sorted.setdefault(key, {})[member] = score
+
+    def zrem(self, key: str, member: str):
+        with self._lock:
+            self._sorted.get(key, {}).pop(member, None)
+
+    def zrevrange(self, key: str, start: int = 0, stop: int = -1) -> List[str]:
+        with self._lock:
+            members = sorted(self._sorted.get(key, {}).items(), key=lambda item: item[1], reverse=True)
+        end = None if stop == -1 else stop + 1
+        return [member for member, _ in members[start:end]]
+
+    def rpush(self, key: str, *values) -> int:
+        with self._lock:
+            items = self._lists.setdefault(key, [])
+            items.extend(_bytes(value) for value in values)
+            return len(items)
+
+    def lrange(self, key: str, start: int = 0, stop: int = -1) -> List[bytes]:
+        with self._lock:
+            items = list(self._lists.get(key, []))
+        return items[start:None if stop == -1 else stop + 1]
+
+    def lock(self, name: str, ttl: float = None) -> asyncio.Lock:
+        # Single process: a plain asyncio.Lock is enough (ttl is irrelevant)
+        with self._lock:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = asyncio.Lock()
+                self._locks[name] = lock
+            return lock
+
+
+class RedisLock:
+    """
+    Lock held in Redis (SET NX PX with a random token), so it excludes other
+    workers and nodes. A local asyncio.Lock queues this process's waiters, so
+    only one coroutine per process polls Redis. While held, the expiry is
+    renewed every ttl/3 seconds, so a long turn keeps its lock; the ttl only
+    bounds how long a crashed holder can block others.
+    """
+
+    def __init__(self, state: "RedisState", name: str, ttl: float):
+        self.state = state
+        self.name = name
+        self.ttl = ttl
+        self._local = asyncio.Lock()
+        self._token = None
+        self._renewer = None
+
+    async def acquire(self):
+        await self._local.acquire()
+        token = uuid.uuid4().hex
+        delay = LOCK_POLL
+        try:
+            while not await asyncio.to_thread(self.state.set, self.name, token, self.ttl, True):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, LOCK_POLL_MAX)
+        except BaseException:
+            self._local.release()
+            raise
+        self._token = token
+        self._renewer = asyncio.create_task(self._renew(token))
+        return True
+
+    async def _renew(self, token: str):
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            try:
+                if not await asyncio.to_thread(self.state.renew_lock, self.name, token, self.ttl):
+                    print(f"⚠️ Lost lock {self.name} (expired before renewal)")
+                    return
+            except Exception as e:
+                print(f"⚠️ Could not renew lock {self.name}: {e}")
+
+    async def release(self):
+        token, self._token = self._token, None
+        if self._renewer is not None:
+            self._renewer.cancel()
+            self._renewer = None
+        try:
+            await asyncio.to_thread(self.state.release_lock, self.name, token)
+        finally:
+            self._local.release()
+
+    def locked(self) -> bool:
+        return self._local.locked()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.release()
+
+
+class RedisState(SharedState):
+    """Redis implementation (redis-py). Keys are namespaced with STATE_PREFIX."""
+    shared = True
+
+    def __init__(self, url: str = REDIS_URL, client=None, prefix: str = STATE_PREFIX):
+        if client is None:
+            if not REDIS_AVAILABLE:
+                raise RuntimeError("STATE_BACKEND=redis needs the 'redis' package")
+            client = redis.Redis.from_url(url, socket_timeout=5, health_check_interval=30)
+        self.client = client
+        self.prefix = prefix
+        self._release = client.register_script(RELEASE_LOCK_SCRIPT)
+        self._renew = client.register_script(RENEW_LOCK_SCRIPT)
+        self._locks = weakref.WeakValueDictionary()  # name -> RedisLock
+        self._locks_guard = threading.Lock()
+
+    def _key(self, key: str) -> str:
+        return self.prefix + key
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self._key(key))
+
+    def set(self, key: str, value, ttl: float = None, only_if_absent: bool = False) -> bool:
+        px = max(1, int(ttl * 1000)) if ttl else None
+        return bool(self.client.set(self._key(key), _bytes(value), px=px, nx=only_if_absent))
+
+    def delete(self, key: str):
+        self.client.delete(self._key(key))
+
+    def incr(self, key: str, amount: int = 1, ttl: float = None) -> int:
+        value = self.client.incrby(self._key(key), amount)
+        if ttl and value == amount:
+            # First increment created the counter: start its window
+            self.client.pexpire(self._key(key), max(1, int(ttl * 1000)))
+        return value
+
+    def zadd(self, key: str, member: str, score: float):
+        self.client.zadd(self._key(key), {member: score})
+
+    def zrem(self, key: str, member: str):
+        self.client.zrem(self._key(key), member)
+
+    def zrevrange(self, key: str, start: int = 0, stop: int = -1) -> List[str]:
+        return [m.decode("utf-8") if isinstance(m, bytes) else m
+                for m in self.client.zrevrange(self._key(key), start, stop)]
+
+    def rpush(self, key: str, *values) -> int:
+        return self.client.rpush(self._key(key), *[_bytes(value) for value in values])
+
+    def lrange(self, key: str, start: int = 0, stop: int = -1) -> List[bytes]:
+        return self.client.lrange(self._key(key), start, stop)
+
+    def release_lock(self, name: str, token: str):
+        self._release(keys=[self._key(name)], args=[token])
+
+    def renew_lock(self, name: str, token: str, ttl: float) -> bool:
+        return bool(self._renew(keys=[self._key(name)], args=[token, max(1, int(ttl * 1000))]))
+
+    def lock(self, name: str, ttl: float) -> RedisLock:
+        with self._locks_guard:
+            lock = self._locks.get(name)
+            if lock is None:
+                lock = RedisLock(self, name, ttl)
+                self._locks[name] = lock
+            return lock
+
+
+def build_state(backend: str = STATE_BACKEND) -> SharedState:
+    if backend == "redis":
+        return RedisState()
+    return LocalState()
+
+
+# Singleton instance
+shared_state = build_state()